@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'notes.metrics.MetricsMiddleware',
+    'notes.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,16 +77,53 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
+# Connection settings come from the environment, the defaults being the local
+# development server. DB_REPLICAS lists read replicas, comma-separated: hosts,
+# or database files with SQLite (e.g. DB_ENGINE=django.db.backends.sqlite3
+# DB_NAME=primary.sqlite3 DB_REPLICAS=replica.sqlite3 for a local copy).
+
+def _database(**overrides):
+    database = {
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.environ.get('DB_NAME', 'gestion_notes'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'admin'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # seconds a connection is kept for the next requests, 0 = one per request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    database.update(overrides)
+    return database
+
+
+DATABASES = {'default': _database()}
+for _i, _replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    _location = {'NAME': _replica} if DATABASES['default']['ENGINE'].endswith('sqlite3') else {'HOST': _replica}
+    # tests read the replicas through the primary's test database
+    DATABASES[f'replica{_i}'] = _database(TEST={'MIRROR': 'default'}, **_location)
+
+# Safe requests read from a replica (notes.routers), see ReplicaMiddleware
+DATABASE_ROUTERS = ['notes.routers.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# seconds a client keeps reading from the primary after a write (read-your-writes)
+REPLICA_STICKY_SECONDS = 15
+
+# Grade versions, page cache tags, hierarchy version, UE rights and import
+# progress live in this cache. Local memory is per process: deployments with
+# several workers set a shared backend, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'gestion_notes',
-        'USER': 'postgres',
-        'PASSWORD': 'admin',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # the default (300) would evict tag versions and cached pages far too early
+        'OPTIONS': {'MAX_ENTRIES': 20000},
     }
 }
+# tests clear the cache: never let them reach a deployment's shared one
+if os.environ.get('CACHE_BACKEND') and sys.argv[1:2] != ['test']:
+    CACHES['default'] = {'BACKEND': os.environ['CACHE_BACKEND'], 'LOCATION': os.environ.get('CACHE_LOCATION', '')}
 
 
 # Password validation
@@ -120,3 +161,16 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+
+# Bulk transcript rendering (`manage.py generate_transcripts`): worker processes,
+# None = one per CPU; the /releves/ view renders in its own worker
+TRANSCRIPT_WORKERS = None
+
+# Background grade imports (notes.jobs): worker threads per process,
+# 0 = leave jobs pending for `manage.py process_import_jobs`
+IMPORT_JOB_WORKERS = 2
+
+# Per-view latency/SQL metrics (notes.metrics, served on /metrics): fraction
+# of the requests measured, 0 = off
+METRICS_SAMPLE_RATE = 0.1
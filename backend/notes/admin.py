@@ -38,19 +38,11 @@ class EtudiantAdmin(admin.ModelAdmin):
 
 @admin.register(Note)
 class NoteAdmin(admin.ModelAdmin):
-    list_display = ('etudiant', 'ue', 'final_display', 'is_eliminated')
+    list_display = ('etudiant', 'ue', 'final', 'is_eliminated')
     list_filter = ('ue', 'etudiant__filiere')
+    list_select_related = ('etudiant', 'ue')
     search_fields = ('etudiant__nom', 'etudiant__matricule')
 
-    def final_display(self, obj):
-        return obj.final
-    final_display.short_description = 'Final'
-
-    def is_eliminated(self, obj):
-        return obj.is_eliminated
-    is_eliminated.boolean = True
-    is_eliminated.short_description = 'Éliminé'
-
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         # Filter UE options based on selected Etudiant's filiere and niveau
         if db_field.name == 'ue':
@@ -0,0 +1,79 @@
+"""Home page figures, kept in the cache instead of being counted on every visit.
+
+Structural writes (départements, filières, niveaux, UEs, étudiants) drop the
+cached row counts through signals. The per-semester progress is cached
+apart and only refreshed when it expires: its note counts are summed from
+MoyenneSemestre (one row per student and semester) rather than counted over
+the notes, and grade writes are far too frequent to drop it.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Sum
+
+from .models import UE, Departement, Etudiant, Filiere, MoyenneSemestre, Niveau, Note
+
+DASHBOARD_CACHE_KEY = 'dashboard:stats'
+PROGRESS_CACHE_KEY = 'dashboard:semesters'
+# seconds between refreshes of the note figures
+DASHBOARD_CACHE_TIMEOUT = 300
+# above this many rows (per the planner statistics) a table is not COUNTed exactly
+ESTIMATE_THRESHOLD = 100_000
+
+
+def table_count(model):
+    """(row count, estimated) of a table; large PostgreSQL tables use pg_class.reltuples."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 means the table was never analyzed
+        if row and row[0] >= ESTIMATE_THRESHOLD:
+            return row[0], True
+    return model.objects.count(), False
+
+
+def semester_progress():
+    """Notes entered and complete vs. expected (UE x students of its cohort), per semester."""
+    cohort_sizes = {
+        (row['filiere_id'], row['niveau_id']): row['n']
+        for row in Etudiant.objects.values('filiere_id', 'niveau_id').annotate(n=Count('id'))
+    }
+    progress = {semester: {'semester': semester, 'expected': 0, 'entered': 0, 'complete': 0} for semester, _ in UE.SEMESTER_CHOICES}
+    for filiere_id, niveau_id, semester in UE.objects.values_list('filiere_id', 'niveau_id', 'semester'):
+        progress[semester]['expected'] += cohort_sizes.get((filiere_id, niveau_id), 0)
+    for row in MoyenneSemestre.objects.values('semester').annotate(entered=Sum('notes_count'), complete=Sum('graded_count')):
+        progress[row['semester']]['entered'] = row['entered']
+        progress[row['semester']]['complete'] = row['complete']
+    for row in progress.values():
+        row['rate'] = round(100 * row['complete'] / row['expected'], 1) if row['expected'] else None
+    return list(progress.values())
+
+
+def compute_dashboard():
+    stats = {'estimated': []}
+    for name, model in (
+        ('departements', Departement), ('filieres', Filiere), ('niveaux', Niveau),
+        ('ues', UE), ('etudiants', Etudiant), ('notes', Note),
+    ):
+        stats[name], estimated = table_count(model)
+        if estimated:
+            stats['estimated'].append(name)
+    return stats
+
+
+def dashboard_stats():
+    """Home page figures, each part recomputed at most once per DASHBOARD_CACHE_TIMEOUT (row counts also after a structural write)."""
+    stats = cache.get(DASHBOARD_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard()
+        cache.set(DASHBOARD_CACHE_KEY, stats, DASHBOARD_CACHE_TIMEOUT)
+    semesters = cache.get(PROGRESS_CACHE_KEY)
+    if semesters is None:
+        semesters = semester_progress()
+        cache.set(PROGRESS_CACHE_KEY, semesters, DASHBOARD_CACHE_TIMEOUT)
+    return {**stats, 'semesters': semesters}
+
+
+def invalidate_dashboard(progress=False):
+    """Drop the cached row counts, and the semester progress with ``progress`` (bulk loads)."""
+    cache.delete_many([DASHBOARD_CACHE_KEY, PROGRESS_CACHE_KEY] if progress else [DASHBOARD_CACHE_KEY])
@@ -0,0 +1,114 @@
+"""Semester deliberation (jury results) for a whole filière/niveau in one batch.
+
+Three queries fetch the cohort's UEs, students and stored finals; results
+are then computed over per-student arrays indexed like the UE list, without
+instantiating any model. A UE is validated with a final of at least
+PASS_MARK and eliminated when the student has no final for it (missing
+component or no note at all). A semester is:
+
+- ``admis`` when every UE is validated;
+- ``admis par compensation`` when nothing is eliminated and the
+  credit-weighted average reaches PASS_MARK (all credits are then earned);
+- ``ajourné`` otherwise, keeping the credits of the validated UEs.
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import UE, Etudiant, GradeVersion, Note
+from .stats import PASS_MARK
+
+ADMIS = 'admis'
+COMPENSE = 'admis par compensation'
+AJOURNE = 'ajourné'
+
+# keys embed the grade version, so entries never go stale; the timeout only frees memory
+DELIBERATION_CACHE_TIMEOUT = 3600
+
+REPORT_HEADERS = ('Nom', 'Matricule', 'Moyenne', 'Crédits acquis', 'Crédits', 'UE validées', 'UE éliminées', 'Décision')
+
+
+def deliberate(filiere_id, niveau_id, semester):
+    """Jury results of a cohort for ``semester``: {'ues', 'students', 'summary', 'seconds'}."""
+    started = time.perf_counter()
+    ues = list(
+        UE.objects.filter(filiere_id=filiere_id, niveau_id=niveau_id, semester=semester)
+        .order_by('code').values_list('id', 'code', 'credit')
+    )
+    index = {ue_id: i for i, (ue_id, _, _) in enumerate(ues)}
+    codes = [code for _, code, _ in ues]
+    credits = [credit for _, _, credit in ues]
+    total_credits = sum(credits)
+
+    students = list(
+        Etudiant.objects.filter(filiere_id=filiere_id, niveau_id=niveau_id)
+        .order_by('nom', 'id').values_list('id', 'nom', 'matricule')
+    )
+    # one row of finals per student, one column per UE; None = eliminated
+    finals = {etudiant_id: [None] * len(ues) for etudiant_id, _, _ in students}
+    notes = Note.objects.filter(ue_id__in=list(index), etudiant__filiere_id=filiere_id, etudiant__niveau_id=niveau_id)
+    for etudiant_id, ue_id, final in notes.filter(final__isnull=False).values_list('etudiant_id', 'ue_id', 'final').iterator(chunk_size=5000):
+        finals[etudiant_id][index[ue_id]] = final
+
+    results = []
+    summary = {ADMIS: 0, COMPENSE: 0, AJOURNE: 0}
+    for etudiant_id, nom, matricule in students:
+        row = finals[etudiant_id]
+        validated = [i for i, final in enumerate(row) if final is not None and final >= PASS_MARK]
+        eliminated = [i for i, final in enumerate(row) if final is None]
+        graded_credits = total_credits - sum(credits[i] for i in eliminated)
+        weighted = sum(final * credit for final, credit in zip(row, credits) if final is not None)
+        moyenne = round(weighted / graded_credits, 2) if graded_credits else None
+
+        if ues and len(validated) == len(ues):
+            decision, earned = ADMIS, total_credits
+        elif ues and not eliminated and moyenne is not None and moyenne >= PASS_MARK:
+            decision, earned = COMPENSE, total_credits
+        else:
+            decision, earned = AJOURNE, sum(credits[i] for i in validated)
+        summary[decision] += 1
+        results.append({
+            'etudiant_id': etudiant_id,
+            'nom': nom,
+            'matricule': matricule,
+            'moyenne': moyenne,
+            'credits_earned': earned,
+            'credits_total': total_credits,
+            'validated': [codes[i] for i in validated],
+            'eliminated': [codes[i] for i in eliminated],
+            'decision': decision,
+        })
+
+    passed = summary[ADMIS] + summary[COMPENSE]
+    return {
+        'ues': [{'id': ue_id, 'code': code, 'credit': credit} for ue_id, code, credit in ues],
+        'students': results,
+        'summary': {
+            'students': len(results),
+            'admis': summary[ADMIS],
+            'compenses': summary[COMPENSE],
+            'ajournes': summary[AJOURNE],
+            'pass_rate': round(passed / len(results), 4) if results else None,
+        },
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def cohort_deliberation(filiere_id, niveau_id, semester):
+    """``deliberate`` cached under the cohort's GradeVersion."""
+    version = GradeVersion.current(filiere_id, niveau_id)
+    key = f'deliberation:{filiere_id}:{niveau_id}:{semester}:{version}'
+    result = cache.get(key)
+    if result is None:
+        result = dict(deliberate(filiere_id, niveau_id, semester), version=version)
+        cache.set(key, result, DELIBERATION_CACHE_TIMEOUT)
+    return result
+
+
+def report_rows(result):
+    """REPORT_HEADERS-shaped rows of a deliberation, for the CSV/xlsx exports."""
+    for s in result['students']:
+        yield (
+            s['nom'], s['matricule'], s['moyenne'], s['credits_earned'], s['credits_total'],
+            ', '.join(s['validated']), ', '.join(s['eliminated']), s['decision'],
+        )
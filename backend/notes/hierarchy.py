@@ -0,0 +1,110 @@
+"""Département → filière → niveau → UE tree, built once and kept in process memory.
+
+The niveaux of a filière are those its students are enrolled in, as in
+the cascade filters; ``Hierarchy.ues`` still knows the UEs of every
+cohort, students or not. Writes to the reference tables (and student cohort
+changes) call ``invalidate_hierarchy``, which drops this process's copy and
+bumps a version in the shared cache so other processes rebuild too; with a
+per-process cache backend they rebuild after HIERARCHY_MAX_AGE at most.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import UE, Departement, Etudiant, Filiere, Niveau
+
+VERSION_KEY = 'hierarchy:version'
+# seconds a process trusts its copy without seeing an invalidation
+HIERARCHY_MAX_AGE = 300
+
+_lock = threading.Lock()
+_cached = None  # (version, built_at, Hierarchy)
+
+
+class Hierarchy:
+    """The tree plus the lookups the pages need; every list is ordered like the old querysets."""
+
+    def __init__(self, departements, niveaux, ues):
+        self.departements = departements
+        self.niveaux = niveaux
+        self.tree = {'departements': departements, 'niveaux': niveaux}
+        self.content = json.dumps(self.tree, ensure_ascii=False, separators=(',', ':')).encode()
+        self.etag = hashlib.sha1(self.content).hexdigest()
+        self._filieres = {f['id']: f for d in departements for f in d['filieres']}
+        # every cohort's UEs, including cohorts without students (absent from the tree)
+        self._ues = ues
+
+    def filieres(self, departement_id=None):
+        if departement_id is None:
+            return sorted(self._filieres.values(), key=lambda f: f['id'])
+        for d in self.departements:
+            if d['id'] == departement_id:
+                return d['filieres']
+        return []
+
+    def filiere_niveaux(self, filiere_id):
+        filiere = self._filieres.get(filiere_id)
+        return filiere['niveaux'] if filiere else []
+
+    def ues(self, filiere_id, niveau_id, semester=None):
+        return [u for u in self._ues.get((filiere_id, niveau_id), ()) if semester is None or u['semester'] == semester]
+
+
+def build_hierarchy():
+    """The whole tree in five queries."""
+    niveaux = [{'id': pk, 'nom': nom} for pk, nom in Niveau.objects.order_by('id').values_list('id', 'nom')]
+    niveau_names = {n['id']: n['nom'] for n in niveaux}
+
+    ues = {}
+    for pk, code, nom, semester, filiere_id, niveau_id in UE.objects.order_by('code').values_list(
+        'id', 'code', 'nom', 'semester', 'filiere_id', 'niveau_id'
+    ):
+        ues.setdefault((filiere_id, niveau_id), []).append({'id': pk, 'code': code, 'nom': nom, 'semester': semester})
+
+    cohorts = {}
+    for filiere_id, niveau_id in Etudiant.objects.filter(niveau__isnull=False).values_list('filiere_id', 'niveau_id').distinct():
+        cohorts.setdefault(filiere_id, set()).add(niveau_id)
+
+    filieres = {}
+    for pk, nom, departement_id in Filiere.objects.order_by('id').values_list('id', 'nom', 'departement_id'):
+        filieres.setdefault(departement_id, []).append({
+            'id': pk,
+            'nom': nom,
+            'niveaux': [
+                {'id': niveau_id, 'nom': niveau_names[niveau_id], 'ues': ues.get((pk, niveau_id), [])}
+                for niveau_id in sorted(cohorts.get(pk, ()))
+            ],
+        })
+
+    departements = [
+        {'id': pk, 'nom': nom, 'filieres': filieres.get(pk, [])}
+        for pk, nom in Departement.objects.order_by('id').values_list('id', 'nom')
+    ]
+    return Hierarchy(departements, niveaux, ues)
+
+
+def get_hierarchy():
+    """The process's copy of the tree, rebuilt after an invalidation or HIERARCHY_MAX_AGE."""
+    global _cached
+    version = cache.get(VERSION_KEY, 0)
+    with _lock:
+        if _cached is not None:
+            cached_version, built_at, hierarchy = _cached
+            if cached_version == version and time.monotonic() - built_at < HIERARCHY_MAX_AGE:
+                return hierarchy
+        hierarchy = build_hierarchy()
+        _cached = (version, time.monotonic(), hierarchy)
+        return hierarchy
+
+
+def invalidate_hierarchy():
+    global _cached
+    with _lock:
+        _cached = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
@@ -0,0 +1,262 @@
+"""Bulk grade import/export: stream sheet rows, resolve matricules per chunk, bulk upsert.
+
+Sheets have the columns Nom, Matricule, CC, TP, SN and come as xlsx or CSV;
+both formats go through the same row readers and the same chunked writer.
+"""
+import codecs
+import csv
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import FilteredRelation, Q
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from .models import Etudiant, GradeVersion, Note
+from .signals import sync_after_bulk_write
+
+# sheet rows resolved and written per batch
+IMPORT_CHUNK_SIZE = 1000
+
+# seconds an imported sheet's hash is remembered to skip identical re-uploads
+SHEET_DIGEST_CACHE_TIMEOUT = 24 * 3600
+
+SHEET_HEADERS = ('Nom', 'Matricule', 'CC', 'TP', 'SN')
+SHEET_FORMATS = ('xlsx', 'csv')
+
+
+def iter_xlsx_rows(file_obj):
+    """Yield (row_number, values) for every data row of the active sheet, streaming."""
+    wb = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            yield row_idx, row
+    finally:
+        wb.close()
+
+
+def iter_csv_rows(file_obj):
+    """Yield (row_number, values) for every data row of a UTF-8 CSV, streaming.
+
+    The delimiter (``,`` or ``;`` as written by a French Excel) is taken from
+    the header line.
+    """
+    lines = codecs.iterdecode(file_obj, 'utf-8-sig')
+    header = next(lines, '')
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    for row_idx, row in enumerate(csv.reader(lines, delimiter=delimiter), start=2):
+        yield row_idx, [value.strip() or None for value in row]
+
+
+def iter_sheet_rows(file_obj, file_format):
+    """Row reader for an uploaded sheet in one of SHEET_FORMATS."""
+    if file_format == 'csv':
+        return iter_csv_rows(file_obj)
+    return iter_xlsx_rows(file_obj)
+
+
+def export_rows(ue):
+    """(Nom, Matricule, CC, TP, SN) tuples for every student of the UE's filière/niveau."""
+    return (
+        Etudiant.objects.filter(filiere_id=ue.filiere_id, niveau_id=ue.niveau_id)
+        .annotate(ue_note=FilteredRelation('note', condition=Q(note__ue_id=ue.id)))
+        .order_by('nom', 'id')
+        .values_list('nom', 'matricule', 'ue_note__cc', 'ue_note__tp', 'ue_note__sn')
+    )
+
+
+def write_xlsx(rows, output, headers=SHEET_HEADERS, widths=(25, 15, 10, 10, 10), title='Notes'):
+    """Write a header plus ``rows`` to ``output`` with a write-only workbook."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    for column, width in zip('ABCDEFGHIJ', widths):
+        ws.column_dimensions[column].width = width
+
+    header_fill = PatternFill(start_color='1F4788', end_color='1F4788', fill_type='solid')
+    header_font = Font(bold=True, color='FFFFFF')
+    header = []
+    for label in headers:
+        cell = WriteOnlyCell(ws, value=label)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center')
+        header.append(cell)
+    ws.append(header)
+    for row in rows:
+        ws.append(['' if value is None else value for value in row])
+    wb.save(output)
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, headers=SHEET_HEADERS):
+    """Yield a header plus ``rows`` as CSV lines, one at a time."""
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the file as UTF-8
+    yield '\ufeff' + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def parse_grade(value, label):
+    """Convert a sheet cell to a grade in [0, 20] or None."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.replace(',', '.')  # decimal comma from French CSVs
+    value = float(value)
+    if value < 0 or value > 20:
+        raise ValueError(f"{label} doit être entre 0 et 20")
+    return value
+
+
+def _write_chunk(ue, chunk, results, touched, dry_run=False):
+    matricules = {str(row[1]) for _, row in chunk}
+    ids = dict(Etudiant.objects.filter(matricule__in=matricules).values_list('matricule', 'id'))
+    # current grades of the chunk's students: only rows that differ get written
+    existing = {
+        etudiant_id: (pk, (cc, tp, sn))
+        for pk, etudiant_id, cc, tp, sn in Note.objects.filter(ue=ue, etudiant_id__in=ids.values()).values_list('id', 'etudiant_id', 'cc', 'tp', 'sn')
+    }
+
+    pending = {}
+    for row_idx, (nom, matricule, cc, tp, sn) in chunk:
+        etudiant_id = ids.get(str(matricule))
+        if etudiant_id is None:
+            results['errors'].append(f"Row {row_idx}: Le matricule '{matricule}' de l'élève '{nom}' n'existe pas ou est incorrecte")
+            continue
+        try:
+            cc, tp, sn = parse_grade(cc, 'CC'), parse_grade(tp, 'TP'), parse_grade(sn, 'SN')
+        except (ValueError, TypeError) as e:
+            results['errors'].append(f"Row {row_idx}: Erreur de conversion pour {matricule}: {str(e)}")
+            continue
+        if etudiant_id in pending:
+            note = pending[etudiant_id]
+            pk, before = note.pk, (note.cc, note.tp, note.sn)
+        else:
+            pk, before = existing.get(etudiant_id, (None, None))
+        if before == (cc, tp, sn):
+            results['unchanged'] += 1
+            continue
+        if before is None:
+            results['imported'] += 1
+        else:
+            results['updated'] += 1
+        if 'changes' in results:
+            results['changes'].append({
+                'row': row_idx,
+                'matricule': str(matricule),
+                'nom': nom,
+                'before': dict(zip(('cc', 'tp', 'sn'), before)) if before else None,
+                'after': {'cc': cc, 'tp': tp, 'sn': sn},
+            })
+        note = Note(pk=pk, etudiant_id=etudiant_id, ue=ue, cc=cc, tp=tp, sn=sn)
+        note.compute_final(ue)
+        pending[etudiant_id] = note
+
+    if dry_run:
+        return
+    # split before bulk_create, which sets the pks of the new notes
+    created = [n for n in pending.values() if n.pk is None]
+    updated = [n for n in pending.values() if n.pk is not None]
+    if created:
+        # notes another upload or the batch API created since the read above are updated
+        raced = Note.objects.filter(ue=ue, etudiant_id__in=[n.etudiant_id for n in created]).count()
+        results['imported'] -= raced
+        results['updated'] += raced
+    Note.objects.bulk_create(
+        created,
+        update_conflicts=True,
+        unique_fields=['etudiant', 'ue'],
+        update_fields=['cc', 'tp', 'sn', 'final', 'is_eliminated'],
+    )
+    Note.objects.bulk_update(updated, ['cc', 'tp', 'sn', 'final', 'is_eliminated'])
+    touched.update(pending)
+
+
+def import_rows(ue, rows, progress=None, dry_run=False):
+    """Upsert the notes of ``ue`` from (row_number, values) rows in one transaction.
+
+    Values are (Nom, Matricule, CC, TP, SN). Rows whose grades match the
+    stored note are counted as unchanged and not written. ``progress``, if
+    given, is called with the number of rows processed after each chunk.
+    With ``dry_run`` nothing is written and the summary lists the changes
+    that would be applied. Returns the import summary with the
+    imported/updated/unchanged counts, per-row errors and throughput.
+    """
+    started = time.perf_counter()
+    results = {'imported': 0, 'updated': 0, 'unchanged': 0, 'errors': [], 'rows': 0}
+    if dry_run:
+        results['changes'] = []
+    touched = set()
+    with transaction.atomic():
+        chunk = []
+        for row_idx, row in rows:
+            row = tuple(row[:5]) + (None,) * (5 - len(row))
+            if not row[0] and not row[1]:  # Skip empty rows
+                continue
+            results['rows'] += 1
+            chunk.append((row_idx, row))
+            if len(chunk) == IMPORT_CHUNK_SIZE:
+                _write_chunk(ue, chunk, results, touched, dry_run)
+                chunk = []
+                if progress:
+                    progress(results['rows'])
+        if chunk:
+            _write_chunk(ue, chunk, results, touched, dry_run)
+        if touched:
+            # bulk writes bypass the post_save signals
+            sync_after_bulk_write(touched, [ue.id])
+    seconds = time.perf_counter() - started
+    results['rows_per_second'] = round(results['rows'] / seconds, 1) if seconds > 0 else None
+    return results
+
+
+def sheet_digest(file_obj):
+    """SHA-256 of an uploaded file, read in chunks; the file is rewound."""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(64 * 1024), b''):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def _digest_key(ue, digest):
+    return f'sheet_import:{ue.id}:{digest}'
+
+
+def import_sheet(ue, file_obj, file_format, progress=None, dry_run=False):
+    """Import an uploaded sheet, short-circuiting identical re-uploads.
+
+    A sheet whose content hash was already imported into ``ue`` while the
+    cohort's GradeVersion has not moved since cannot change anything: the
+    previous summary is returned with ``duplicate`` set and no row is read.
+    """
+    digest = sheet_digest(file_obj)
+    version = GradeVersion.current(ue.filiere_id, ue.niveau_id)
+    previous = cache.get(_digest_key(ue, digest))
+    if previous and previous['version'] == version:
+        results = dict(previous['results'], imported=0, updated=0, duplicate=True, rows_per_second=None)
+        results['unchanged'] = results['rows'] - len(results['errors'])
+        if dry_run:
+            results['changes'] = []
+        return results
+
+    results = import_rows(ue, iter_sheet_rows(file_obj, file_format), progress=progress, dry_run=dry_run)
+    if not dry_run:
+        summary = {k: v for k, v in results.items() if k != 'rows_per_second'}
+        cache.set(
+            _digest_key(ue, digest),
+            {'version': GradeVersion.current(ue.filiere_id, ue.niveau_id), 'results': summary},
+            SHEET_DIGEST_CACHE_TIMEOUT,
+        )
+    return results
@@ -0,0 +1,130 @@
+"""Background grade imports: ImportJob rows drained by a small thread pool or by
+the ``process_import_jobs`` management command.
+
+Rows are written in one transaction, so live progress cannot be read from the
+job row while it runs; it is published in the cache instead (use a shared
+cache backend when the web server runs several processes).
+"""
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .imports import import_sheet
+from .models import ImportJob
+
+# seconds the live row counter of a running job is kept
+PROGRESS_CACHE_TIMEOUT = 3600
+# seconds after which a running job is taken for lost (its worker died or was restarted)
+STALE_JOB_TIMEOUT = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _progress_key(job_id):
+    return f'import_job:{job_id}:rows'
+
+
+def rows_processed(job):
+    """Rows handled so far: the live counter while running, the stored one otherwise."""
+    if job.status == ImportJob.RUNNING:
+        return cache.get(_progress_key(job.pk), job.rows_processed)
+    return job.rows_processed
+
+
+def run_import_job(job_id):
+    """Claim a pending job and process it. Returns False if another worker had it."""
+    claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.PENDING).update(
+        status=ImportJob.RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+    job = ImportJob.objects.select_related('ue').get(pk=job_id)
+    key = _progress_key(job.pk)
+    try:
+        results = import_sheet(
+            job.ue, BytesIO(bytes(job.payload)), job.file_format,
+            progress=lambda rows: cache.set(key, rows, PROGRESS_CACHE_TIMEOUT),
+        )
+    except Exception as e:
+        job.status = ImportJob.FAILED
+        job.error = f'Erreur de lecture du fichier: {str(e)}'
+    else:
+        job.status = ImportJob.DONE
+        job.rows_processed = results['rows']
+        job.result = results
+    job.payload = b''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'rows_processed', 'result', 'payload', 'finished_at'])
+    cache.delete(key)
+    return True
+
+
+def _run_in_thread(job_id):
+    try:
+        run_import_job(job_id)
+    finally:
+        # worker threads own their connection
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMPORT_JOB_WORKERS, thread_name_prefix='import-job')
+        return _executor
+
+
+def enqueue_import(ue, user, file_obj, file_format='xlsx'):
+    """Store the upload as a pending job and hand it to the worker pool once committed.
+
+    With IMPORT_JOB_WORKERS = 0 jobs stay pending until ``process_import_jobs`` runs.
+    """
+    job = ImportJob.objects.create(
+        ue=ue, created_by=user, filename=getattr(file_obj, 'name', '') or '', file_format=file_format,
+        payload=file_obj.read(),
+    )
+    if settings.IMPORT_JOB_WORKERS:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+    return job
+
+
+def fail_stale_jobs():
+    """Mark the jobs running for more than STALE_JOB_TIMEOUT as failed; returns how many.
+
+    Their rows were written in one transaction, so a lost worker left nothing
+    behind and the sheet can simply be uploaded again.
+    """
+    now = timezone.now()
+    stale = ImportJob.objects.filter(
+        status=ImportJob.RUNNING, started_at__lt=now - timedelta(seconds=STALE_JOB_TIMEOUT),
+    )
+    ids = list(stale.values_list('id', flat=True))
+    failed = stale.filter(pk__in=ids).update(
+        status=ImportJob.FAILED, error="Import interrompu, renvoyez le fichier", payload=b'', finished_at=now,
+    )
+    cache.delete_many([_progress_key(job_id) for job_id in ids])
+    return failed
+
+
+def drain_pending(limit=None):
+    """Process pending jobs oldest first in this thread; returns how many were run.
+
+    Jobs lost while running (see fail_stale_jobs) are failed first.
+    """
+    fail_stale_jobs()
+    done = 0
+    while limit is None or done < limit:
+        job_id = ImportJob.objects.filter(status=ImportJob.PENDING).order_by('created_at', 'id').values_list('id', flat=True).first()
+        if job_id is None:
+            break
+        if run_import_job(job_id):
+            done += 1
+    return done
@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from notes.deliberation import deliberate
+from notes.models import UE, Departement, Etudiant, Filiere, Niveau, Note
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the deliberation engine on a throwaway cohort (rolled back), 10k students x 12 UEs by default."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--ues', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        def grade():
+            # a few missing components so some students are eliminated
+            return None if rng.random() < 0.03 else round(rng.uniform(4, 20), 2)
+
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                dep = Departement.objects.create(nom='Benchmark')
+                fil = Filiere.objects.create(nom='Benchmark', departement=dep)
+                niv = Niveau.objects.create(nom='Benchmark')
+                ues = [
+                    UE.objects.create(code=f'BENCH{i:02d}', nom=f'Benchmark {i}', credit=rng.choice((2, 4, 6)), filiere=fil, niveau=niv)
+                    for i in range(options['ues'])
+                ]
+                students = Etudiant.objects.bulk_create(
+                    Etudiant(nom=f'Etudiant {i:06d}', matricule=f'BENCH{i:06d}', filiere=fil, niveau=niv)
+                    for i in range(options['students'])
+                )
+                batch = []
+                for etudiant in students:
+                    for ue in ues:
+                        note = Note(etudiant=etudiant, ue=ue, cc=grade(), tp=grade(), sn=grade())
+                        note.compute_final(ue)
+                        batch.append(note)
+                    if len(batch) >= 10000:
+                        Note.objects.bulk_create(batch)
+                        batch = []
+                Note.objects.bulk_create(batch)
+                self.stdout.write(f"cohorte: {len(students)} étudiants x {len(ues)} UE en {time.perf_counter() - started:.1f}s")
+
+                with CaptureQueriesContext(connection) as ctx:
+                    result = deliberate(fil.id, niv.id, 1)
+                summary = result['summary']
+                self.stdout.write(
+                    f"délibération: {result['seconds']:.3f}s, {len(ctx.captured_queries)} requêtes, "
+                    f"{summary['admis']} admis, {summary['compenses']} par compensation, {summary['ajournes']} ajournés"
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
@@ -0,0 +1,69 @@
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from notes.imports import export_rows, import_rows, iter_csv, iter_sheet_rows, write_xlsx
+from notes.models import UE, Departement, Etudiant, Filiere, Niveau
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare the xlsx (openpyxl) and CSV import/export paths on a throwaway cohort (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Students in the generated cohort")
+
+    def _timed(self, label, rows, func):
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+        rate = round(rows / seconds, 1) if seconds > 0 else None
+        self.stdout.write(f"{label:<22} {seconds:8.3f}s  {rate} lignes/s")
+        return result
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        try:
+            with transaction.atomic():
+                dep = Departement.objects.create(nom='Benchmark')
+                fil = Filiere.objects.create(nom='Benchmark', departement=dep)
+                niv = Niveau.objects.create(nom='Benchmark')
+                # one UE per format, so both imports insert every row
+                ues = {
+                    file_format: UE.objects.create(code=f'BENCH{file_format.upper()}', nom='Benchmark', credit=6, filiere=fil, niveau=niv)
+                    for file_format in ('xlsx', 'csv')
+                }
+                Etudiant.objects.bulk_create(
+                    Etudiant(nom=f'Etudiant {i:06d}', matricule=f'BENCH{i:06d}', filiere=fil, niveau=niv)
+                    for i in range(rows)
+                )
+                sheet = [(f'Etudiant {i:06d}', f'BENCH{i:06d}', i % 20, (i * 7) % 20, (i * 3) % 20) for i in range(rows)]
+
+                def build_xlsx():
+                    out = BytesIO()
+                    write_xlsx(sheet, out)
+                    return out.getvalue()
+
+                def build_csv():
+                    return ''.join(iter_csv(sheet)).encode('utf-8')
+
+                files = {
+                    'xlsx': self._timed('xlsx: écriture', rows, build_xlsx),
+                    'csv': self._timed('csv: écriture', rows, build_csv),
+                }
+                for file_format, content in files.items():
+                    self._timed(f'{file_format}: lecture', rows, lambda: sum(1 for _ in iter_sheet_rows(BytesIO(content), file_format)))
+                    self._timed(f'{file_format}: import', rows, lambda: import_rows(ues[file_format], iter_sheet_rows(BytesIO(content), file_format)))
+
+                ue = ues['xlsx']
+                self._timed('xlsx: export', rows, lambda: write_xlsx(export_rows(ue).iterator(), tempfile.TemporaryFile()))
+                self._timed('csv: export', rows, lambda: sum(len(line) for line in iter_csv(export_rows(ue).iterator())))
+                raise _Rollback
+        except _Rollback:
+            pass
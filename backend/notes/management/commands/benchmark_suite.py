@@ -0,0 +1,162 @@
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from notes.dashboard import invalidate_dashboard
+from notes.hierarchy import invalidate_hierarchy
+from notes.imports import write_xlsx
+from notes.models import UE, Etudiant
+from notes.seeding import seed_faculty
+
+# bump when scenarios or their parameters change, so results stay comparable
+SUITE_VERSION = 2
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the main views, imports and exports on throwaway faculties of several sizes (rolled back); writes JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help="Comma-separated student counts, one dataset each")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per scenario")
+        parser.add_argument('--output', default='benchmark.json', help="JSON results file ('-' for stdout only)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        results = {
+            'suite_version': SUITE_VERSION,
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'sizes': [],
+        }
+        # the test client talks to the views through the full middleware stack
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for size in sizes:
+                results['sizes'].append(self._run_size(size, options['repeat'], options['seed']))
+
+        payload = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output'] == '-':
+            self.stdout.write(payload)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f"résultats écrits dans {options['output']}"))
+
+    def _run_size(self, size, repeat, seed):
+        # SQLite reuses the primary keys of a rolled-back dataset, so its cache entries would match the next one
+        self._clear_caches()
+        try:
+            with transaction.atomic():
+                counts = seed_faculty(departements=1, filieres=2, niveaux=3, ues=12, students=size, instructors=10, prefix='BENCH', seed=seed)
+                self.stdout.write(f"--- {counts['etudiants']} étudiants, {counts['notes']} notes (données en {counts['seconds']:.1f}s)")
+                result = {'students': size, 'dataset': counts, 'scenarios': {}}
+                for name, run in self._scenarios():
+                    timing = result['scenarios'][name] = self._time(run, repeat)
+                    cold, cached = timing['cold'], timing['cached']
+                    self.stdout.write(
+                        f"{name:<24} froid {cold['median']:8.4f}s {cold['queries']:>4} requêtes  "
+                        f"en cache {cached['median']:8.4f}s {cached['queries']:>4} requêtes  {timing['bytes']} octets"
+                    )
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            # drop everything cached from the rolled-back rows
+            self._clear_caches()
+        return result
+
+    def _clear_caches(self):
+        cache.clear()
+        # also drops this process's copy of the hierarchy
+        invalidate_hierarchy()
+        invalidate_dashboard(progress=True)
+
+    def _scenarios(self):
+        """(name, callable returning a response) pairs, on the first cohort of the dataset."""
+        client = Client()
+        client.force_login(User.objects.create_superuser('bench_admin', password=None))
+        ue = UE.objects.filter(code__startswith='BENCH').order_by('code').first()
+        cohort = {'filiere': ue.filiere_id, 'niveau': ue.niveau_id}
+        etudiant = Etudiant.objects.filter(filiere_id=ue.filiere_id, niveau_id=ue.niveau_id).order_by('nom', 'id').first()
+        sheet = list(Etudiant.objects.filter(filiere_id=ue.filiere_id, niveau_id=ue.niveau_id).values_list('nom', 'matricule'))
+        runs = iter(range(1, 1_000_000))
+
+        def import_xlsx():
+            # new grades on every run, otherwise the upload is skipped as a duplicate
+            shift = next(runs) % 10
+            content = BytesIO()
+            write_xlsx([(nom, matricule, 10 + shift, 12, (i + shift) % 20) for i, (nom, matricule) in enumerate(sheet)], content)
+            content.seek(0)
+            content.name = 'notes.xlsx'
+            return client.post('/api/notes/import/', {'ue_id': ue.id, 'file': content})
+
+        return [
+            ('notes_json', lambda: client.get('/api/notes/', {**cohort, 'page_size': 50})),
+            ('notes_json_cursor', lambda: client.get('/api/notes/', {**cohort, 'page_size': 50, 'pagination': 'cursor'})),
+            ('etudiant_list', lambda: client.get('/etudiants/', cohort)),
+            ('etudiant_list_sort_note', lambda: client.get('/etudiants/', {**cohort, 'ue': ue.id, 'sort': 'note'})),
+            ('moyenne_etudiant_pdf', lambda: client.get(f'/moyenne/{etudiant.id}/export/')),
+            ('notes_import_excel', import_xlsx),
+            ('notes_export_excel', lambda: client.get('/api/notes/export/', {'ue_id': ue.id})),
+            ('notes_export_csv', lambda: client.get('/api/notes/export/csv/', {'ue_id': ue.id})),
+        ]
+
+    def _time(self, run, repeat):
+        """Timings of ``repeat`` cold runs (caches cleared before each) and ``repeat`` cached runs.
+
+        The cached runs follow a run that fills the caches. Queries are counted
+        on the first run of each; status and size come from the first cold run.
+        """
+        cold = self._runs(run, repeat, clear=True)
+        self._clear_caches()
+        run()
+        cached = self._runs(run, repeat, clear=False)
+        return {
+            'status': cold['status'],
+            'bytes': cold['bytes'],
+            'cold': cold['timing'],
+            'cached': cached['timing'],
+        }
+
+    def _runs(self, run, repeat, clear):
+        seconds = []
+        for i in range(max(repeat, 1)):
+            if clear:
+                self._clear_caches()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = run()
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                seconds.append(time.perf_counter() - started)
+            if i == 0:
+                status, queries, size = response.status_code, len(ctx.captured_queries), len(content)
+        return {
+            'status': status,
+            'bytes': size,
+            'timing': {
+                'min': round(min(seconds), 5),
+                'median': round(statistics.median(seconds), 5),
+                'max': round(max(seconds), 5),
+                'queries': queries,
+            },
+        }
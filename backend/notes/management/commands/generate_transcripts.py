@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.transcripts import collect_cohort, render_cohort
+
+
+class Command(BaseCommand):
+    help = "Render every transcript of a filière/niveau to a ZIP or a single PDF and report pages/sec."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filiere', type=int, required=True)
+        parser.add_argument('--niveau', type=int, required=True)
+        parser.add_argument('--semester', type=int, choices=[1, 2])
+        parser.add_argument('--output', choices=['zip', 'pdf'], default='zip')
+        parser.add_argument('--workers', type=int, help="Worker processes (default: TRANSCRIPT_WORKERS, one per CPU)")
+        parser.add_argument('--dest', help="Output file (default: releves_<filiere>_<niveau>.<output>)")
+
+    def handle(self, *args, **options):
+        datas = collect_cohort(options['filiere'], options['niveau'], options['semester'])
+        if not datas:
+            raise CommandError("Aucun étudiant pour cette filière/niveau")
+        dest = Path(options['dest'] or f"releves_{options['filiere']}_{options['niveau']}.{options['output']}")
+        with dest.open('wb') as out:
+            stats = render_cohort(datas, out, output=options['output'], workers=options['workers'] or settings.TRANSCRIPT_WORKERS)
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['transcripts']} relevé(s), {stats['pages']} page(s) en {stats['seconds']}s "
+            f"({stats['pages_per_second']} pages/s) -> {dest}"
+        ))
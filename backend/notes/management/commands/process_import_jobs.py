@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notes.jobs import drain_pending
+
+
+class Command(BaseCommand):
+    help = "Process the pending grade import jobs (ImportJob), oldest first."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs instead of exiting")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between polls with --loop")
+        parser.add_argument('--limit', type=int, help="Process at most this many jobs per pass")
+
+    def handle(self, *args, **options):
+        while True:
+            done = drain_pending(options['limit'])
+            if done:
+                self.stdout.write(self.style.SUCCESS(f"{done} import(s) traité(s)"))
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
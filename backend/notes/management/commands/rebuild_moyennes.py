@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from notes.models import Etudiant, MoyenneSemestre
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized per-semester averages (MoyenneSemestre) from the notes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filiere', type=int, help="Only students of this filière id")
+        parser.add_argument('--niveau', type=int, help="Only students of this niveau id")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Students refreshed per batch")
+
+    def handle(self, *args, **options):
+        students = Etudiant.objects.order_by('id')
+        if options['filiere']:
+            students = students.filter(filiere_id=options['filiere'])
+        if options['niveau']:
+            students = students.filter(niveau_id=options['niveau'])
+
+        chunk_size = options['chunk_size']
+        done = 0
+        chunk = []
+        for etudiant_id in students.values_list('id', flat=True).iterator(chunk_size=chunk_size):
+            chunk.append(etudiant_id)
+            if len(chunk) == chunk_size:
+                MoyenneSemestre.refresh(chunk)
+                done += len(chunk)
+                chunk = []
+        if chunk:
+            MoyenneSemestre.refresh(chunk)
+            done += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"{done} étudiant(s) recalculé(s)"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from notes.models import Etudiant
+from notes.seeding import seed_faculty
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic faculty (bulk_create) for performance work: 100k students and 1.2M notes by default."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departements', type=int, default=4)
+        parser.add_argument('--filieres', type=int, default=3, help="Filières per département")
+        parser.add_argument('--niveaux', type=int, default=3)
+        parser.add_argument('--ues', type=int, default=12, help="UEs per filière/niveau, alternating semesters")
+        parser.add_argument('--students', type=int, default=100_000)
+        parser.add_argument('--instructors', type=int, default=200)
+        parser.add_argument('--prefix', default='SEED', help="Prefix of matricules, UE codes and usernames (5 characters max)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if not prefix or len(prefix) > 5:
+            raise CommandError("--prefix doit faire de 1 à 5 caractères")
+        if Etudiant.objects.filter(matricule__startswith=prefix).exists():
+            raise CommandError(f"Des étudiants avec le préfixe {prefix} existent déjà, choisissez un autre --prefix")
+
+        with transaction.atomic():
+            counts = seed_faculty(
+                departements=options['departements'], filieres=options['filieres'], niveaux=options['niveaux'],
+                ues=options['ues'], students=options['students'], instructors=options['instructors'],
+                prefix=prefix, seed=options['seed'], progress=self.stdout.write,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['etudiants']} étudiants, {counts['notes']} notes, {counts['ues']} UE en {counts['seconds']:.1f}s"
+        ))
@@ -0,0 +1,146 @@
+"""Per-view latency and SQL metrics, exposed in the Prometheus text format.
+
+MetricsMiddleware times a sample of the requests (settings.METRICS_SAMPLE_RATE)
+and, through a database execute wrapper, counts the queries they run and the
+time spent in them, labelled by the resolved URL name. Unsampled requests go
+straight to the view. Figures live in process memory, so every worker process
+reports its own. Queries a streaming response runs while being consumed
+happen after the middleware returns and are not counted.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = 'unresolved'
+
+
+def sample_rate():
+    return getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+
+
+class QueryTimer:
+    """Execute wrapper counting the queries run through it and their total time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class ViewMetrics:
+    __slots__ = ('buckets', 'count', 'seconds', 'queries', 'sql_seconds')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, seconds, queries, sql_seconds):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.count += 1
+            metrics.seconds += seconds
+            metrics.queries += queries
+            metrics.sql_seconds += sql_seconds
+            bucket = bisect_left(LATENCY_BUCKETS, seconds)
+            if bucket < len(LATENCY_BUCKETS):
+                metrics.buckets[bucket] += 1
+
+    def snapshot(self):
+        """{view: ViewMetrics copy}, taken under the lock."""
+        with self._lock:
+            copies = {}
+            for view, metrics in self._views.items():
+                copy = copies[view] = ViewMetrics()
+                for name in ViewMetrics.__slots__:
+                    value = getattr(metrics, name)
+                    setattr(copy, name, list(value) if isinstance(value, list) else value)
+            return copies
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format (0.0.4)."""
+        views = sorted(self.snapshot().items())
+        lines = [
+            '# HELP notes_metrics_sample_rate Fraction of the requests that are measured.',
+            '# TYPE notes_metrics_sample_rate gauge',
+            f'notes_metrics_sample_rate {sample_rate()}',
+            '# HELP notes_request_duration_seconds Latency of the sampled requests, per view.',
+            '# TYPE notes_request_duration_seconds histogram',
+        ]
+        for view, metrics in views:
+            label = _label(view)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                cumulative += count
+                lines.append(f'notes_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'notes_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {metrics.count}')
+            lines.append(f'notes_request_duration_seconds_sum{{view="{label}"}} {metrics.seconds}')
+            lines.append(f'notes_request_duration_seconds_count{{view="{label}"}} {metrics.count}')
+        lines += [
+            '# HELP notes_sql_queries_total SQL queries run by the sampled requests, per view.',
+            '# TYPE notes_sql_queries_total counter',
+        ]
+        lines += [f'notes_sql_queries_total{{view="{_label(view)}"}} {m.queries}' for view, m in views]
+        lines += [
+            '# HELP notes_sql_duration_seconds_total Time spent in SQL by the sampled requests, per view.',
+            '# TYPE notes_sql_duration_seconds_total counter',
+        ]
+        lines += [f'notes_sql_duration_seconds_total{{view="{_label(view)}"}} {m.sql_seconds}' for view, m in views]
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        registry.observe(match.view_name if match else UNRESOLVED, elapsed, timer.count, timer.seconds)
+        return response
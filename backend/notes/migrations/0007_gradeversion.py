@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_ue_semester'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('filiere', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='notes.filiere')),
+                ('niveau', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='notes.niveau')),
+            ],
+            options={
+                'unique_together': {('filiere', 'niveau')},
+            },
+        ),
+    ]
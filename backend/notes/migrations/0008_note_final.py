@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:31
+
+from django.db import migrations, models
+
+
+def backfill_finals(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    batch = []
+    for note in Note.objects.select_related('ue').iterator(chunk_size=2000):
+        ue = note.ue
+        note.is_eliminated = note.cc is None or note.tp is None or note.sn is None
+        note.final = None if note.is_eliminated else round(
+            note.cc * ue.cc_weight / 100.0 + note.tp * ue.tp_weight / 100.0 + note.sn * ue.sn_weight / 100.0, 2
+        )
+        batch.append(note)
+        if len(batch) == 2000:
+            Note.objects.bulk_update(batch, ['final', 'is_eliminated'])
+            batch = []
+    Note.objects.bulk_update(batch, ['final', 'is_eliminated'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0007_gradeversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='final',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Final'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='is_eliminated',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Éliminé'),
+        ),
+        migrations.RunPython(backfill_finals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['ue', 'final'], name='note_ue_final_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, F, Q, Sum
+
+
+def backfill_moyennes(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    MoyenneSemestre = apps.get_model('notes', 'MoyenneSemestre')
+    graded = Q(final__isnull=False)
+    rows = Note.objects.values('etudiant_id', 'ue__semester').annotate(
+        weighted=Sum(F('final') * F('ue__credit'), filter=graded),
+        counted=Sum('ue__credit', filter=graded),
+        eliminated=Count('id', filter=Q(is_eliminated=True)),
+    )
+    batch = []
+    for row in rows.iterator():
+        weighted, counted = row['weighted'] or 0, row['counted'] or 0
+        batch.append(MoyenneSemestre(
+            etudiant_id=row['etudiant_id'],
+            semester=row['ue__semester'],
+            weighted_sum=weighted,
+            credits=counted,
+            eliminated_count=row['eliminated'],
+            moyenne=round(weighted / counted, 2) if counted > 0 else None,
+        ))
+    MoyenneSemestre.objects.bulk_create(batch, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_note_final'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoyenneSemestre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.IntegerField(choices=[(1, 'Semestre 1'), (2, 'Semestre 2')])),
+                ('weighted_sum', models.FloatField(default=0)),
+                ('credits', models.IntegerField(default=0)),
+                ('eliminated_count', models.IntegerField(default=0)),
+                ('moyenne', models.FloatField(blank=True, null=True)),
+                ('etudiant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moyennes', to='notes.etudiant')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='moyennesemestre',
+            index=models.Index(fields=['semester', 'moyenne'], name='moyenne_semester_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='moyennesemestre',
+            unique_together={('etudiant', 'semester')},
+        ),
+        migrations.RunPython(backfill_moyennes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0010_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='file_format',
+            field=models.CharField(default='xlsx', max_length=4),
+        ),
+    ]
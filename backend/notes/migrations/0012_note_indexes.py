@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0011_importjob_file_format'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='etudiant',
+            index=models.Index(fields=['filiere', 'niveau', 'nom', 'id'], name='etudiant_cohort_nom_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['ue', 'etudiant'], include=('cc', 'tp', 'sn', 'final'), name='note_ue_etudiant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('cc__isnull', True), ('tp__isnull', True), ('sn__isnull', True), _connector='OR'), fields=['ue', 'etudiant'], name='note_ue_missing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ue',
+            index=models.Index(fields=['filiere', 'niveau', 'semester', 'code'], name='ue_cohort_semester_code_idx'),
+        ),
+    ]
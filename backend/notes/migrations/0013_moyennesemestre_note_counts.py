@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:46
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_note_counts(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    MoyenneSemestre = apps.get_model('notes', 'MoyenneSemestre')
+
+    def count(condition=Q()):
+        notes = Note.objects.filter(condition, etudiant_id=OuterRef('etudiant_id'), ue__semester=OuterRef('semester'))
+        counted = notes.order_by().values('etudiant_id').annotate(n=Count('id')).values('n')
+        return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+    MoyenneSemestre.objects.update(notes_count=count(), graded_count=count(Q(final__isnull=False)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0012_note_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyennesemestre',
+            name='graded_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='moyennesemestre',
+            name='notes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_note_counts, migrations.RunPython.noop),
+    ]
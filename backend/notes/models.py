@@ -1,4 +1,8 @@
-from django.db import models
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import Cast, Round
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 
@@ -35,6 +39,12 @@ class Etudiant(models.Model):
     filiere = models.ForeignKey(Filiere, on_delete=models.SET_NULL, null=True, blank=True)
     niveau = models.ForeignKey(Niveau, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # cohort lists ordered (and keyset-paginated) by (nom, id)
+            models.Index(fields=['filiere', 'niveau', 'nom', 'id'], name='etudiant_cohort_nom_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nom} ({self.matricule})"
 
@@ -60,6 +70,11 @@ class UE(models.Model):
     tp_weight = models.PositiveIntegerField(default=30)
     sn_weight = models.PositiveIntegerField(default=50)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['filiere', 'niveau', 'semester', 'code'], name='ue_cohort_semester_code_idx'),
+        ]
+
     def clean(self):
         total = self.cc_weight + self.tp_weight + self.sn_weight
         if total != 100:
@@ -67,12 +82,48 @@ class UE(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        weights_changed = self.pk is not None and not UE.objects.filter(
+            pk=self.pk, cc_weight=self.cc_weight, tp_weight=self.tp_weight, sn_weight=self.sn_weight
+        ).exists()
+        with transaction.atomic():
+            # before super().save(): its post_save handler refreshes the moyennes from the finals
+            if weights_changed:
+                self.recompute_finals()
+            super().save(*args, **kwargs)
+
+    def recompute_finals(self):
+        """Refresh the stored final of every note of this UE in one UPDATE."""
+        weighted = (
+            F('cc') * self.cc_weight / 100.0
+            + F('tp') * self.tp_weight / 100.0
+            + F('sn') * self.sn_weight / 100.0
+        )
+        # rounded as numeric, like final_score (PostgreSQL has no ROUND on double precision)
+        rounded = Round(Cast(weighted, models.DecimalField(max_digits=20, decimal_places=15)), 2)
+        Note.objects.filter(ue=self).update(final=Case(
+            When(is_eliminated=False, then=Cast(rounded, models.FloatField())),
+            default=None,
+            output_field=models.FloatField(),
+        ))
 
     def __str__(self):
         return f"{self.code} - {self.nom}"
 
 
+# finals are stored on 20 with two decimals
+FINAL_PRECISION = Decimal('0.01')
+
+
+def final_score(cc, tp, sn, cc_weight, tp_weight, sn_weight):
+    """Weighted final on 20, or None when a component is missing (eliminated)."""
+    if cc is None or tp is None or sn is None:
+        return None
+    total = (cc * cc_weight / 100.0) + (tp * tp_weight / 100.0) + (sn * sn_weight / 100.0)
+    # halves rounded up on the 15 significant digits a double keeps when cast to
+    # numeric, so UE.recompute_finals (SQL ROUND) stores the same value
+    return float(Decimal(f'{total:.15g}').quantize(FINAL_PRECISION, ROUND_HALF_UP))
+
+
 class Note(models.Model):
     etudiant = models.ForeignKey(Etudiant, on_delete=models.CASCADE)
     ue = models.ForeignKey(UE, on_delete=models.CASCADE)
@@ -82,25 +133,179 @@ class Note(models.Model):
     tp = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0), MaxValueValidator(20)])
     sn = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0), MaxValueValidator(20)])
 
+    # stored on save (and in bulk by UE.recompute_finals) so ranking and sorting
+    # by grade read an indexed column instead of recomputing from the UE weights
+    final = models.FloatField(null=True, blank=True, editable=False, verbose_name='Final')
+    is_eliminated = models.BooleanField(default=True, editable=False, verbose_name='Éliminé')
+
     class Meta:
         unique_together = ('etudiant', 'ue')
+        indexes = [
+            models.Index(fields=['ue', 'final'], name='note_ue_final_idx'),
+            # UE column lookups and exports; INCLUDE only applies on PostgreSQL
+            models.Index(fields=['ue', 'etudiant'], include=['cc', 'tp', 'sn', 'final'], name='note_ue_etudiant_idx'),
+            # notes still missing a component, a small subset once grading is done
+            models.Index(
+                fields=['ue', 'etudiant'],
+                condition=Q(cc__isnull=True) | Q(tp__isnull=True) | Q(sn__isnull=True),
+                name='note_ue_missing_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.etudiant.nom} - {self.ue.code}"
 
-    @property
-    def is_eliminated(self):
+    def compute_final(self, ue=None):
+        """Set final/is_eliminated from the components and the UE weights."""
+        ue = ue or self.ue
         # eliminated if any component is missing
-        return self.cc is None or self.tp is None or self.sn is None
+        self.is_eliminated = self.cc is None or self.tp is None or self.sn is None
+        self.final = final_score(self.cc, self.tp, self.sn, ue.cc_weight, ue.tp_weight, ue.sn_weight)
+
+    def save(self, *args, **kwargs):
+        self.compute_final()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'final', 'is_eliminated'}
+        super().save(*args, **kwargs)
+
+
+class GradeVersion(models.Model):
+    """Monotonic counter per (filière, niveau), bumped on every grade-affecting write.
+
+    Read views derive their ETag from it so unchanged grids can be answered
+    with a 304 after a single indexed lookup.
+    """
+    filiere = models.ForeignKey(Filiere, on_delete=models.CASCADE, null=True, blank=True)
+    niveau = models.ForeignKey(Niveau, on_delete=models.CASCADE, null=True, blank=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('filiere', 'niveau')
+
+    def __str__(self):
+        return f"{self.filiere_id}/{self.niveau_id} v{self.version}"
+
+    @classmethod
+    def current(cls, filiere_id, niveau_id):
+        version = cls.objects.filter(filiere_id=filiere_id, niveau_id=niveau_id).values_list('version', flat=True).first()
+        return version or 0
+
+    @classmethod
+    def bump(cls, filiere_id, niveau_id):
+        bumped = cls.objects.filter(filiere_id=filiere_id, niveau_id=niveau_id).update(version=models.F('version') + 1)
+        if not bumped:
+            _, created = cls.objects.get_or_create(filiere_id=filiere_id, niveau_id=niveau_id, defaults={'version': 1})
+            if not created:
+                # lost a creation race: the row exists now, bump it
+                cls.objects.filter(filiere_id=filiere_id, niveau_id=niveau_id).update(version=models.F('version') + 1)
+
+    @classmethod
+    def bump_many(cls, cohorts):
+        """Bump every distinct (filiere_id, niveau_id) pair in ``cohorts``."""
+        for filiere_id, niveau_id in set(cohorts):
+            cls.bump(filiere_id, niveau_id)
+
+
+class MoyenneSemestre(models.Model):
+    """Materialized credit-weighted average of a student for one semester.
+
+    Kept up to date by ``refresh`` whenever notes, UE credits or weights
+    change; ``manage.py rebuild_moyennes`` recomputes the whole table.
+    """
+    etudiant = models.ForeignKey(Etudiant, on_delete=models.CASCADE, related_name='moyennes')
+    semester = models.IntegerField(choices=UE.SEMESTER_CHOICES)
+    # sum of final * credit and of credits over the UEs with a final
+    weighted_sum = models.FloatField(default=0)
+    credits = models.IntegerField(default=0)
+    eliminated_count = models.IntegerField(default=0)
+    # notes entered and notes with a final, for the home page progress
+    notes_count = models.IntegerField(default=0)
+    graded_count = models.IntegerField(default=0)
+    moyenne = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('etudiant', 'semester')
+        indexes = [
+            models.Index(fields=['semester', 'moyenne'], name='moyenne_semester_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.etudiant_id} S{self.semester}: {self.moyenne}"
 
-    @property
-    def final(self):
-        # returns final score computed from component weights, or None if missing
-        if self.is_eliminated:
+    @classmethod
+    def overall(cls, etudiant_id):
+        """Credit-weighted average over every semester, or None when nothing is graded."""
+        totals = cls.objects.filter(etudiant_id=etudiant_id).aggregate(weighted=Sum('weighted_sum'), counted=Sum('credits'))
+        if not totals['counted']:
             return None
-        total = (
-            (self.cc * self.ue.cc_weight / 100.0)
-            + (self.tp * self.ue.tp_weight / 100.0)
-            + (self.sn * self.ue.sn_weight / 100.0)
+        return round(totals['weighted'] / totals['counted'], 2)
+
+    @classmethod
+    def refresh(cls, etudiant_ids, semesters=None):
+        """Recompute the rows of ``etudiant_ids`` (optionally only some semesters) in a few queries."""
+        etudiant_ids = list(etudiant_ids)
+        if not etudiant_ids:
+            return
+        notes = Note.objects.filter(etudiant_id__in=etudiant_ids)
+        stale = cls.objects.filter(etudiant_id__in=etudiant_ids)
+        if semesters is not None:
+            notes = notes.filter(ue__semester__in=semesters)
+            stale = stale.filter(semester__in=semesters)
+        graded = Q(final__isnull=False)
+        rows = notes.values('etudiant_id', 'ue__semester').annotate(
+            weighted=Sum(F('final') * F('ue__credit'), filter=graded),
+            counted=Sum('ue__credit', filter=graded),
+            eliminated=Count('id', filter=Q(is_eliminated=True)),
+            entered=Count('id'),
+            graded_notes=Count('id', filter=graded),
         )
-        return round(total, 2)
+        moyennes = []
+        for row in rows:
+            weighted, counted = row['weighted'] or 0, row['counted'] or 0
+            moyennes.append(cls(
+                etudiant_id=row['etudiant_id'],
+                semester=row['ue__semester'],
+                weighted_sum=weighted,
+                credits=counted,
+                eliminated_count=row['eliminated'],
+                notes_count=row['entered'],
+                graded_count=row['graded_notes'],
+                moyenne=round(weighted / counted, 2) if counted > 0 else None,
+            ))
+        with transaction.atomic():
+            # replace the rows in scope; the upsert covers a concurrent refresh
+            stale.delete()
+            cls.objects.bulk_create(
+                moyennes,
+                update_conflicts=True,
+                unique_fields=['etudiant', 'semester'],
+                update_fields=['weighted_sum', 'credits', 'eliminated_count', 'notes_count', 'graded_count', 'moyenne'],
+            )
+
+
+class ImportJob(models.Model):
+    """A grade sheet upload processed in the background (see notes.jobs)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'En attente'), (RUNNING, 'En cours'), (DONE, 'Terminé'), (FAILED, 'Échec')]
+
+    ue = models.ForeignKey(UE, on_delete=models.CASCADE)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    file_format = models.CharField(max_length=4, default='xlsx')  # notes.imports.SHEET_FORMATS
+    # uploaded sheet, cleared once processed
+    payload = models.BinaryField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    rows_processed = models.IntegerField(default=0)
+    # import summary: imported/updated/errors/rows/rows_per_second
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import {self.pk} ({self.ue_id}) - {self.status}"
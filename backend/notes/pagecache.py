@@ -0,0 +1,93 @@
+"""Data of the public read pages, cached under dependency tags.
+
+An entry is stored in Django's cache under a key built from the page name,
+its normalized query and the current version of every tag it depends on:
+a cohort (filière x niveau), a UE, a student, or the reference tables.
+Invalidating a tag gives it a new version, so the entries built on the old
+one are never read again and simply expire. Nothing has to list or delete
+keys, which keeps this working with the local-memory and file backends.
+
+Writes invalidate from the signals in notes.signals (and from
+sync_after_bulk_write for bulk paths). Entries are always built from the
+primary: one built from a lagging replica after a write would be stored
+under the new tag versions and served, even to the writer, until it expires.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import urlencode
+
+from .routers import primary_reads
+
+# seconds an entry is kept without being invalidated
+PAGE_CACHE_TIMEOUT = 300
+STRUCTURE_TAG = 'structure'
+
+
+def cohort_tag(filiere_id, niveau_id):
+    return f'cohort:{filiere_id}:{niveau_id}'
+
+
+def ue_tag(ue_id):
+    return f'ue:{ue_id}'
+
+
+def etudiant_tag(etudiant_id):
+    return f'etudiant:{etudiant_id}'
+
+
+def normalize_query(params):
+    """Sorted query string of the non-empty ``params``, so equivalent URLs share an entry."""
+    return urlencode(sorted((k, v) for k, v in params.items() if v not in (None, '')))
+
+
+def _version_key(tag):
+    return f'pagecache:tag:{tag}'
+
+
+def tag_versions(tags):
+    """{tag: version}; a tag never seen (or evicted) gets a fresh version."""
+    keys = {_version_key(tag): tag for tag in tags}
+    versions = cache.get_many(list(keys))
+    for key, tag in keys.items():
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return {tag: versions[key] for key, tag in keys.items()}
+
+
+def cached_page(name, query, tags, build):
+    """``build()``, cached for ``name``/``query`` until one of ``tags`` is invalidated."""
+    tags = sorted({STRUCTURE_TAG, *tags})
+    versions = tag_versions(tags)
+    raw = '|'.join([name, query, *(f'{tag}={versions[tag]}' for tag in tags)])
+    key = 'pagecache:' + hashlib.sha1(raw.encode()).hexdigest()
+    data = cache.get(key)
+    if data is None:
+        with primary_reads():
+            data = build()
+        cache.set(key, data, PAGE_CACHE_TIMEOUT)
+    return data
+
+
+def _bump(tags):
+    cache.set_many({_version_key(tag): uuid.uuid4().hex for tag in tags}, None)
+
+
+def invalidate_tags(tags):
+    tags = set(tags)
+    if not tags:
+        return
+    _bump(tags)
+    # again once committed: a page read meanwhile was built from the old rows
+    transaction.on_commit(lambda: _bump(tags))
+
+
+def invalidate_pages(cohorts=(), ue_ids=(), etudiant_ids=()):
+    invalidate_tags(
+        [cohort_tag(*cohort) for cohort in cohorts]
+        + [ue_tag(ue_id) for ue_id in ue_ids]
+        + [etudiant_tag(etudiant_id) for etudiant_id in etudiant_ids]
+    )
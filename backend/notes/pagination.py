@@ -0,0 +1,76 @@
+"""Keyset (cursor) pagination for student listings ordered by (nom, id)."""
+import base64
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+
+# seconds a cached COUNT(*) stays valid; totals are informative only
+COUNT_CACHE_TIMEOUT = 60
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(etudiant, direction):
+    """Opaque token pointing just after (next) or before (prev) a student."""
+    raw = json.dumps([etudiant.nom, etudiant.id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (nom, id, direction) for a token, or None when no token is given."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        nom, pk, direction = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(nom, str) or not isinstance(pk, int) or direction not in ('next', 'prev'):
+        raise InvalidCursor(token)
+    return nom, pk, direction
+
+
+def keyset_page(qs, page_size, cursor=None):
+    """Return (rows, next_cursor, prev_cursor) for one page of ``qs``.
+
+    Rows are seeked with a (nom, id) comparison instead of OFFSET, so deep
+    pages cost the same as the first one. One extra row is fetched to know
+    whether another page exists in the direction of travel.
+    """
+    if cursor is None:
+        rows = list(qs.order_by('nom', 'id')[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1], 'next') if has_more else None
+        return rows, next_cursor, None
+
+    nom, pk, direction = cursor
+    if direction == 'next':
+        seek = Q(nom__gt=nom) | Q(nom=nom, id__gt=pk)
+        rows = list(qs.filter(seek).order_by('nom', 'id')[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1], 'next') if has_more else None
+        prev_cursor = encode_cursor(rows[0], 'prev') if rows else None
+        return rows, next_cursor, prev_cursor
+
+    seek = Q(nom__lt=nom) | Q(nom=nom, id__lt=pk)
+    rows = list(qs.filter(seek).order_by('-nom', '-id')[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size][::-1]
+    prev_cursor = encode_cursor(rows[0], 'prev') if has_more else None
+    next_cursor = encode_cursor(rows[-1], 'next') if rows else None
+    return rows, next_cursor, prev_cursor
+
+
+def cached_count(qs, key_parts):
+    """COUNT(*) of ``qs`` memoized in the cache under ``key_parts``."""
+    key = 'count:' + ':'.join(str(p or '') for p in key_parts)
+    total = cache.get(key)
+    if total is None:
+        total = qs.count()
+        cache.set(key, total, COUNT_CACHE_TIMEOUT)
+    return total
@@ -0,0 +1,44 @@
+"""UE management rights: who may edit the grades of which UE."""
+from django.core.cache import cache
+
+from .models import UE
+
+# seconds a user's managed-UE set stays cached; writes invalidate it explicitly,
+# the timeout only bounds staleness for per-process caches (LocMemCache)
+MANAGED_UES_CACHE_TIMEOUT = 60
+
+
+def _cache_key(user_id):
+    return f'managed_ues:{user_id}'
+
+
+def managed_ue_ids(request):
+    """Ids of the UEs the user teaches, loaded with one query at most per request."""
+    if not request.user.is_authenticated:
+        return frozenset()
+    if not hasattr(request, '_managed_ue_ids'):
+        key = _cache_key(request.user.pk)
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(UE.objects.filter(instructors=request.user.pk).values_list('id', flat=True))
+            cache.set(key, ids, MANAGED_UES_CACHE_TIMEOUT)
+        request._managed_ue_ids = ids
+    return request._managed_ue_ids
+
+
+def manages_all_ues(user):
+    return user.is_superuser or user.is_staff
+
+
+def user_manages_ue(request, ue_id):
+    """superuser, staff or instructor of the UE"""
+    user = request.user
+    if manages_all_ues(user):
+        return True
+    if not user.is_authenticated:
+        return False
+    return ue_id in managed_ue_ids(request)
+
+
+def invalidate_managed_ues(user_ids):
+    cache.delete_many([_cache_key(pk) for pk in user_ids])
@@ -0,0 +1,59 @@
+"""Cohort rankings (classement) by UE final or by semester average, with window functions.
+
+A whole cohort is ranked by one query using RANK()/DENSE_RANK() over the
+stored finals (Note.final) or the materialized averages (MoyenneSemestre);
+the ranked rows are cached under the cohort's GradeVersion and pages are
+sliced from the cached list.
+"""
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank, Rank
+
+from .models import GradeVersion, MoyenneSemestre, Note
+
+# keys embed the grade version, so entries never go stale; the timeout only frees memory
+RANKING_CACHE_TIMEOUT = 3600
+
+RANKING_FIELDS = ('rank', 'dense_rank', 'etudiant_id', 'nom', 'matricule', 'score')
+
+
+def _ranked(qs, score):
+    order = F(score).desc()
+    return (
+        qs.filter(**{f'{score}__isnull': False})
+        .annotate(
+            rank=Window(Rank(), order_by=order),
+            dense_rank=Window(DenseRank(), order_by=order),
+        )
+        .order_by('rank', 'etudiant__nom', 'etudiant_id')
+        .values_list('rank', 'dense_rank', 'etudiant_id', 'etudiant__nom', 'etudiant__matricule', score)
+    )
+
+
+def ue_ranking_query(ue):
+    """Students of the UE's cohort ranked by their final in ``ue``; eliminated students are not ranked."""
+    return _ranked(Note.objects.filter(ue=ue, etudiant__filiere_id=ue.filiere_id, etudiant__niveau_id=ue.niveau_id), 'final')
+
+
+def moyenne_ranking_query(filiere_id, niveau_id, semester):
+    """Students of a cohort ranked by their credit-weighted average for ``semester``."""
+    return _ranked(
+        MoyenneSemestre.objects.filter(semester=semester, etudiant__filiere_id=filiere_id, etudiant__niveau_id=niveau_id),
+        'moyenne',
+    )
+
+
+def cohort_ranking(filiere_id, niveau_id, semester, ue=None):
+    """Ranked rows (see RANKING_FIELDS) of a cohort, by ``ue`` final or by semester average.
+
+    Ties share a rank: ``rank`` skips the following places (1, 1, 3), ``dense_rank``
+    does not (1, 1, 2).
+    """
+    version = GradeVersion.current(filiere_id, niveau_id)
+    key = f"ranking:{filiere_id}:{niveau_id}:{semester}:{ue.pk if ue else 'moyenne'}:{version}"
+    rows = cache.get(key)
+    if rows is None:
+        qs = ue_ranking_query(ue) if ue else moyenne_ranking_query(filiere_id, niveau_id, semester)
+        rows = list(qs)
+        cache.set(key, rows, RANKING_CACHE_TIMEOUT)
+    return rows
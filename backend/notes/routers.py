@@ -0,0 +1,99 @@
+"""Send the reads of read-only requests to a replica, everything else to the primary.
+
+ReplicaMiddleware picks a replica (settings.DATABASE_REPLICAS) for each
+GET/HEAD/OPTIONS request and ReplicaRouter sends that request's reads to it.
+Reads stay on the primary for the rest of the request as soon as it writes,
+inside a transaction on the primary, and for REPLICA_STICKY_SECONDS after a
+client's write (a cookie), so users read their own writes. Code running
+outside of a request (commands, import jobs) only uses the primary.
+"""
+import random
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import FileResponse
+
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = Local()
+
+
+def _begin(replica):
+    _state.replica = replica
+    _state.wrote = False
+
+
+def _end():
+    wrote = getattr(_state, 'wrote', False)
+    _begin(None)
+    return wrote
+
+
+@contextmanager
+def primary_reads():
+    """Send this thread's reads to the primary for the duration of the block."""
+    replica = getattr(_state, 'replica', None)
+    _state.replica = None
+    try:
+        yield
+    finally:
+        _state.replica = replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if replica is None or _state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # also for instances read from a replica
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas receive the schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = settings.DATABASE_REPLICAS
+        replica = None
+        if replicas and request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES:
+            replica = random.choice(replicas)
+
+        _begin(replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _end()
+
+        if replica and response.streaming and not isinstance(response, FileResponse):
+            # the content is generated after this returns, keep its reads on the replica
+            response.streaming_content = self._streamed(response.streaming_content, replica)
+        if replicas and (wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+    def _streamed(self, content, replica):
+        _begin(replica)
+        try:
+            yield from content
+        finally:
+            _end()
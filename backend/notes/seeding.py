@@ -0,0 +1,126 @@
+"""Synthetic faculty for performance work, bulk-created and reproducible from a seed.
+
+Students are spread evenly over the cohorts (filière x niveau) and get a
+note in every UE of their cohort; a few components are left empty so some
+students are eliminated. Finals are computed in Python like Note.save does,
+then the grade versions, materialized averages and cached hierarchy, home
+figures and pages are refreshed once at the end instead of per row.
+"""
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from .dashboard import invalidate_dashboard
+from .hierarchy import invalidate_hierarchy
+from .models import UE, Departement, Etudiant, Filiere, GradeVersion, MoyenneSemestre, Niveau, Note, final_score
+from .pagecache import invalidate_pages
+
+# rows per bulk_create, and students per MoyenneSemestre.refresh
+SEED_BATCH_SIZE = 5000
+# probability that a note component is missing
+MISSING_RATE = 0.03
+CREDITS = (2, 3, 4, 6)
+
+
+def seed_faculty(departements=4, filieres=3, niveaux=3, ues=12, students=100_000, instructors=200,
+                 prefix='SEED', seed=0, progress=None):
+    """Create a faculty and return its row counts.
+
+    ``filieres`` is per département and ``ues`` per cohort (alternating
+    semesters). Matricules, UE codes, usernames and département names start
+    with ``prefix`` (at most 5 characters, UE codes are 10 long) so several
+    datasets can coexist. ``progress(message)`` is called after each stage.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    def report(message):
+        if progress:
+            progress(f"{message} ({time.perf_counter() - started:.1f}s)")
+
+    deps = Departement.objects.bulk_create(
+        Departement(nom=f'{prefix} Département {d + 1}') for d in range(departements)
+    )
+    fils = Filiere.objects.bulk_create(
+        Filiere(nom=f'Filière {d + 1}.{f + 1}', departement=dep)
+        for d, dep in enumerate(deps) for f in range(filieres)
+    )
+    nivs = [Niveau.objects.get_or_create(nom=f'L{n + 1}')[0] for n in range(niveaux)]
+    cohorts = [(fil, niv) for fil in fils for niv in nivs]
+
+    ue_objs = UE.objects.bulk_create(
+        UE(
+            code=f'{prefix}{c * ues + u:05d}', nom=f'UE {u + 1} {fil.nom} {niv.nom}', credit=rng.choice(CREDITS),
+            filiere=fil, niveau=niv, semester=1 + u % 2,
+        )
+        for c, (fil, niv) in enumerate(cohorts) for u in range(ues)
+    )
+    cohort_ues = {}
+    for ue in ue_objs:
+        cohort_ues.setdefault((ue.filiere_id, ue.niveau_id), []).append(ue)
+
+    teachers = User.objects.bulk_create(
+        User(username=f'{prefix.lower()}_prof{i:05d}', password=make_password(None))
+        for i in range(instructors)
+    )
+    if teachers:
+        Through = UE.instructors.through
+        Through.objects.bulk_create(
+            (Through(ue_id=ue.id, user_id=user.id) for ue in ue_objs for user in rng.sample(teachers, min(2, len(teachers)))),
+            batch_size=SEED_BATCH_SIZE,
+        )
+    report(f"{len(deps)} départements, {len(fils)} filières, {len(ue_objs)} UE, {len(teachers)} enseignants")
+
+    etudiants = Etudiant.objects.bulk_create(
+        (
+            Etudiant(nom=f'Etudiant {i:07d}', matricule=f'{prefix}{i:07d}', filiere=cohorts[i % len(cohorts)][0], niveau=cohorts[i % len(cohorts)][1])
+            for i in range(students)
+        ),
+        batch_size=SEED_BATCH_SIZE,
+    )
+    report(f"{len(etudiants)} étudiants")
+
+    def component(ability):
+        if rng.random() < MISSING_RATE:
+            return None
+        return round(min(20.0, max(0.0, rng.gauss(ability, 2.5))), 2)
+
+    notes = 0
+    batch = []
+    for etudiant in etudiants:
+        ability = rng.gauss(11, 3)
+        for ue in cohort_ues.get((etudiant.filiere_id, etudiant.niveau_id), ()):
+            cc, tp, sn = component(ability), component(ability), component(ability)
+            batch.append(Note(
+                etudiant_id=etudiant.id, ue_id=ue.id, cc=cc, tp=tp, sn=sn,
+                final=final_score(cc, tp, sn, ue.cc_weight, ue.tp_weight, ue.sn_weight),
+                is_eliminated=cc is None or tp is None or sn is None,
+            ))
+        if len(batch) >= SEED_BATCH_SIZE:
+            Note.objects.bulk_create(batch)
+            notes += len(batch)
+            batch = []
+    Note.objects.bulk_create(batch)
+    notes += len(batch)
+    report(f"{notes} notes")
+
+    GradeVersion.bump_many((fil.id, niv.id) for fil, niv in cohorts)
+    invalidate_pages((fil.id, niv.id) for fil, niv in cohorts)
+    for i in range(0, len(etudiants), SEED_BATCH_SIZE):
+        MoyenneSemestre.refresh([e.id for e in etudiants[i:i + SEED_BATCH_SIZE]])
+    invalidate_hierarchy()
+    invalidate_dashboard(progress=True)
+    report("moyennes")
+
+    return {
+        'departements': len(deps),
+        'filieres': len(fils),
+        'niveaux': len(nivs),
+        'ues': len(ue_objs),
+        'instructors': len(teachers),
+        'etudiants': len(etudiants),
+        'notes': notes,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
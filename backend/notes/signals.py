@@ -0,0 +1,164 @@
+"""Keep derived state (grade versions, cached UE rights, home figures, filter tree, cached pages) in step with model writes."""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .dashboard import invalidate_dashboard
+from .hierarchy import invalidate_hierarchy
+from .models import UE, Departement, Etudiant, Filiere, GradeVersion, MoyenneSemestre, Niveau, Note
+from .pagecache import STRUCTURE_TAG, invalidate_pages, invalidate_tags
+from .permissions import invalidate_managed_ues
+
+
+def _cohort(model, pk):
+    return model.objects.filter(pk=pk).values_list('filiere_id', 'niveau_id').first()
+
+
+def note_cohorts(note):
+    """Cohorts of a note's UE and student, using cached relations when loaded."""
+    cohorts = set()
+    for name, model in (('ue', UE), ('etudiant', Etudiant)):
+        if Note._meta.get_field(name).is_cached(note):
+            related = getattr(note, name)
+            cohorts.add((related.filiere_id, related.niveau_id))
+        else:
+            cohort = _cohort(model, getattr(note, f'{name}_id'))
+            if cohort is not None:
+                cohorts.add(cohort)
+    return cohorts
+
+
+def sync_after_bulk_write(etudiant_ids, ue_ids):
+    """Derived-state upkeep for Note writes that bypass save() (bulk create/update)."""
+    etudiant_ids = set(etudiant_ids)
+    ues = list(UE.objects.filter(pk__in=ue_ids).values_list('filiere_id', 'niveau_id', 'semester'))
+    cohorts = {(filiere_id, niveau_id) for filiere_id, niveau_id, _ in ues}
+    cohorts.update(Etudiant.objects.filter(pk__in=etudiant_ids).values_list('filiere_id', 'niveau_id').distinct())
+    GradeVersion.bump_many(cohorts)
+    MoyenneSemestre.refresh(etudiant_ids, {semester for _, _, semester in ues})
+    invalidate_pages(cohorts, ue_ids, etudiant_ids)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def bump_for_note(sender, instance, **kwargs):
+    cohorts = note_cohorts(instance)
+    GradeVersion.bump_many(cohorts)
+    invalidate_pages(cohorts, [instance.ue_id], [instance.etudiant_id])
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def refresh_moyenne_for_note(sender, instance, **kwargs):
+    if Note._meta.get_field('ue').is_cached(instance):
+        semesters = [instance.ue.semester]
+    else:
+        # the UE may already be gone when its deletion cascades to its notes
+        semesters = list(UE.objects.filter(pk=instance.ue_id).values_list('semester', flat=True)) or None
+    MoyenneSemestre.refresh([instance.etudiant_id], semesters)
+
+
+@receiver(pre_save, sender=UE)
+@receiver(pre_save, sender=Etudiant)
+def remember_previous_cohort(sender, instance, **kwargs):
+    instance._previous_cohort = _cohort(sender, instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=UE)
+def bump_for_ue(sender, instance, created, **kwargs):
+    cohorts = {(instance.filiere_id, instance.niveau_id)}
+    if getattr(instance, '_previous_cohort', None):
+        cohorts.add(instance._previous_cohort)
+    if not created:
+        # weights and credits also change the averages of students graded in this UE
+        cohorts.update(Etudiant.objects.filter(note__ue=instance).values_list('filiere_id', 'niveau_id').distinct())
+        MoyenneSemestre.refresh(Note.objects.filter(ue=instance).values_list('etudiant_id', flat=True))
+    GradeVersion.bump_many(cohorts)
+    invalidate_pages(cohorts, [instance.pk])
+
+
+@receiver(post_save, sender=Etudiant)
+def bump_for_etudiant(sender, instance, **kwargs):
+    cohorts = {(instance.filiere_id, instance.niveau_id)}
+    if getattr(instance, '_previous_cohort', None):
+        cohorts.add(instance._previous_cohort)
+    GradeVersion.bump_many(cohorts)
+    invalidate_pages(cohorts, etudiant_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=UE)
+@receiver(post_delete, sender=Etudiant)
+def bump_for_delete(sender, instance, **kwargs):
+    GradeVersion.bump(instance.filiere_id, instance.niveau_id)
+    if sender is UE:
+        invalidate_pages([(instance.filiere_id, instance.niveau_id)], ue_ids=[instance.pk])
+    else:
+        invalidate_pages([(instance.filiere_id, instance.niveau_id)], etudiant_ids=[instance.pk])
+
+
+@receiver(m2m_changed, sender=UE.instructors.through)
+def bump_for_instructors(sender, instance, action, reverse, pk_set, **kwargs):
+    # instructor changes flip the "editable" flags served with the grid
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        GradeVersion.bump(instance.filiere_id, instance.niveau_id)
+        return
+    ues = UE.objects.filter(pk__in=pk_set) if pk_set is not None else instance.ues.all()
+    GradeVersion.bump_many(ues.values_list('filiere_id', 'niveau_id'))
+
+
+@receiver(m2m_changed, sender=UE.instructors.through)
+def invalidate_instructor_rights(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_managed_ues([instance.pk])
+    elif pk_set is not None:
+        invalidate_managed_ues(pk_set)
+    else:
+        invalidate_managed_ues(instance.instructors.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Departement)
+@receiver(post_save, sender=Filiere)
+@receiver(post_save, sender=Niveau)
+@receiver(post_save, sender=UE)
+@receiver(post_save, sender=Etudiant)
+@receiver(post_delete, sender=Departement)
+@receiver(post_delete, sender=Filiere)
+@receiver(post_delete, sender=Niveau)
+@receiver(post_delete, sender=UE)
+@receiver(post_delete, sender=Etudiant)
+def refresh_dashboard(sender, **kwargs):
+    invalidate_dashboard()
+
+
+@receiver(post_save, sender=Departement)
+@receiver(post_save, sender=Filiere)
+@receiver(post_save, sender=Niveau)
+@receiver(post_save, sender=UE)
+@receiver(post_delete, sender=Departement)
+@receiver(post_delete, sender=Filiere)
+@receiver(post_delete, sender=Niveau)
+@receiver(post_delete, sender=UE)
+@receiver(post_delete, sender=Etudiant)
+def refresh_hierarchy(sender, **kwargs):
+    invalidate_hierarchy()
+
+
+@receiver(post_save, sender=Etudiant)
+def refresh_hierarchy_for_etudiant(sender, instance, created, **kwargs):
+    # a filière's niveaux are those of its students
+    if created or getattr(instance, '_previous_cohort', None) != (instance.filiere_id, instance.niveau_id):
+        invalidate_hierarchy()
+
+
+@receiver(post_save, sender=Departement)
+@receiver(post_save, sender=Filiere)
+@receiver(post_save, sender=Niveau)
+@receiver(post_delete, sender=Departement)
+@receiver(post_delete, sender=Filiere)
+@receiver(post_delete, sender=Niveau)
+def refresh_pages_for_structure(sender, **kwargs):
+    # names shown on every cached page
+    invalidate_tags([STRUCTURE_TAG])
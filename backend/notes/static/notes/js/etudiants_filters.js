@@ -4,6 +4,18 @@ document.addEventListener('DOMContentLoaded', function() {
   const nivSel = document.getElementById('niveau-select');
   const ueSel = document.getElementById('ue-select');
 
+  // the whole departement -> filiere -> niveau -> UE tree, fetched once per page
+  let hierarchy = null;
+  function loadHierarchy() {
+    if (!hierarchy) {
+      hierarchy = fetch('/api/hierarchy/', {cache: 'no-cache'}).then(r => r.json());
+    }
+    return hierarchy;
+  }
+  function findById(items, id) {
+    return (items || []).find(i => String(i.id) === String(id));
+  }
+
   function setOptions(select, items, placeholder='--') {
     if (!select) return;
     select.innerHTML = '';
@@ -15,10 +27,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
   depSel && depSel.addEventListener('change', function() {
     const dep = this.value;
-    fetch(`/api/filieres/?departement=${dep}`)
-      .then(r => r.json())
-      .then(d => {
-        setOptions(filSel, d.filieres);
+    loadHierarchy()
+      .then(tree => {
+        const d = findById(tree.departements, dep);
+        setOptions(filSel, d ? d.filieres : []);
         // trigger filiere population if available
         const firstFil = filSel.querySelector('option[value]:not([value=""])');
         const filVal = firstFil ? firstFil.value : '';
@@ -35,10 +47,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
   filSel && filSel.addEventListener('change', function() {
     const fil = this.value;
-    fetch(`/api/niveaux/?filiere=${fil}`)
-      .then(r => r.json())
-      .then(d => {
-        setOptions(nivSel, d.niveaux);
+    loadHierarchy()
+      .then(tree => {
+        const f = findById(tree.departements.flatMap(d => d.filieres), fil);
+        setOptions(nivSel, f ? f.niveaux : []);
         const firstNiv = nivSel.querySelector('option[value]:not([value=""])');
         const nivVal = firstNiv ? firstNiv.value : '';
         if (nivVal) {
@@ -54,10 +66,12 @@ document.addEventListener('DOMContentLoaded', function() {
   nivSel && nivSel.addEventListener('change', function() {
     const fil = filSel ? filSel.value : '';
     const niv = this.value;
-    fetch(`/api/ues/?filiere=${fil}&niveau=${niv}`)
-      .then(r => r.json())
-      .then(d => {
-        setOptions(ueSel, d.ues.map(u => ({id: u.id, nom: `${u.code} - ${u.nom}`})));
+    loadHierarchy()
+      .then(tree => {
+        const f = findById(tree.departements.flatMap(d => d.filieres), fil);
+        const n = f ? findById(f.niveaux, niv) : null;
+        const ues = n ? n.ues : [];
+        setOptions(ueSel, ues.map(u => ({id: u.id, nom: `${u.code} - ${u.nom}`})));
       })
       .catch(err => console.error('ues fetch error', err));
   });
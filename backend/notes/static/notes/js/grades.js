@@ -92,8 +92,27 @@ function buildTable(ues, students) {
     });
 }
 
+// upsert many {etudiant_id, ue_id, cc, tp, sn} rows in a single request
+function saveNotesBatch(rows) {
+    return fetch('/api/notes/batch/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: JSON.stringify({notes: rows})
+    }).then(r => {
+        if (!r.ok) return r.text().then(t => { throw new Error(t) });
+        return r.json();
+    });
+}
+
+// keyset pagination state: the server hands out opaque next/prev cursors
 let currentPage = 1;
 let pageSize = 25;
+let nextCursor = null;
+let prevCursor = null;
+let totalStudents = null;
 
 function updateImportExportButtons() {
     const niv = document.getElementById('filter-niveau').value;
@@ -109,8 +128,43 @@ function updateImportExportButtons() {
     }
 }
 
-function fetchAndRender(page = 1) {
-    if (page && typeof page === 'object') {
+// rebuild per-student note maps from the columnar payload (parallel arrays)
+function studentsFromColumnar(data) {
+    const byId = {};
+    const students = data.students.id.map((id, i) => {
+        const s = {id, nom: data.students.nom[i], matricule: data.students.matricule[i], notes: {}};
+        byId[id] = s;
+        return s;
+    });
+    const cells = data.cells;
+    for (let i = 0; i < cells.etudiant_id.length; i++) {
+        byId[cells.etudiant_id[i]].notes[cells.ue_id[i]] = {
+            cc: cells.cc[i],
+            tp: cells.tp[i],
+            sn: cells.sn[i],
+            final: cells.final[i],
+            note_id: cells.note_id[i],
+        };
+    }
+    return students;
+}
+
+// the whole departement -> filiere -> niveau -> UE tree, fetched once per page
+let hierarchy = null;
+function loadHierarchy() {
+    if (!hierarchy) {
+        hierarchy = fetch('/api/hierarchy/', {cache: 'no-cache'}).then(r => r.json());
+    }
+    return hierarchy;
+}
+
+function findById(items, id) {
+    return (items || []).find(i => String(i.id) === String(id));
+}
+
+function fetchAndRender(cursor = null, page = 1) {
+    if (cursor && typeof cursor === 'object') {
+        cursor = null;
         page = 1;
     }
     currentPage = page;
@@ -121,30 +175,35 @@ function fetchAndRender(page = 1) {
     if (dep) url.searchParams.append('departement', dep);
     if (fil) url.searchParams.append('filiere', fil);
     if (niv) url.searchParams.append('niveau', niv);
-    url.searchParams.append('page', String(currentPage));
+    url.searchParams.append('pagination', 'cursor');
+    url.searchParams.append('format', 'columnar');
+    url.searchParams.append('fields', 'cc,tp,sn,final,note_id');
     url.searchParams.append('page_size', String(pageSize));
+    if (cursor) {
+        url.searchParams.append('cursor', cursor);
+    } else {
+        // the total only changes with the filters, ask for it on the first page
+        url.searchParams.append('count', '1');
+    }
 
-    fetch(url)
+    // no-cache revalidates with If-None-Match; an unchanged grid comes back as a 304
+    fetch(url, {cache: 'no-cache'})
         .then(r => r.json())
         .then(data => {
-            // convert ues list to map-friendly id strings
-            const ues = data.ues.map(u => ({id: u.id, code: u.code, nom: u.nom, credit: u.credit}));
-            // transform students notes keys to integers for easier access
-            const students = data.students.map(s => {
-                const notes = {};
-                for (const k in s.notes) {
-                    notes[parseInt(k, 10)] = s.notes[k];
-                }
-                return {...s, notes};
-            });
+            const ues = data.ues.map(u => ({id: u.id, code: u.code, nom: u.nom, credit: u.credit, editable: u.editable}));
+            const students = studentsFromColumnar(data);
             buildTable(ues, students);
 
             // pagination UI
-            const total = data.total_students;
-            const totalPages = Math.max(1, Math.ceil(total / pageSize));
+            nextCursor = data.next_cursor;
+            prevCursor = data.prev_cursor;
+            if (data.total_students !== null && data.total_students !== undefined) {
+                totalStudents = data.total_students;
+            }
+            const totalPages = Math.max(1, Math.ceil((totalStudents || 0) / pageSize));
             document.getElementById('page-info').textContent = `Page ${currentPage} / ${totalPages}`;
-            document.getElementById('prev-page').classList.toggle('disabled', currentPage <= 1);
-            document.getElementById('next-page').classList.toggle('disabled', currentPage >= totalPages);
+            document.getElementById('prev-page').classList.toggle('disabled', !prevCursor);
+            document.getElementById('next-page').classList.toggle('disabled', !nextCursor);
             
             // Update import/export button states
             updateImportExportButtons();
@@ -168,11 +227,11 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
         
-        // Fetch filieres for selected department
+        // Filieres of the selected department
         try {
-            const response = await fetch(`/api/filieres/?departement=${depId}`);
-            const data = await response.json();
-            data.filieres.forEach(f => {
+            const tree = await loadHierarchy();
+            const dep = findById(tree.departements, depId);
+            (dep ? dep.filieres : []).forEach(f => {
                 const opt = document.createElement('option');
                 opt.value = f.id;
                 opt.textContent = f.nom;
@@ -200,12 +259,12 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
         
-        // Fetch niveaux for selected filiere
+        // Niveaux of the selected filiere
         try {
-            const response = await fetch(`/api/niveaux/?filiere=${filId}`);
-            const data = await response.json();
+            const tree = await loadHierarchy();
+            const fil = findById(tree.departements.flatMap(d => d.filieres), filId);
             nivSelect.disabled = false;
-            data.niveaux.forEach(n => {
+            (fil ? fil.niveaux : []).forEach(n => {
                 const opt = document.createElement('option');
                 opt.value = n.id;
                 opt.textContent = n.nom;
@@ -219,28 +278,27 @@ document.addEventListener('DOMContentLoaded', () => {
         updateImportExportButtons();
         
         // Trigger table update when filiere changes
-        fetchAndRender(1);
+        fetchAndRender();
     });
     
     document.getElementById('filter-niveau').addEventListener('change', () => {
         updateImportExportButtons();
-        fetchAndRender(1);
+        fetchAndRender();
     });
 
     document.getElementById('prev-page').addEventListener('click', (e) => {
         e.preventDefault();
-        if (currentPage > 1) fetchAndRender(currentPage - 1);
+        if (prevCursor) fetchAndRender(prevCursor, currentPage - 1);
     });
     document.getElementById('next-page').addEventListener('click', (e) => {
         e.preventDefault();
-        // we don't know totalPages here but server will clamp
-        fetchAndRender(currentPage + 1);
+        if (nextCursor) fetchAndRender(nextCursor, currentPage + 1);
     });
 
     // save edit
     const applyBtn = document.getElementById('apply-filters');
     if (applyBtn) {
-        applyBtn.addEventListener('click', () => fetchAndRender(1));
+        applyBtn.addEventListener('click', () => fetchAndRender());
     }
 
     document.getElementById('saveEdit').addEventListener('click', () => {
@@ -250,50 +308,17 @@ document.addEventListener('DOMContentLoaded', () => {
         const cc = ccRaw === '' ? null : parseFloat(ccRaw);
         const tp = tpRaw === '' ? null : parseFloat(tpRaw);
         const sn = snRaw === '' ? null : parseFloat(snRaw);
+        const etudiantId = parseInt(currentEdit.row.dataset.studentId, 10);
+        const ueId = parseInt(currentEdit.ue_id, 10);
 
-        if (!currentEdit.note_id) {
-            // create new note via API
-            const etudiantId = currentEdit.row.dataset.studentId;
-            fetch(`/api/note/create/`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': getCookie('csrftoken')
-                },
-                body: JSON.stringify({etudiant_id: etudiantId, ue_id: currentEdit.ue_id, cc, tp, sn})
-            }).then(r => {
-                if (!r.ok) return r.text().then(t => { throw new Error(t) });
-                return r.json();
-            }).then(data => {
-                // update cell with created note
-                const cell = currentEdit.row.querySelector(`td[data-ue-id="${currentEdit.ue_id}"]`);
-                const final = data.final !== null ? data.final.toFixed(2) : '—';
-                cell.dataset.noteId = data.id;
-                cell.innerHTML = `CC:${data.cc ?? '—'}<br>TP:${data.tp ?? '—'}<br>SN:${data.sn ?? '—'}<br><strong>F:${final}</strong>`;
-                var myModalEl = document.getElementById('editModal')
-                var modal = bootstrap.Modal.getInstance(myModalEl)
-                modal.hide();
-            }).catch(err => {
-                alert('Erreur lors de la création: ' + err.message);
-            });
-            return;
-        }
-
-        fetch(`/api/note/${currentEdit.note_id}/update/`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': getCookie('csrftoken')
-            },
-            body: JSON.stringify({cc, tp, sn})
-        }).then(r => {
-            if (!r.ok) throw new Error('Erreur sauvegarde');
-            return r.json();
-        }).then(data => {
-            // update current cell content
+        // creation and update go through the same batch upsert endpoint
+        saveNotesBatch([{etudiant_id: etudiantId, ue_id: ueId, cc, tp, sn}]).then(data => {
+            const result = data.results[0];
+            if (result.status === 'error') throw new Error(result.error);
             const cell = currentEdit.row.querySelector(`td[data-ue-id="${currentEdit.ue_id}"]`);
-            const final = data.final !== null ? data.final.toFixed(2) : '—';
-            cell.innerHTML = `CC:${data.cc ?? '—'}<br>TP:${data.tp ?? '—'}<br>SN:${data.sn ?? '—'}<br><strong>F:${final}</strong>`;
+            const final = result.final !== null ? result.final.toFixed(2) : '—';
+            cell.dataset.noteId = result.id;
+            cell.innerHTML = `CC:${result.cc ?? '—'}<br>TP:${result.tp ?? '—'}<br>SN:${result.sn ?? '—'}<br><strong>F:${final}</strong>`;
             var myModalEl = document.getElementById('editModal')
             var modal = bootstrap.Modal.getInstance(myModalEl)
             modal.hide();
@@ -350,9 +375,55 @@ document.addEventListener('DOMContentLoaded', () => {
         const formData = new FormData();
         formData.append('ue_id', ueId);
         formData.append('file', file);
+        formData.append('async', '1');
+        const progressBar = document.getElementById('import-progress-bar');
+        const statusText = document.getElementById('import-status');
+        const hideProgress = () => {
+            document.getElementById('import-progress').style.display = 'none';
+            progressBar.style.width = '0%';
+        };
         document.getElementById('import-progress').style.display = 'block';
-        document.getElementById('import-status').textContent = 'Importation en cours...';
-        fetch('/api/notes/import/', {
+        statusText.textContent = 'Envoi du fichier...';
+
+        const finish = data => {
+            progressBar.style.width = '100%';
+            statusText.textContent = `✓ ${data.imported} créés, ${data.updated} mis à jour, ${data.unchanged} inchangés`;
+            if (data.errors.length > 0) {
+                alert('Avertissements:\n' + data.errors.slice(0, 5).join('\n'));
+            }
+            setTimeout(() => {
+                hideProgress();
+                fileInput.value = '';
+                var myModalEl = document.getElementById('importModal');
+                var modal = bootstrap.Modal.getInstance(myModalEl);
+                modal.hide();
+                fetchAndRender();
+            }, 1000);
+        };
+
+        // the server answers with a job id; poll it until the import is done
+        const poll = jobId => {
+            fetch(`/api/notes/import/${jobId}/`, {cache: 'no-store'}).then(r => r.json()).then(data => {
+                if (!data.success) {
+                    alert('Erreur: ' + data.error);
+                    hideProgress();
+                } else if (data.status === 'done') {
+                    finish(data);
+                } else {
+                    statusText.textContent = data.status === 'pending'
+                        ? 'Importation en attente...'
+                        : `Importation en cours... ${data.rows_processed} lignes traitées`;
+                    progressBar.style.width = data.status === 'pending' ? '10%' : '50%';
+                    setTimeout(() => poll(jobId), 1000);
+                }
+            }).catch(err => {
+                alert('Erreur réseau: ' + err.message);
+                hideProgress();
+            });
+        };
+
+        const endpoint = file.name.toLowerCase().endsWith('.csv') ? '/api/notes/import/csv/' : '/api/notes/import/';
+        fetch(endpoint, {
             method: 'POST',
             headers: {
                 'X-CSRFToken': getCookie('csrftoken')
@@ -360,25 +431,14 @@ document.addEventListener('DOMContentLoaded', () => {
             body: formData
         }).then(r => r.json()).then(data => {
             if (data.success) {
-                document.getElementById('import-status').textContent = `✓ ${data.imported} créés, ${data.updated} mis à jour`;
-                if (data.errors.length > 0) {
-                    alert('Avertissements:\n' + data.errors.slice(0, 5).join('\n'));
-                }
-                setTimeout(() => {
-                    document.getElementById('import-progress').style.display = 'none';
-                    fileInput.value = '';
-                    var myModalEl = document.getElementById('importModal');
-                    var modal = bootstrap.Modal.getInstance(myModalEl);
-                    modal.hide();
-                    fetchAndRender(1);
-                }, 1000);
+                poll(data.job_id);
             } else {
                 alert('Erreur: ' + data.error);
-                document.getElementById('import-progress').style.display = 'none';
+                hideProgress();
             }
         }).catch(err => {
             alert('Erreur réseau: ' + err.message);
-            document.getElementById('import-progress').style.display = 'none';
+            hideProgress();
         });
     });
 
@@ -0,0 +1,65 @@
+"""Grade distribution of a UE, computed from one values_list fetch and cached per GradeVersion."""
+import math
+from statistics import median, pstdev
+
+from django.core.cache import cache
+
+from .models import GradeVersion, Note
+
+# final needed to validate a UE
+PASS_MARK = 10.0
+# width of a histogram bin on the 0-20 scale
+HISTOGRAM_STEP = 2
+# keys embed the grade version, so entries never go stale; the timeout only frees memory
+STATS_CACHE_TIMEOUT = 3600
+
+
+def _rate(part, total):
+    return round(part / total, 4) if total else None
+
+
+def distribution(finals, notes_count):
+    """Summary of the sorted non-null ``finals`` out of ``notes_count`` notes.
+
+    Notes without a final are eliminated and count as failed in the pass rate.
+    """
+    graded = len(finals)
+    bins = [0] * (20 // HISTOGRAM_STEP)
+    for final in finals:
+        bins[min(int(final // HISTOGRAM_STEP), len(bins) - 1)] += 1
+    passed = graded - next((i for i, final in enumerate(finals) if final >= PASS_MARK), graded)
+    return {
+        'notes': notes_count,
+        'graded': graded,
+        'eliminated': notes_count - graded,
+        'mean': round(math.fsum(finals) / graded, 2) if graded else None,
+        'median': round(median(finals), 2) if graded else None,
+        'std': round(pstdev(finals), 2) if graded else None,
+        'min': finals[0] if graded else None,
+        'max': finals[-1] if graded else None,
+        'passed': passed,
+        'pass_rate': _rate(passed, notes_count),
+        'elimination_rate': _rate(notes_count - graded, notes_count),
+        'histogram': [
+            {'from': i * HISTOGRAM_STEP, 'to': (i + 1) * HISTOGRAM_STEP, 'count': count}
+            for i, count in enumerate(bins)
+        ],
+    }
+
+
+def ue_stats(ue):
+    """Distribution of the finals of ``ue``, recomputed only when its cohort's grades change."""
+    version = GradeVersion.current(ue.filiere_id, ue.niveau_id)
+    key = f'ue_stats:{ue.pk}:{version}'
+    stats = cache.get(key)
+    if stats is None:
+        # one query, already sorted; eliminated notes (no final) are only counted
+        finals = list(Note.objects.filter(ue=ue).order_by('final').values_list('final', flat=True))
+        graded = [final for final in finals if final is not None]
+        stats = {
+            'ue': {'id': ue.pk, 'code': ue.code, 'nom': ue.nom},
+            'version': version,
+            **distribution(graded, len(finals)),
+        }
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.core.exceptions import ValidationError
 
 from .models import Departement, Filiere, Niveau, UE, Etudiant, Note
@@ -252,3 +252,1602 @@ class ModelsTestCase(TestCase):
         self.assertEqual(r2.status_code, 302)
         s.refresh_from_db()
         self.assertFalse(s.is_staff)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class NotesJsonQueryBudgetTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.teacher = User.objects.create_user('teacher', password='x')
+        self.client.login(username='teacher', password='x')
+
+    def _seed(self, n_students, n_ues):
+        ues = [UE.objects.create(code=f'Q{self.niv.id}{i:03d}', nom=f'UE{i}', credit=3, filiere=self.fil, niveau=self.niv) for i in range(UE.objects.count(), n_ues)]
+        for ue in ues:
+            ue.instructors.add(self.teacher)
+        start = Etudiant.objects.count()
+        for i in range(start, n_students):
+            e = Etudiant.objects.create(nom=f'E{i:03d}', matricule=f'Q{i:04d}', filiere=self.fil, niveau=self.niv)
+            for ue in UE.objects.all():
+                Note.objects.create(etudiant=e, ue=ue, cc=10, tp=11, sn=12)
+
+    def _count_queries(self, page_size):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = f'/api/notes/?filiere={self.fil.id}&niveau={self.niv.id}&page_size={page_size}'
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        return len(ctx.captured_queries), r.json()
+
+    def test_query_count_independent_of_page_size_and_ues(self):
+        self._seed(2, 2)
+        small, data = self._count_queries(page_size=2)
+        self.assertEqual(len(data['students']), 2)
+        self.assertTrue(all(u['editable'] for u in data['ues']))
+
+        self._seed(12, 8)
+        large, data = self._count_queries(page_size=12)
+        self.assertEqual(len(data['students']), 12)
+        self.assertEqual(len(data['ues']), 8)
+        self.assertEqual(data['students'][0]['notes'][str(data['ues'][0]['id'])]['final'], round(10*0.2 + 11*0.3 + 12*0.5, 2))
+        self.assertEqual(small, large)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class CursorPaginationTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        # duplicate names exercise the (nom, id) tie-breaker
+        for i in range(23):
+            Etudiant.objects.create(nom=f'E{i // 2:02d}', matricule=f'C{i:03d}', filiere=self.fil, niveau=self.niv)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def test_notes_json_cursor_walks_forward_and_back(self):
+        base = f'/api/notes/?filiere={self.fil.id}&niveau={self.niv.id}&pagination=cursor&page_size=5'
+        expected = list(Etudiant.objects.order_by('nom', 'id').values_list('id', flat=True))
+        r = self.client.get(base + '&count=1')
+        data = r.json()
+        self.assertEqual(data['total_students'], 23)
+        self.assertIsNone(data['prev_cursor'])
+        pages = [[s['id'] for s in data['students']]]
+        while data['next_cursor']:
+            data = self.client.get(base + '&cursor=' + data['next_cursor']).json()
+            self.assertIsNone(data['total_students'])
+            pages.append([s['id'] for s in data['students']])
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(len(pages), 5)
+
+        # walking back from the last page returns the previous one
+        back = self.client.get(base + '&cursor=' + data['prev_cursor']).json()
+        self.assertEqual([s['id'] for s in back['students']], pages[-2])
+
+    def test_notes_json_rejects_bad_cursor(self):
+        r = self.client.get('/api/notes/?pagination=cursor&cursor=garbage')
+        self.assertEqual(r.status_code, 400)
+
+    def test_etudiant_list_cursor_mode(self):
+        url = f'/etudiants/?departement={self.dep.id}&filiere={self.fil.id}&niveau={self.niv.id}&pagination=cursor&page_size=10'
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.context['cursor_mode'])
+        self.assertEqual(len(r.context['rows']), 10)
+        self.assertEqual(r.context['total_students'], 23)
+        r2 = self.client.get(url + '&cursor=' + r.context['next_cursor'])
+        first_ids = {row['etudiant'].id for row in r.context['rows']}
+        second_ids = {row['etudiant'].id for row in r2.context['rows']}
+        self.assertFalse(first_ids & second_ids)
+        self.assertIn('cursor=' + r2.context['prev_cursor'], r2.content.decode())
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ColumnarFormatTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE102', nom='BD', credit=4, filiere=self.fil, niveau=self.niv)
+        self.alice = Etudiant.objects.create(nom='Alice', matricule='A001', filiere=self.fil, niveau=self.niv)
+        self.bob = Etudiant.objects.create(nom='Bob', matricule='B001', filiere=self.fil, niveau=self.niv)
+        self.n1 = Note.objects.create(etudiant=self.alice, ue=self.ue2, cc=10, tp=12, sn=14)
+        self.n2 = Note.objects.create(etudiant=self.bob, ue=self.ue1, cc=None, tp=12, sn=14)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+        self.base = f'/api/notes/?filiere={self.fil.id}&niveau={self.niv.id}&format=columnar'
+
+    def test_columnar_matches_row_format(self):
+        data = self.client.get(self.base).json()
+        self.assertEqual(data['format'], 'columnar')
+        self.assertEqual(data['students']['id'], [self.alice.id, self.bob.id])
+        cells = data['cells']
+        # only existing notes, row-major
+        self.assertEqual(cells['etudiant_id'], [self.alice.id, self.bob.id])
+        self.assertEqual(cells['ue_id'], [self.ue2.id, self.ue1.id])
+        self.assertEqual(cells['note_id'], [self.n1.id, self.n2.id])
+        self.assertEqual(cells['final'], [self.n1.final, None])
+        self.assertEqual(cells['is_eliminated'], [False, True])
+
+        rows = self.client.get(f'/api/notes/?filiere={self.fil.id}&niveau={self.niv.id}').json()
+        for i, sid in enumerate(cells['etudiant_id']):
+            row = next(s for s in rows['students'] if s['id'] == sid)
+            cell = row['notes'][str(cells['ue_id'][i])]
+            for f in ('cc', 'tp', 'sn', 'final', 'note_id'):
+                self.assertEqual(cell[f], cells[f][i])
+
+    def test_fields_selector(self):
+        data = self.client.get(self.base + '&fields=final').json()
+        self.assertEqual(set(data['cells']), {'etudiant_id', 'ue_id', 'final'})
+        r = self.client.get(self.base + '&fields=final,bogus')
+        self.assertEqual(r.status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.etud = Etudiant.objects.create(nom='Alice', matricule='A001', filiere=self.fil, niveau=self.niv)
+        self.note = Note.objects.create(etudiant=self.etud, ue=self.ue, cc=10, tp=12, sn=14)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def _assert_revalidates(self, url):
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        etag = r['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        r2 = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r2.status_code, 304)
+        return etag
+
+    def test_grade_version_bumps_on_writes(self):
+        from .models import GradeVersion
+        v0 = GradeVersion.current(self.fil.id, self.niv.id)
+        self.note.sn = 15
+        self.note.save()
+        v1 = GradeVersion.current(self.fil.id, self.niv.id)
+        self.assertGreater(v1, v0)
+        self.ue.cc_weight, self.ue.tp_weight, self.ue.sn_weight = 40, 30, 30
+        self.ue.save()
+        self.assertGreater(GradeVersion.current(self.fil.id, self.niv.id), v1)
+
+    def test_notes_json_304_until_note_changes(self):
+        url = f'/api/notes/?filiere={self.fil.id}&niveau={self.niv.id}'
+        etag = self._assert_revalidates(url)
+        self.client.post(f'/api/note/{self.note.id}/update/', data='{"cc":15,"tp":16,"sn":17}', content_type='application/json')
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r['ETag'], etag)
+
+    def test_moyenne_and_pdf_304_until_weights_change(self):
+        urls = (f'/moyenne/{self.etud.id}/', f'/moyenne/{self.etud.id}/export/')
+        for url, weights in zip(urls, [(30, 30, 40), (40, 30, 30)]):
+            etag = self._assert_revalidates(url)
+            self.ue.cc_weight, self.ue.tp_weight, self.ue.sn_weight = weights
+            self.ue.save()
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 200)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class NdjsonExportTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE102', nom='BD', credit=4, filiere=self.fil, niveau=self.niv)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def test_streams_one_line_per_student(self):
+        import json
+        from unittest import mock
+        from . import views
+        for i in range(7):
+            e = Etudiant.objects.create(nom=f'E{i}', matricule=f'N{i:03d}', filiere=self.fil, niveau=self.niv)
+            Note.objects.create(etudiant=e, ue=self.ue1, cc=10, tp=12, sn=14)
+            if i % 2:
+                Note.objects.create(etudiant=e, ue=self.ue2, cc=None, tp=12, sn=14)
+        # a student from another cohort must not leak in
+        Etudiant.objects.create(nom='Other', matricule='X001', filiere=self.fil)
+
+        with mock.patch.object(views, 'EXPORT_CHUNK_SIZE', 3):
+            r = self.client.get(f'/api/notes/export/ndjson/?filiere={self.fil.id}&niveau={self.niv.id}')
+            self.assertTrue(r.streaming)
+            chunks = list(r.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        lines = [json.loads(l) for l in b''.join(chunks).decode().splitlines()]
+        self.assertEqual([l['matricule'] for l in lines], [f'N{i:03d}' for i in range(7)])
+        self.assertEqual(lines[0]['notes']['UE101']['final'], round(10*0.2 + 12*0.3 + 14*0.5, 2))
+        self.assertNotIn('UE102', lines[0]['notes'])
+        self.assertIsNone(lines[1]['notes']['UE102']['final'])
+
+    def test_requires_cohort(self):
+        r = self.client.get('/api/notes/export/ndjson/')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get('/api/notes/export/ndjson/', {'filiere': 'abc', 'niveau': self.niv.id})
+        self.assertEqual(r.status_code, 400)
+
+    def test_semester_filter(self):
+        import json
+        e = Etudiant.objects.create(nom='E0', matricule='N000', filiere=self.fil, niveau=self.niv)
+        self.ue2.semester = 2
+        self.ue2.save()
+        Note.objects.create(etudiant=e, ue=self.ue1, cc=10, tp=12, sn=14)
+        Note.objects.create(etudiant=e, ue=self.ue2, cc=10, tp=12, sn=14)
+        cohort = {'filiere': self.fil.id, 'niveau': self.niv.id}
+        # an invalid semester falls back to 1, as in the other views
+        for semester, codes in (('2', ['UE102']), ('7', ['UE101']), ('abc', ['UE101']), ('', ['UE101', 'UE102'])):
+            r = self.client.get('/api/notes/export/ndjson/', {**cohort, 'semester': semester})
+            self.assertEqual(r.status_code, 200)
+            line = json.loads(b''.join(r.streaming_content))
+            self.assertEqual(sorted(line['notes']), codes)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class NotesBatchTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE102', nom='BD', credit=4, filiere=self.fil, niveau=self.niv)
+        self.students = [Etudiant.objects.create(nom=f'E{i}', matricule=f'B{i:03d}', filiere=self.fil, niveau=self.niv) for i in range(20)]
+        self.teacher = User.objects.create_user('teacher', password='x')
+        self.ue1.instructors.add(self.teacher)
+        self.client.login(username='teacher', password='x')
+
+    def _post(self, rows):
+        import json
+        return self.client.post('/api/notes/batch/', data=json.dumps({'notes': rows}), content_type='application/json')
+
+    def test_upserts_and_reports_per_row(self):
+        from .models import GradeVersion
+        existing = Note.objects.create(etudiant=self.students[0], ue=self.ue1, cc=1, tp=1, sn=1)
+        v0 = GradeVersion.current(self.fil.id, self.niv.id)
+        rows = [{'etudiant_id': s.id, 'ue_id': self.ue1.id, 'cc': 10, 'tp': 12, 'sn': 14} for s in self.students]
+        rows.append({'etudiant_id': self.students[0].id, 'ue_id': self.ue2.id, 'cc': 10, 'tp': 10, 'sn': 10})
+        rows.append({'etudiant_id': self.students[1].id, 'ue_id': self.ue1.id, 'cc': 25, 'tp': 10, 'sn': 10})
+        rows.append({'etudiant_id': 999999, 'ue_id': self.ue1.id, 'cc': 10, 'tp': 10, 'sn': 10})
+        r = self._post(rows)
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual(data['created'], 19)
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual(data['errors'], 3)
+        statuses = [res['status'] for res in data['results']]
+        self.assertEqual(statuses[0], 'updated')
+        self.assertEqual(data['results'][0]['id'], existing.id)
+        self.assertEqual(data['results'][1]['id'], Note.objects.get(etudiant=self.students[1], ue=self.ue1).id)
+        self.assertEqual(data['results'][20]['error'], 'Forbidden')
+        self.assertEqual(statuses[21:], ['error', 'error'])
+        self.assertEqual(Note.objects.filter(ue=self.ue1).count(), 20)
+        self.assertFalse(Note.objects.filter(ue=self.ue2).exists())
+        existing.refresh_from_db()
+        self.assertEqual(existing.final, round(10*0.2 + 12*0.3 + 14*0.5, 2))
+        self.assertGreater(GradeVersion.current(self.fil.id, self.niv.id), v0)
+
+    def test_query_count_independent_of_batch_size(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.core.cache import cache
+        counts = []
+        for students in (self.students[:2], self.students[2:20]):
+            cache.clear()
+            rows = [{'etudiant_id': s.id, 'ue_id': self.ue1.id, 'cc': 10, 'tp': 12, 'sn': 14} for s in students]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self._post(rows).status_code, 200)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_note_created_concurrently_is_updated(self):
+        from unittest import mock
+        student = self.students[0]
+        compute_final = Note.compute_final
+
+        def racing(note, ue=None):
+            # another request creates the same note after this one looked it up
+            Note.objects.bulk_create([Note(etudiant=student, ue=self.ue1, cc=1, tp=1, sn=1)])
+            return compute_final(note, ue)
+
+        with mock.patch.object(Note, 'compute_final', racing):
+            r = self._post([{'etudiant_id': student.id, 'ue_id': self.ue1.id, 'cc': 10, 'tp': 12, 'sn': 14}])
+        self.assertEqual(r.status_code, 200)
+        note = Note.objects.get(etudiant=student, ue=self.ue1)
+        self.assertEqual((note.cc, note.tp, note.sn), (10, 12, 14))
+        self.assertEqual(note.final, round(10*0.2 + 12*0.3 + 14*0.5, 2))
+
+    def test_rejects_bad_payload(self):
+        r = self.client.post('/api/notes/batch/', data='{"notes": []}', content_type='application/json')
+        self.assertEqual(r.status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ManagedUePermissionsTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE102', nom='BD', credit=4, filiere=self.fil, niveau=self.niv)
+        self.teacher = User.objects.create_user('teacher', password='x')
+        self.ue1.instructors.add(self.teacher)
+
+    def _request(self):
+        from django.test import RequestFactory
+        req = RequestFactory().get('/')
+        req.user = self.teacher
+        return req
+
+    def test_resolved_once_and_cached(self):
+        from .permissions import user_manages_ue
+        req = self._request()
+        with self.assertNumQueries(1):
+            self.assertTrue(user_manages_ue(req, self.ue1.id))
+            self.assertFalse(user_manages_ue(req, self.ue2.id))
+        # a later request hits the cache
+        with self.assertNumQueries(0):
+            self.assertTrue(user_manages_ue(self._request(), self.ue1.id))
+
+    def test_invalidated_on_instructor_changes(self):
+        from .permissions import user_manages_ue
+        self.assertFalse(user_manages_ue(self._request(), self.ue2.id))
+        self.ue2.instructors.add(self.teacher)
+        self.assertTrue(user_manages_ue(self._request(), self.ue2.id))
+        self.teacher.ues.remove(self.ue1)
+        self.assertFalse(user_manages_ue(self._request(), self.ue1.id))
+        self.ue2.instructors.clear()
+        self.assertFalse(user_manages_ue(self._request(), self.ue2.id))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class StoredFinalTestCase(TestCase):
+    def setUp(self):
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.students = [Etudiant.objects.create(nom=f'S{i}', matricule=f'F{i:03d}', filiere=self.fil, niveau=self.niv) for i in range(3)]
+        for s, (cc, tp, sn) in zip(self.students, [(10, 10, 10), (None, 18, 18), (8, 12, 16)]):
+            Note.objects.create(etudiant=s, ue=self.ue, cc=cc, tp=tp, sn=sn)
+
+    def test_final_stored_on_save(self):
+        note = Note.objects.get(etudiant=self.students[2])
+        self.assertEqual(note.final, round(8*0.2 + 12*0.3 + 16*0.5, 2))
+        self.assertFalse(note.is_eliminated)
+        note.sn = 20
+        note.save(update_fields=['sn'])
+        note.refresh_from_db()
+        self.assertEqual(note.final, round(8*0.2 + 12*0.3 + 20*0.5, 2))
+        eliminated = Note.objects.get(etudiant=self.students[1])
+        self.assertIsNone(eliminated.final)
+        self.assertTrue(eliminated.is_eliminated)
+
+    def test_weight_change_recomputes_in_bulk(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.ue.cc_weight, self.ue.tp_weight, self.ue.sn_weight = 50, 25, 25
+        with CaptureQueriesContext(connection) as ctx:
+            self.ue.save()
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "notes_note"')]
+        self.assertEqual(len(updates), 1)
+        finals = dict(Note.objects.values_list('etudiant_id', 'final'))
+        self.assertEqual(finals[self.students[2].id], round(8*0.5 + 12*0.25 + 16*0.25, 2))
+        self.assertIsNone(finals[self.students[1].id])
+
+    def test_bulk_and_save_round_ties_alike(self):
+        # 10.5*0.25 + 10*0.25 + 10*0.5 = 10.125, rounded half up
+        note = Note.objects.get(etudiant=self.students[0])
+        note.cc = 10.5
+        note.save()
+        self.ue.cc_weight, self.ue.tp_weight, self.ue.sn_weight = 25, 25, 50
+        self.ue.save()
+        note.refresh_from_db()
+        self.assertEqual(note.final, 10.13)
+        note.compute_final(self.ue)
+        self.assertEqual(note.final, 10.13)
+
+    def test_sort_by_note_reads_stored_final(self):
+        r = self.client.get(f'/etudiants/?departement={self.dep.id}&filiere={self.fil.id}&niveau={self.niv.id}&ue={self.ue.id}&sort=note')
+        order = [row['etudiant'].nom for row in r.context['rows']]
+        self.assertEqual(order, ['S2', 'S0', 'S1'])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class MoyenneSemestreTestCase(TestCase):
+    def setUp(self):
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE102', nom='BD', credit=4, filiere=self.fil, niveau=self.niv)
+        self.ue3 = UE.objects.create(code='UE201', nom='Réseaux', credit=5, filiere=self.fil, niveau=self.niv, semester=2)
+        self.alice = Etudiant.objects.create(nom='Alice', matricule='A001', filiere=self.fil, niveau=self.niv)
+        self.bob = Etudiant.objects.create(nom='Bob', matricule='B001', filiere=self.fil, niveau=self.niv)
+
+    def _row(self, etudiant, semester):
+        from .models import MoyenneSemestre
+        return MoyenneSemestre.objects.get(etudiant=etudiant, semester=semester)
+
+    def test_maintained_on_note_and_ue_changes(self):
+        from .models import MoyenneSemestre
+        n1 = Note.objects.create(etudiant=self.alice, ue=self.ue1, cc=12, tp=14, sn=16)  # 14.6
+        Note.objects.create(etudiant=self.alice, ue=self.ue2, cc=10, tp=10, sn=10)  # 10
+        Note.objects.create(etudiant=self.alice, ue=self.ue3, cc=None, tp=10, sn=10)
+        row = self._row(self.alice, 1)
+        self.assertEqual(row.credits, 10)
+        self.assertAlmostEqual(row.moyenne, 12.76, places=2)
+        s2 = self._row(self.alice, 2)
+        self.assertEqual((s2.credits, s2.eliminated_count, s2.moyenne), (0, 1, None))
+
+        self.ue2.credit = 6
+        self.ue2.save()
+        self.assertAlmostEqual(self._row(self.alice, 1).moyenne, round((14.6*6 + 10*6) / 12, 2), places=2)
+
+        n1.delete()
+        self.assertAlmostEqual(self._row(self.alice, 1).moyenne, 10.0)
+        Note.objects.filter(etudiant=self.alice).delete()
+        self.assertFalse(MoyenneSemestre.objects.filter(etudiant=self.alice).exists())
+
+    def test_rebuild_command_and_cohort_sort(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import MoyenneSemestre
+        Note.objects.create(etudiant=self.alice, ue=self.ue1, cc=8, tp=8, sn=8)
+        Note.objects.create(etudiant=self.bob, ue=self.ue1, cc=15, tp=15, sn=15)
+        MoyenneSemestre.objects.all().delete()
+        call_command('rebuild_moyennes', stdout=StringIO())
+        self.assertEqual(self._row(self.bob, 1).moyenne, 15.0)
+
+        r = self.client.get(f'/etudiants/?departement={self.dep.id}&filiere={self.fil.id}&niveau={self.niv.id}&sort=moyenne')
+        self.assertEqual([row['etudiant'].nom for row in r.context['rows']], ['Bob', 'Alice'])
+        self.assertEqual(r.context['rows'][0]['moyenne'], 15.0)
+
+    def test_weight_change_refreshes_moyennes(self):
+        from django.core.cache import cache
+        cache.clear()
+        Note.objects.create(etudiant=self.alice, ue=self.ue1, cc=20, tp=10, sn=10)  # 12 with 20/30/50
+        self.assertAlmostEqual(self._row(self.alice, 1).moyenne, 12.0)
+        self.assertAlmostEqual(self.client.get(f'/moyenne/{self.alice.id}/').context['average'], 12.0)
+
+        self.ue1.cc_weight, self.ue1.tp_weight, self.ue1.sn_weight = 100, 0, 0
+        self.ue1.save()
+        self.assertEqual(Note.objects.get(etudiant=self.alice, ue=self.ue1).final, 20.0)
+        row = self._row(self.alice, 1)
+        self.assertAlmostEqual(row.weighted_sum, 120.0)
+        self.assertAlmostEqual(row.moyenne, 20.0)
+        r = self.client.get(f'/moyenne/{self.alice.id}/')
+        self.assertAlmostEqual(r.context['average'], 20.0)
+        self.assertEqual(r.context['notes'][0].final, 20.0)
+
+    def test_moyenne_view_reads_materialized_average(self):
+        Note.objects.create(etudiant=self.alice, ue=self.ue1, cc=12, tp=14, sn=16)
+        r = self.client.get(f'/moyenne/{self.alice.id}/')
+        self.assertEqual(r.context['average'], 14.6)
+        # the materialized row is what the page reports
+        from .models import MoyenneSemestre
+        MoyenneSemestre.objects.filter(etudiant=self.alice).update(weighted_sum=60, credits=6)
+        # a raw update sends no signal, so the cached page data has to go
+        from django.core.cache import cache
+        cache.clear()
+        self.assertEqual(self.client.get(f'/moyenne/{self.alice.id}/').context['average'], 10.0)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class BulkTranscriptsTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE201', nom='Réseaux', credit=4, filiere=self.fil, niveau=self.niv, semester=2)
+        for i in range(3):
+            e = Etudiant.objects.create(nom=f'E{i}', matricule=f'T{i:03d}', filiere=self.fil, niveau=self.niv)
+            Note.objects.create(etudiant=e, ue=self.ue1, cc=10 + i, tp=10, sn=10)
+            Note.objects.create(etudiant=e, ue=self.ue2, cc=12, tp=12, sn=12)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def test_collect_cohort_uses_few_queries(self):
+        from .transcripts import collect_cohort
+        with self.assertNumQueries(3):
+            datas = collect_cohort(self.fil.id, self.niv.id, semester=1)
+        self.assertEqual([d['matricule'] for d in datas], ['T000', 'T001', 'T002'])
+        self.assertEqual([n[1] for n in datas[0]['notes']], ['UE101'])
+        self.assertEqual(datas[1]['moyenne'], round(11*0.2 + 10*0.3 + 10*0.5, 2))
+
+    def test_zip_and_single_pdf_endpoint(self):
+        import zipfile
+        from io import BytesIO
+        from unittest import mock
+        from . import transcripts
+        # rendered in the web worker, never on a process pool
+        with mock.patch.object(transcripts, 'POOL_CHUNK_SIZE', 1), mock.patch.object(transcripts, 'ProcessPoolExecutor') as pool:
+            r = self.client.get(f'/releves/?filiere={self.fil.id}&niveau={self.niv.id}&semester=1')
+        pool.assert_not_called()
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        self.assertEqual(r['Content-Type'], 'application/zip')
+        self.assertIn(f'releves_{self.fil.id}_{self.niv.id}_S1.zip', r['Content-Disposition'])
+        self.assertEqual(r['X-Pages'], '3')
+        names = zipfile.ZipFile(BytesIO(b''.join(r.streaming_content))).namelist()
+        self.assertEqual(sorted(names), [f'releve_notes_T{i:03d}.pdf' for i in range(3)])
+
+        r2 = self.client.get(f'/releves/?filiere={self.fil.id}&niveau={self.niv.id}&output=pdf')
+        self.assertEqual(r2['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(r2.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(r2['X-Transcripts'], '3')
+
+    def test_rejects_bad_cohort(self):
+        for params in ({'filiere': 'abc', 'niveau': self.niv.id}, {'filiere': self.fil.id, 'niveau': '"x'}):
+            self.assertEqual(self.client.get('/releves/', params).status_code, 400)
+
+    def test_command_renders_on_process_pool(self):
+        import tempfile, os
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from . import transcripts
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(transcripts, 'POOL_CHUNK_SIZE', 1):
+            dest = os.path.join(tmp, 'out.zip')
+            out = StringIO()
+            call_command('generate_transcripts', filiere=self.fil.id, niveau=self.niv.id, workers=2, dest=dest, stdout=out)
+            self.assertTrue(os.path.getsize(dest) > 0)
+        self.assertIn('pages/s', out.getvalue())
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ExcelImportTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        for i in range(60):
+            Etudiant.objects.create(nom=f'E{i}', matricule=f'X{i:03d}', filiere=self.fil, niveau=self.niv)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def _sheet(self, rows):
+        from io import BytesIO
+        from openpyxl import Workbook
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['Nom', 'Matricule', 'CC', 'TP', 'SN'])
+        for row in rows:
+            ws.append(row)
+        out = BytesIO()
+        wb.save(out)
+        return SimpleUploadedFile('notes.xlsx', out.getvalue())
+
+    def _import(self, rows):
+        return self.client.post('/api/notes/import/', {'ue_id': self.ue.id, 'file': self._sheet(rows)})
+
+    def test_import_creates_updates_and_reports_errors(self):
+        from .models import MoyenneSemestre
+        e0 = Etudiant.objects.get(matricule='X000')
+        Note.objects.create(etudiant=e0, ue=self.ue, cc=1, tp=1, sn=1)
+        r = self._import([
+            ['E0', 'X000', 10, 12, 14],
+            ['E1', 'X001', 15, None, 15],
+            ['Ghost', 'NOPE', 10, 10, 10],
+            ['E2', 'X002', 25, 10, 10],
+            [None, None, None, None, None],
+        ])
+        data = r.json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['imported'], data['updated'], data['rows']), (1, 1, 4))
+        self.assertEqual(len(data['errors']), 2)
+        self.assertIn("Row 4", data['errors'][0])
+        self.assertIn('rows_per_second', data)
+        n0 = Note.objects.get(etudiant=e0, ue=self.ue)
+        self.assertEqual(n0.final, round(10*0.2 + 12*0.3 + 14*0.5, 2))
+        self.assertTrue(Note.objects.get(etudiant__matricule='X001').is_eliminated)
+        self.assertEqual(MoyenneSemestre.objects.get(etudiant=e0, semester=1).moyenne, n0.final)
+
+    def test_query_count_independent_of_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        counts = []
+        for n in (5, 60):
+            rows = [[f'E{i}', f'X{i:03d}', 10, 10, 10] for i in range(n)]
+            upload = self._sheet(rows)
+            Note.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                r = self.client.post('/api/notes/import/', {'ue_id': self.ue.id, 'file': upload})
+            self.assertTrue(r.json()['success'])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_new_notes_are_written_once(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        upload = self._sheet([[f'E{i}', f'X{i:03d}', 10, 10, 10] for i in range(60)])
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post('/api/notes/import/', {'ue_id': self.ue.id, 'file': upload})
+        self.assertEqual(r.json()['imported'], 60)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "notes_note"')])
+
+    def test_note_created_concurrently_is_updated(self):
+        from unittest import mock
+        student = Etudiant.objects.get(matricule='X001')
+        compute_final = Note.compute_final
+
+        def racing(note, ue=None):
+            # another upload creates the same note after this one read the chunk's grades
+            if not Note.objects.filter(etudiant=student, ue=self.ue).exists():
+                Note.objects.bulk_create([Note(etudiant=student, ue=self.ue, cc=1, tp=1, sn=1)])
+            return compute_final(note, ue)
+
+        with mock.patch.object(Note, 'compute_final', racing):
+            data = self._import([[f'E{i}', f'X{i:03d}', 10, 12, 14] for i in range(3)]).json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['imported'], data['updated']), (2, 1))
+        note = Note.objects.get(etudiant=student, ue=self.ue)
+        self.assertEqual((note.cc, note.tp, note.sn), (10, 12, 14))
+        self.assertEqual(note.final, round(10*0.2 + 12*0.3 + 14*0.5, 2))
+
+    def test_only_changed_rows_are_written(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        rows = [[f'E{i}', f'X{i:03d}', 10, 10, 10] for i in range(5)]
+        self._import(rows)
+        rows[2][4] = 18
+        rows.append(['Ghost', 'NOPE', 1, 1, 1])
+        with CaptureQueriesContext(connection) as ctx:
+            data = self._import(rows).json()
+        self.assertEqual((data['imported'], data['updated'], data['unchanged'], len(data['errors'])), (0, 1, 4, 1))
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "notes_note"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Note.objects.get(etudiant__matricule='X002').sn, 18)
+
+    def test_dry_run_returns_the_diff_without_writing(self):
+        from .models import GradeVersion
+        e0 = Etudiant.objects.get(matricule='X000')
+        Note.objects.create(etudiant=e0, ue=self.ue, cc=1, tp=1, sn=1)
+        version = GradeVersion.current(self.fil.id, self.niv.id)
+        r = self.client.post('/api/notes/import/', {
+            'ue_id': self.ue.id, 'dry_run': '1',
+            'file': self._sheet([['E0', 'X000', 10, 1, 1], ['E1', 'X001', 5, 5, 5]]),
+        })
+        data = r.json()
+        self.assertEqual((data['imported'], data['updated']), (1, 1))
+        self.assertEqual(data['changes'][0]['before'], {'cc': 1, 'tp': 1, 'sn': 1})
+        self.assertEqual(data['changes'][0]['after'], {'cc': 10, 'tp': 1, 'sn': 1})
+        self.assertIsNone(data['changes'][1]['before'])
+        self.assertEqual(Note.objects.get(etudiant=e0).cc, 1)
+        self.assertEqual(Note.objects.count(), 1)
+        self.assertEqual(GradeVersion.current(self.fil.id, self.niv.id), version)
+
+    def test_identical_reupload_is_short_circuited(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        content = self._sheet([['E0', 'X000', 10, 10, 10], ['E1', 'X001', 12, 12, 12]]).read()
+
+        def upload():
+            from django.core.files.uploadedfile import SimpleUploadedFile
+            return self.client.post('/api/notes/import/', {'ue_id': self.ue.id, 'file': SimpleUploadedFile('notes.xlsx', content)}).json()
+
+        self.assertEqual(upload()['imported'], 2)
+        with CaptureQueriesContext(connection) as ctx:
+            data = upload()
+        self.assertTrue(data['duplicate'])
+        self.assertEqual((data['imported'], data['updated'], data['unchanged']), (0, 0, 2))
+        self.assertFalse([q for q in ctx.captured_queries if 'notes_note' in q['sql']])
+
+        # a grade edited since then invalidates the shortcut
+        note = Note.objects.get(etudiant__matricule='X000')
+        note.cc = 2
+        note.save()
+        data = upload()
+        self.assertNotIn('duplicate', data)
+        self.assertEqual((data['updated'], data['unchanged']), (1, 1))
+
+@override_settings(ALLOWED_HOSTS=["testserver"], IMPORT_JOB_WORKERS=0)
+class ImportJobTestCase(TestCase):
+    _sheet = ExcelImportTestCase._sheet
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        for i in range(3):
+            Etudiant.objects.create(nom=f'E{i}', matricule=f'X{i:03d}', filiere=self.fil, niveau=self.niv)
+        self.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        User.objects.create_user('other', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def _enqueue(self, upload):
+        r = self.client.post('/api/notes/import/', {'ue_id': self.ue.id, 'file': upload, 'async': '1'})
+        self.assertEqual(r.status_code, 202)
+        return r.json()['job_id']
+
+    def test_job_is_queued_then_processed(self):
+        from django.core.management import call_command
+        from io import StringIO
+        job_id = self._enqueue(self._sheet([['E0', 'X000', 10, 12, 14], ['Ghost', 'NOPE', 1, 1, 1]]))
+        self.assertFalse(Note.objects.exists())
+        status = self.client.get(f'/api/notes/import/{job_id}/').json()
+        self.assertEqual((status['status'], status['rows_processed']), ('pending', 0))
+
+        call_command('process_import_jobs', stdout=StringIO())
+        status = self.client.get(f'/api/notes/import/{job_id}/').json()
+        self.assertTrue(status['success'])
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual((status['imported'], status['rows_processed'], len(status['errors'])), (1, 2, 1))
+        self.assertEqual(Note.objects.get().final, round(10*0.2 + 12*0.3 + 14*0.5, 2))
+
+    def test_unreadable_file_fails_job(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .jobs import run_import_job
+        from .models import ImportJob
+        job_id = self._enqueue(SimpleUploadedFile('notes.xlsx', b'not a workbook'))
+        self.assertTrue(run_import_job(job_id))
+        self.assertFalse(run_import_job(job_id))  # already claimed
+        status = self.client.get(f'/api/notes/import/{job_id}/').json()
+        self.assertFalse(status['success'])
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(ImportJob.objects.get(pk=job_id).payload, b'')
+
+    def test_lost_running_jobs_are_failed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .jobs import STALE_JOB_TIMEOUT, drain_pending
+        from .models import ImportJob
+        lost = self._enqueue(self._sheet([['E0', 'X000', 10, 12, 14]]))
+        running = self._enqueue(self._sheet([['E1', 'X001', 10, 12, 14]]))
+        now = timezone.now()
+        ImportJob.objects.filter(pk=lost).update(status=ImportJob.RUNNING, started_at=now - timedelta(seconds=STALE_JOB_TIMEOUT + 1))
+        ImportJob.objects.filter(pk=running).update(status=ImportJob.RUNNING, started_at=now)
+
+        self.assertEqual(drain_pending(), 0)
+        status = self.client.get(f'/api/notes/import/{lost}/').json()
+        self.assertEqual((status['status'], status['success']), ('failed', False))
+        self.assertEqual(ImportJob.objects.get(pk=lost).payload, b'')
+        self.assertEqual(ImportJob.objects.get(pk=running).status, ImportJob.RUNNING)
+
+    def test_status_is_private_to_uploader(self):
+        job_id = self._enqueue(self._sheet([]))
+        self.client.login(username='other', password='x')
+        self.assertEqual(self.client.get(f'/api/notes/import/{job_id}/').status_code, 403)
+
+    @override_settings(IMPORT_JOB_WORKERS=1)
+    def test_worker_pool_is_handed_the_job_on_commit(self):
+        from unittest import mock
+        from . import jobs
+        with mock.patch.object(jobs, '_get_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                job_id = self._enqueue(self._sheet([]))
+        executor.return_value.submit.assert_called_once_with(jobs._run_in_thread, job_id)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ExcelExportTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        other_fil = Filiere.objects.create(nom='Réseaux', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.other_ue = UE.objects.create(code='UE102', nom='BD', credit=4, filiere=self.fil, niveau=self.niv)
+        self.a = Etudiant.objects.create(nom='Alice', matricule='A1', filiere=self.fil, niveau=self.niv)
+        self.b = Etudiant.objects.create(nom='Bob', matricule='B1', filiere=self.fil, niveau=self.niv)
+        Etudiant.objects.create(nom='Carl', matricule='C1', filiere=other_fil, niveau=self.niv)
+        Note.objects.create(etudiant=self.a, ue=self.ue, cc=10, tp=12, sn=14)
+        Note.objects.create(etudiant=self.b, ue=self.other_ue, cc=5, tp=5, sn=5)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def test_export_is_streamed_and_scoped_to_the_ue_cohort(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+        r = self.client.get('/api/notes/export/', {'ue_id': self.ue.id})
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        self.assertIn('notes_UE101_L2.xlsx', r['Content-Disposition'])
+        ws = load_workbook(BytesIO(b''.join(r.streaming_content))).active
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('Nom', 'Matricule', 'CC', 'TP', 'SN'))
+        self.assertEqual(rows[1:], [('Alice', 'A1', 10, 12, 14), ('Bob', 'B1', None, None, None)])
+
+    def test_export_requires_a_valid_ue(self):
+        self.assertEqual(self.client.get('/api/notes/export/').status_code, 400)
+        self.assertEqual(self.client.get('/api/notes/export/', {'ue_id': 'x'}).status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], IMPORT_JOB_WORKERS=0)
+class CsvSheetTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        from django.contrib.auth.models import User
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        for i in range(3):
+            Etudiant.objects.create(nom=f'Élève {i}', matricule=f'X{i:03d}', filiere=self.fil, niveau=self.niv)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+
+    def _upload(self, text, **extra):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        data = {'ue_id': self.ue.id, 'file': SimpleUploadedFile('notes.csv', text.encode('utf-8-sig')), **extra}
+        return self.client.post('/api/notes/import/csv/', data)
+
+    def test_csv_import_applies_the_xlsx_rules(self):
+        r = self._upload(
+            'Nom;Matricule;CC;TP;SN\n'
+            'Élève 0;X000;10,5;12;14\n'
+            'Élève 1;X001;25;10;10\n'
+            'Ghost;NOPE;1;1;1\n'
+            ';;;;\n'
+        )
+        data = r.json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['imported'], data['rows'], len(data['errors'])), (1, 3, 2))
+        self.assertIn('Row 3', data['errors'][0])
+        self.assertEqual(Note.objects.get(etudiant__matricule='X000').cc, 10.5)
+
+    def test_csv_async_job_uses_the_csv_reader(self):
+        from .jobs import drain_pending
+        r = self._upload('Nom,Matricule,CC,TP,SN\nÉlève 2,X002,8,9,10\n', **{'async': '1'})
+        job_id = r.json()['job_id']
+        self.assertEqual(drain_pending(), 1)
+        status = self.client.get(f'/api/notes/import/{job_id}/').json()
+        self.assertEqual((status['status'], status['imported']), ('done', 1))
+
+    def test_csv_export_streams_and_round_trips(self):
+        Note.objects.create(etudiant=Etudiant.objects.get(matricule='X001'), ue=self.ue, cc=11, tp=12, sn=13)
+        r = self.client.get('/api/notes/export/csv/', {'ue_id': self.ue.id})
+        self.assertTrue(r.streaming)
+        self.assertIn('notes_UE101_L2.csv', r['Content-Disposition'])
+        content = b''.join(r.streaming_content).decode('utf-8-sig')
+        self.assertEqual(content.splitlines()[:3], ['Nom,Matricule,CC,TP,SN', 'Élève 0,X000,,,', 'Élève 1,X001,11.0,12.0,13.0'])
+
+        Note.objects.all().delete()
+        data = self._upload(content).json()
+        self.assertEqual((data['imported'], data['errors']), (3, []))
+        self.assertEqual(Note.objects.get(etudiant__matricule='X001').sn, 13)
+
+    def test_benchmark_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('benchmark_sheets', rows=20, stdout=out)
+        self.assertIn('csv: import', out.getvalue())
+        self.assertFalse(UE.objects.filter(code='BENCH').exists())
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class UEStatsTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        grades = [(8, 8, 8), (12, 12, 12), (16, 16, 16), (20, 20, 20), (10, None, 10)]
+        for i, (cc, tp, sn) in enumerate(grades):
+            e = Etudiant.objects.create(nom=f'E{i}', matricule=f'X{i:03d}', filiere=self.fil, niveau=self.niv)
+            Note.objects.create(etudiant=e, ue=self.ue, cc=cc, tp=tp, sn=sn)
+        User.objects.create_user('prof', password='x')
+        self.client.login(username='prof', password='x')
+        self.url = f'/api/ues/{self.ue.id}/stats/'
+
+    def test_distribution(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual((data['notes'], data['graded'], data['eliminated'], data['passed']), (5, 4, 1, 3))
+        self.assertEqual((data['mean'], data['median'], data['min'], data['max']), (14.0, 14.0, 8.0, 20.0))
+        self.assertEqual(data['std'], round((sum((x - 14) ** 2 for x in (8, 12, 16, 20)) / 4) ** 0.5, 2))
+        self.assertEqual((data['pass_rate'], data['elimination_rate']), (0.6, 0.2))
+        counts = [b['count'] for b in data['histogram']]
+        self.assertEqual(len(counts), 10)
+        self.assertEqual((counts[4], counts[6], counts[8], counts[9]), (1, 1, 1, 1))
+
+    def test_cached_per_grade_version(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertFalse([q for q in ctx.captured_queries if 'notes_note' in q['sql']])
+
+        note = Note.objects.get(etudiant__matricule='X004')
+        note.tp = 10
+        note.save()
+        data = self.client.get(self.url).json()
+        self.assertEqual((data['graded'], data['eliminated']), (5, 0))
+
+    def test_etag_and_unknown_ue(self):
+        r = self.client.get(self.url)
+        r2 = self.client.get(self.url, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(r2.status_code, 304)
+        self.assertEqual(self.client.get('/api/ues/999999/stats/').status_code, 404)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ClassementTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE102', nom='BD', credit=2, filiere=self.fil, niveau=self.niv)
+        # finals UE101: 15, 15, 12, eliminated ; UE102 reverses the order
+        grades = [(15, 5), (15, 10), (12, 20), (None, 8)]
+        for i, (g1, g2) in enumerate(grades):
+            e = Etudiant.objects.create(nom=f'E{i}', matricule=f'X{i:03d}', filiere=self.fil, niveau=self.niv)
+            Note.objects.create(etudiant=e, ue=self.ue, cc=g1, tp=g1, sn=g1)
+            Note.objects.create(etudiant=e, ue=self.ue2, cc=g2, tp=g2, sn=g2)
+        User.objects.create_user('prof', password='x')
+        self.client.login(username='prof', password='x')
+
+    def _get(self, **params):
+        return self.client.get('/api/classement/', {'filiere': self.fil.id, 'niveau': self.niv.id, **params}).json()
+
+    def test_ue_ranking_handles_ties(self):
+        data = self._get(ue=self.ue.id)
+        self.assertEqual(data['by'], 'ue')
+        self.assertEqual(data['total'], 3)
+        ranks = [(r['matricule'], r['rank'], r['dense_rank'], r['score']) for r in data['results']]
+        self.assertEqual(ranks, [('X000', 1, 1, 15.0), ('X001', 1, 1, 15.0), ('X002', 3, 2, 12.0)])
+
+    def test_moyenne_ranking_and_pagination(self):
+        data = self._get(semester=1, page_size=2, page=2)
+        self.assertEqual(data['by'], 'moyenne')
+        self.assertEqual((data['total'], data['num_pages'], data['page']), (4, 2, 2))
+        # X002: (12*6 + 20*2)/8 = 14 ; X001: 13.75 ; X000: 12.5 ; X003: 8 (only UE102 counted)
+        self.assertEqual([r['matricule'] for r in data['results']], ['X000', 'X003'])
+        self.assertEqual([r['rank'] for r in data['results']], [3, 4])
+
+    def test_one_query_cached_per_grade_version(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .rankings import cohort_ranking
+        with CaptureQueriesContext(connection) as ctx:
+            cohort_ranking(self.fil.id, self.niv.id, 1, self.ue)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'RANK()' in q['sql']]), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            cohort_ranking(self.fil.id, self.niv.id, 1, self.ue)
+        self.assertFalse([q for q in ctx.captured_queries if 'RANK()' in q['sql']])
+
+        note = Note.objects.get(etudiant__matricule='X002', ue=self.ue)
+        note.cc = note.tp = note.sn = 19
+        note.save()
+        self.assertEqual(cohort_ranking(self.fil.id, self.niv.id, 1, self.ue)[0][3], 'E2')
+
+    def test_bad_parameters(self):
+        cohort = {'filiere': self.fil.id, 'niveau': self.niv.id}
+        for params in ({'filiere': 'abc', 'niveau': self.niv.id}, {**cohort, 'niveau': 'abc'}, {**cohort, 'ue': 'abc'}):
+            self.assertEqual(self.client.get('/api/classement/', params).status_code, 400)
+        self.assertEqual(self.client.get('/classement/', {**cohort, 'ue': 'abc'}).status_code, 400)
+        # page_size is clamped to 1..MAX_PAGE_SIZE, garbage falls back to the default
+        for page_size, num_pages in (('0', 4), ('-3', 4), ('abc', 1), ('100000', 1)):
+            self.assertEqual(self._get(page_size=page_size)['num_pages'], num_pages)
+        self.assertEqual(self.client.get('/classement/', {**cohort, 'page_size': '0'}).status_code, 200)
+
+    def test_page(self):
+        r = self.client.get('/classement/', {'filiere': self.fil.id, 'niveau': self.niv.id, 'ue': self.ue.id})
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, 'Classement UE101')
+        self.assertEqual([row['matricule'] for row in r.context['rows']], ['X000', 'X001', 'X002'])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class DeliberationTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        self.ue2 = UE.objects.create(code='UE102', nom='BD', credit=4, filiere=self.fil, niveau=self.niv)
+        UE.objects.create(code='UE201', nom='Réseaux', credit=5, filiere=self.fil, niveau=self.niv, semester=2)
+        # (UE101, UE102): all validated / compensated / failed / eliminated (missing UE102 note)
+        for i, (g1, g2) in enumerate([(12, 14), (14, 8), (8, 9), (16, None)]):
+            e = Etudiant.objects.create(nom=f'E{i}', matricule=f'X{i:03d}', filiere=self.fil, niveau=self.niv)
+            Note.objects.create(etudiant=e, ue=self.ue1, cc=g1, tp=g1, sn=g1)
+            if g2 is not None:
+                Note.objects.create(etudiant=e, ue=self.ue2, cc=g2, tp=g2, sn=g2)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        User.objects.create_user('prof', password='x')
+        self.client.login(username='staff', password='x')
+        self.params = {'filiere': self.fil.id, 'niveau': self.niv.id, 'semester': 1}
+
+    def test_decisions_and_credits(self):
+        data = self.client.get('/api/deliberation/', self.params).json()
+        self.assertEqual([u['code'] for u in data['ues']], ['UE101', 'UE102'])
+        rows = {s['matricule']: s for s in data['students']}
+        self.assertEqual((rows['X000']['decision'], rows['X000']['credits_earned']), ('admis', 10))
+        self.assertEqual((rows['X001']['decision'], rows['X001']['credits_earned']), ('admis par compensation', 10))
+        self.assertEqual(rows['X001']['moyenne'], round((14 * 6 + 8 * 4) / 10, 2))
+        self.assertEqual((rows['X002']['decision'], rows['X002']['credits_earned']), ('ajourné', 0))
+        self.assertEqual((rows['X003']['decision'], rows['X003']['credits_earned']), ('ajourné', 6))
+        self.assertEqual((rows['X003']['validated'], rows['X003']['eliminated']), (['UE101'], ['UE102']))
+        self.assertEqual(data['summary'], {'students': 4, 'admis': 1, 'compenses': 1, 'ajournes': 2, 'pass_rate': 0.5})
+
+    def test_batch_is_a_few_queries(self):
+        from .deliberation import deliberate
+        with self.assertNumQueries(3):
+            deliberate(self.fil.id, self.niv.id, 1)
+
+    def test_export_and_permissions(self):
+        r = self.client.get('/api/deliberation/export/', self.params)
+        lines = b''.join(r.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'Nom,Matricule,Moyenne,Crédits acquis,Crédits,UE validées,UE éliminées,Décision')
+        self.assertEqual(len(lines), 5)
+        r = self.client.get('/api/deliberation/export/', {**self.params, 'format': 'xlsx'})
+        self.assertIn('deliberation_', r['Content-Disposition'])
+        self.assertEqual(self.client.get('/api/deliberation/').status_code, 400)
+        for url in ('/api/deliberation/', '/api/deliberation/export/'):
+            self.assertEqual(self.client.get(url, {**self.params, 'filiere': 'abc'}).status_code, 400)
+            self.assertEqual(self.client.get(url, {**self.params, 'niveau': '1x'}).status_code, 400)
+        self.client.login(username='prof', password='x')
+        self.assertEqual(self.client.get('/api/deliberation/', self.params).status_code, 403)
+
+    def test_benchmark_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('benchmark_deliberation', students=20, ues=3, stdout=out)
+        self.assertIn('3 requêtes', out.getvalue())
+        self.assertFalse(UE.objects.filter(code__startswith='BENCH').exists())
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.ue1 = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        UE.objects.create(code='UE201', nom='Réseaux', credit=4, filiere=self.fil, niveau=self.niv, semester=2)
+        for i in range(3):
+            Etudiant.objects.create(nom=f'E{i}', matricule=f'X{i:03d}', filiere=self.fil, niveau=self.niv)
+        e0, e1 = Etudiant.objects.order_by('id')[:2]
+        Note.objects.create(etudiant=e0, ue=self.ue1, cc=10, tp=10, sn=10)
+        Note.objects.create(etudiant=e1, ue=self.ue1, cc=10, tp=None, sn=10)
+
+    def test_figures_and_progress(self):
+        from .dashboard import dashboard_stats
+        stats = dashboard_stats()
+        self.assertEqual((stats['etudiants'], stats['ues'], stats['notes'], stats['estimated']), (3, 2, 2, []))
+        s1, s2 = stats['semesters']
+        self.assertEqual((s1['expected'], s1['entered'], s1['complete'], s1['rate']), (3, 2, 1, 33.3))
+        self.assertEqual((s2['expected'], s2['complete'], s2['rate']), (3, 0, 0.0))
+
+    def test_home_reads_the_cache_until_a_structural_write(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/')
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql']])
+        self.assertContains(r, '1 / 3')
+
+        Etudiant.objects.create(nom='E9', matricule='X009', filiere=self.fil, niveau=self.niv)
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/')
+        self.assertEqual(r.context['stats']['etudiants'], 4)
+        # the semester progress is only refreshed when it expires
+        self.assertEqual(r.context['stats']['semesters'][0]['expected'], 3)
+        self.assertFalse([q for q in ctx.captured_queries if 'notes_moyennesemestre' in q['sql']])
+
+    def test_progress_is_summed_from_the_moyennes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .dashboard import semester_progress
+        with CaptureQueriesContext(connection) as ctx:
+            s1, _ = semester_progress()
+        self.assertEqual((s1['entered'], s1['complete']), (2, 1))
+        self.assertFalse([q for q in ctx.captured_queries if 'notes_note' in q['sql']])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class HierarchyTestCase(TestCase):
+    def setUp(self):
+        self.dep = Departement.objects.create(nom='Informatique')
+        self.fil = Filiere.objects.create(nom='Génie Logiciel', departement=self.dep)
+        self.niv = Niveau.objects.create(nom='L2')
+        self.niv3 = Niveau.objects.create(nom='L3')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=6, filiere=self.fil, niveau=self.niv)
+        Etudiant.objects.create(nom='Alice', matricule='A001', filiere=self.fil, niveau=self.niv)
+
+    def test_tree_and_etag(self):
+        r = self.client.get('/api/hierarchy/')
+        tree = r.json()
+        fil = tree['departements'][0]['filieres'][0]
+        self.assertEqual(fil['id'], self.fil.id)
+        # only the niveaux the filière has students in
+        self.assertEqual([n['id'] for n in fil['niveaux']], [self.niv.id])
+        self.assertEqual(fil['niveaux'][0]['ues'], [{'id': self.ue.id, 'code': 'UE101', 'nom': 'Algo', 'semester': 1}])
+        self.assertEqual(len(tree['niveaux']), 2)
+        self.assertEqual(self.client.get('/api/hierarchy/', HTTP_IF_NONE_MATCH=r['ETag']).status_code, 304)
+
+    def test_cached_in_process_and_invalidated_on_writes(self):
+        from .hierarchy import get_hierarchy
+        get_hierarchy()
+        with self.assertNumQueries(0):
+            self.client.get('/api/niveaux/', {'filiere': self.fil.id})
+            self.client.get('/api/ues/', {'filiere': self.fil.id, 'niveau': self.niv.id})
+
+        etag = get_hierarchy().etag
+        # a student moving to L3 adds that niveau to the filière
+        e = Etudiant.objects.get(matricule='A001')
+        e.niveau = self.niv3
+        e.save()
+        self.assertNotEqual(get_hierarchy().etag, etag)
+        self.assertEqual(self.client.get('/api/niveaux/', {'filiere': self.fil.id}).json()['niveaux'], [{'id': self.niv3.id, 'nom': 'L3'}])
+
+        etag = get_hierarchy().etag
+        e.nom = 'Alicia'
+        e.save()
+        self.assertEqual(get_hierarchy().etag, etag)
+
+    def test_ues_of_a_cohort_without_students(self):
+        ue = UE.objects.create(code='UE301', nom='Compilation', credit=4, filiere=self.fil, niveau=self.niv3)
+        r = self.client.get('/api/ues/', {'filiere': self.fil.id, 'niveau': self.niv3.id})
+        self.assertEqual(r.json()['ues'], [{'id': ue.id, 'nom': 'Compilation', 'code': 'UE301'}])
+        # the tree itself still lists only the niveaux with students
+        fil = self.client.get('/api/hierarchy/').json()['departements'][0]['filieres'][0]
+        self.assertEqual([n['id'] for n in fil['niveaux']], [self.niv.id])
+
+    def test_pages_use_the_cached_tree(self):
+        from django.contrib.auth.models import User
+        from .hierarchy import get_hierarchy
+        get_hierarchy()
+        User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+        r = self.client.get('/etudiants/', {'ue': self.ue.id})
+        self.assertEqual(r.context['selected_ue'], self.ue.id)
+        self.assertContains(r, 'UE101 - Algo')
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/tableau/')
+        self.assertFalse([q for q in ctx.captured_queries if 'notes_departement' in q['sql']])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class IndexPlanTestCase(TestCase):
+    """The hot views' queries on students, UEs and notes are served by indexes."""
+
+    TABLES = ('notes_etudiant', 'notes_ue', 'notes_note')
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from django.db import connection
+        from .hierarchy import get_hierarchy
+        cache.clear()
+        dep = Departement.objects.create(nom='Info')
+        niveaux = [Niveau.objects.create(nom=f'L{i}') for i in range(1, 4)]
+        self.fil = Filiere.objects.create(nom='GL', departement=dep)
+        other = Filiere.objects.create(nom='RS', departement=dep)
+        self.niv = niveaux[0]
+        ues = []
+        for f in (self.fil, other):
+            for n in niveaux:
+                for i in range(6):
+                    ues.append(UE.objects.create(
+                        code=f'{f.nom}{n.nom}{i}', nom='UE', credit=3, filiere=f, niveau=n, semester=1 + i % 2,
+                    ))
+        students = Etudiant.objects.bulk_create(
+            Etudiant(nom=f'Etudiant {i:04d}', matricule=f'M{i:04d}', filiere=(self.fil, other)[i % 2], niveau=niveaux[i % 3])
+            for i in range(600)
+        )
+        Note.objects.bulk_create(
+            Note(etudiant=e, ue=u, cc=12, tp=None if e.id % 7 == 0 else 11, sn=10)
+            for e in students for u in ues if (u.filiere_id, u.niveau_id) == (e.filiere_id, e.niveau_id)
+        )
+        self.ue = UE.objects.filter(filiere=self.fil, niveau=self.niv).order_by('code').first()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        get_hierarchy()
+        User.objects.create_superuser('admin', password='x')
+        self.client.login(username='admin', password='x')
+
+    def plans(self, url, params):
+        """(sql, plan) of every query ``url`` runs against the student/UE/note tables."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(url, params)
+            if getattr(r, 'streaming', False):
+                b''.join(r.streaming_content)
+        self.assertEqual(r.status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # the seeded tables are small enough for a sequential scan to win on cost
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if sql.startswith('SELECT') and any(f'"{t}"' in sql for t in self.TABLES):
+                    explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+                    cursor.execute(explain + sql)
+                    plans.append((sql, '\n'.join(str(row[-1]) for row in cursor.fetchall())))
+        self.assertTrue(plans)
+        return plans
+
+    def assertIndexScans(self, plans, *indexes):
+        import re
+        for sql, plan in plans:
+            for table in self.TABLES:
+                # SQLite: "SCAN <table>" without USING INDEX; PostgreSQL: "Seq Scan on <table>"
+                full_scan = re.search(rf'SCAN {table}\b(?! USING)|Seq Scan on {table}\b', plan)
+                self.assertIsNone(full_scan, f'{sql}\n{plan}')
+        used = '\n'.join(plan for _, plan in plans)
+        for index in indexes:
+            self.assertIn(index, used)
+
+    def test_notes_json(self):
+        plans = self.plans('/api/notes/', {'filiere': self.fil.id, 'niveau': self.niv.id, 'semester': 1, 'page_size': 20})
+        self.assertIndexScans(plans, 'etudiant_cohort_nom_idx', 'ue_cohort_semester_code_idx', 'note_ue_etudiant_idx')
+
+    def test_etudiant_list(self):
+        plans = self.plans('/etudiants/', {'filiere': self.fil.id, 'niveau': self.niv.id})
+        self.assertIndexScans(plans, 'etudiant_cohort_nom_idx')
+
+    def test_notes_export_excel(self):
+        plans = self.plans('/api/notes/export/', {'ue_id': self.ue.id})
+        self.assertIndexScans(plans, 'etudiant_cohort_nom_idx', 'note_ue_etudiant_idx')
+
+    def test_missing_components(self):
+        from django.db import connection
+        from django.db.models import Q
+        plan = Note.objects.filter(ue=self.ue).filter(Q(cc__isnull=True) | Q(tp__isnull=True) | Q(sn__isnull=True)).explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('note_ue_missing_idx', plan)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], METRICS_SAMPLE_RATE=1.0)
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from .metrics import registry
+        registry.reset()
+        dep = Departement.objects.create(nom='Info')
+        self.fil = Filiere.objects.create(nom='GL', departement=dep)
+        self.niv = Niveau.objects.create(nom='L1')
+        ue = UE.objects.create(code='UE101', nom='Algo', credit=3, filiere=self.fil, niveau=self.niv)
+        e = Etudiant.objects.create(nom='Alice', matricule='A001', filiere=self.fil, niveau=self.niv)
+        Note.objects.create(etudiant=e, ue=ue, cc=12, tp=14, sn=10)
+        User.objects.create_user('staff', password='x', is_staff=True)
+        User.objects.create_user('prof', password='x')
+
+    def test_records_latency_and_sql_per_view(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .metrics import registry
+        self.client.login(username='staff', password='x')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/notes/', {'filiere': self.fil.id, 'niveau': self.niv.id})
+        self.client.get('/api/notes/', {'filiere': self.fil.id, 'niveau': self.niv.id})
+        self.client.get('/nowhere/')
+
+        views = registry.snapshot()
+        self.assertEqual(views['notes_json'].count, 2)
+        self.assertGreaterEqual(views['notes_json'].queries, len(ctx.captured_queries))
+        self.assertGreater(views['notes_json'].sql_seconds, 0)
+        self.assertEqual(sum(views['notes_json'].buckets), 2)
+        self.assertEqual(views['unresolved'].count, 1)
+
+        r = self.client.get('/metrics')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = r.content.decode()
+        self.assertIn('# TYPE notes_request_duration_seconds histogram', body)
+        self.assertIn('notes_request_duration_seconds_count{view="notes_json"} 2', body)
+        self.assertIn('notes_request_duration_seconds_bucket{view="notes_json",le="+Inf"} 2', body)
+        self.assertIn('notes_sql_queries_total{view="notes_json"}', body)
+        self.assertIn('notes_sql_duration_seconds_total{view="notes_json"}', body)
+        self.assertIn('notes_metrics_sample_rate 1.0', body)
+
+    def test_sampling(self):
+        from .metrics import registry
+        self.client.login(username='staff', password='x')
+        with self.settings(METRICS_SAMPLE_RATE=0):
+            self.client.get('/api/notes/')
+        self.assertEqual(registry.snapshot(), {})
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 302)
+        self.client.login(username='prof', password='x')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class SeedBenchmarkTestCase(TestCase):
+    def test_seed_faculty(self):
+        from django.contrib.auth.models import User
+        from django.db.models import F
+        from .models import MoyenneSemestre
+        from .seeding import seed_faculty
+        counts = seed_faculty(departements=2, filieres=2, niveaux=2, ues=4, students=80, instructors=3, seed=1)
+        self.assertEqual(counts['ues'], 2 * 2 * 2 * 4)
+        self.assertEqual(Etudiant.objects.filter(matricule__startswith='SEED').count(), 80)
+        # one note per student and UE of their cohort
+        self.assertEqual(counts['notes'], 80 * 4)
+        self.assertEqual(Note.objects.count(), 80 * 4)
+        self.assertFalse(Note.objects.exclude(ue__filiere=F('etudiant__filiere')).exists())
+        note = Note.objects.select_related('ue').first()
+        final, eliminated = note.final, note.is_eliminated
+        note.compute_final()
+        self.assertEqual((note.final, note.is_eliminated), (final, eliminated))
+        self.assertEqual(MoyenneSemestre.objects.filter(semester=1).count(), 80)
+        self.assertEqual(User.objects.filter(username__startswith='seed_prof').count(), 3)
+
+    def test_seed_data_refuses_existing_prefix(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        call_command('seed_data', students=10, departements=1, filieres=1, niveaux=1, ues=2, instructors=1, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed_data', students=10, stdout=StringIO())
+
+    def test_benchmark_suite_writes_json(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.json')
+            call_command('benchmark_suite', sizes='30,60', repeat=1, output=path, stdout=StringIO())
+            with open(path, encoding='utf-8') as f:
+                results = json.load(f)
+        self.assertEqual([s['students'] for s in results['sizes']], [30, 60])
+        scenarios = results['sizes'][0]['scenarios']
+        self.assertEqual(set(scenarios), {
+            'notes_json', 'notes_json_cursor', 'etudiant_list', 'etudiant_list_sort_note',
+            'moyenne_etudiant_pdf', 'notes_import_excel', 'notes_export_excel', 'notes_export_csv',
+        })
+        self.assertTrue(all(s['status'] == 200 for s in scenarios.values()))
+        self.assertTrue(all(s['bytes'] > 0 for s in scenarios.values()))
+        # cold runs start from empty caches, cached runs reuse the cached pages
+        etudiants = scenarios['etudiant_list']
+        self.assertLess(etudiants['cached']['queries'], etudiants['cold']['queries'])
+        # every dataset is rolled back
+        self.assertFalse(Etudiant.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """Two SQLite files stand in for the primary and a replica (not replicated: each row says where it was read)."""
+
+    @classmethod
+    def setUpClass(cls):
+        import os
+        import tempfile
+        from django.db import connections
+        # registered after the test database setup, which only knows the configured aliases
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        databases = {'default': connections['default'].settings_dict, 'replica': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.tmp.name, 'replica.sqlite3'),
+        }}
+        connections.settings['replica'] = connections.configure_settings(databases)['replica']
+        with connections['replica'].schema_editor() as editor:
+            for model in (Departement, Filiere, Niveau, Etudiant):
+                editor.create_model(model)
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.db import connections
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        from django.test import RequestFactory
+        self.factory = RequestFactory()
+        Etudiant.objects.create(pk=1, nom='Primaire', matricule='A001')
+        Etudiant.objects.using('replica').update_or_create(pk=1, defaults={'nom': 'Replica', 'matricule': 'A001'})
+
+    def call(self, view, method='get', **cookies):
+        from .routers import ReplicaMiddleware
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies)
+        return ReplicaMiddleware(view)(request)
+
+    def read(self, request):
+        from django.http import HttpResponse
+        return HttpResponse(Etudiant.objects.get(pk=1).nom)
+
+    def test_safe_requests_read_from_the_replica(self):
+        from .routers import STICKY_COOKIE
+        r = self.call(self.read)
+        self.assertEqual(r.content, b'Replica')
+        self.assertNotIn(STICKY_COOKIE, r.cookies)
+        # outside of a request everything uses the primary
+        self.assertEqual(Etudiant.objects.get(pk=1).nom, 'Primaire')
+
+    def test_writes_stick_to_the_primary(self):
+        from .routers import STICKY_COOKIE
+        r = self.call(self.read, method='post')
+        self.assertEqual(r.content, b'Primaire')
+        self.assertIn(STICKY_COOKIE, r.cookies)
+        # the client's next reads see its writes
+        self.assertEqual(self.call(self.read, **{STICKY_COOKIE: '1'}).content, b'Primaire')
+
+    def test_reads_after_a_write_use_the_primary(self):
+        from django.http import HttpResponse
+        from .routers import STICKY_COOKIE
+
+        def view(request):
+            etudiant = Etudiant.objects.get(pk=1)
+            etudiant.nom += ' modifié'
+            etudiant.save()
+            return HttpResponse(Etudiant.objects.get(pk=1).nom)
+
+        r = self.call(view)
+        # read from the replica, saved to the primary, then read back from the primary
+        self.assertEqual(r.content, b'Replica modifi\xc3\xa9')
+        self.assertIn(STICKY_COOKIE, r.cookies)
+        self.assertEqual(Etudiant.objects.using('replica').get(pk=1).nom, 'Replica')
+
+    def test_streamed_content_reads_from_the_replica(self):
+        from django.http import StreamingHttpResponse
+
+        def view(request):
+            return StreamingHttpResponse(nom for nom in Etudiant.objects.values_list('nom', flat=True))
+
+        self.assertEqual(b''.join(self.call(view).streaming_content), b'Replica')
+
+    def test_cached_pages_are_built_from_the_primary(self):
+        from django.core.cache import cache
+        from django.http import HttpResponse
+        from .pagecache import cached_page, etudiant_tag, invalidate_pages
+
+        def view(request):
+            nom = cached_page('test', '', [etudiant_tag(1)], lambda: Etudiant.objects.get(pk=1).nom)
+            # the rest of the request still reads from the replica
+            return HttpResponse(f"{nom}/{Etudiant.objects.get(pk=1).nom}")
+
+        cache.clear()
+        self.assertEqual(self.call(view).content, b'Primaire/Replica')
+        Etudiant.objects.filter(pk=1).update(nom='Modifié')
+        invalidate_pages(etudiant_ids=[1])
+        # a lagging replica never ends up in the entry served after the write
+        self.assertEqual(self.call(view, method='post').content, 'Modifié/Modifié'.encode())
+        self.assertEqual(self.call(view).content, 'Modifié/Replica'.encode())
+
+    def test_without_replicas(self):
+        from .routers import STICKY_COOKIE
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.call(self.read).content, b'Primaire')
+            self.assertNotIn(STICKY_COOKIE, self.call(self.read, method='post').cookies)
+
+    def test_replicas_are_not_migrated(self):
+        from .routers import ReplicaRouter
+        self.assertFalse(ReplicaRouter().allow_migrate('replica', 'notes'))
+        self.assertIsNone(ReplicaRouter().allow_migrate('default', 'notes'))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class PageCacheTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        dep = Departement.objects.create(nom='Info')
+        self.fil = Filiere.objects.create(nom='GL', departement=dep)
+        self.niv = Niveau.objects.create(nom='L1')
+        self.niv2 = Niveau.objects.create(nom='L2')
+        self.ue = UE.objects.create(code='UE101', nom='Algo', credit=3, filiere=self.fil, niveau=self.niv)
+        self.alice = Etudiant.objects.create(nom='Alice', matricule='A001', filiere=self.fil, niveau=self.niv)
+        self.bob = Etudiant.objects.create(nom='Bob', matricule='B001', filiere=self.fil, niveau=self.niv2)
+        self.note = Note.objects.create(etudiant=self.alice, ue=self.ue, cc=12, tp=14, sn=10)
+        self.params = {'filiere': self.fil.id, 'niveau': self.niv.id, 'ue': self.ue.id}
+
+    def list_queries(self, params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/etudiants/', params)
+        return r, len(ctx.captured_queries)
+
+    def test_etudiant_list_served_from_cache(self):
+        r, cold = self.list_queries(self.params)
+        self.assertEqual(r.context['rows'][0]['note_final'], self.note.final)
+        # same filters in another order (and an ignored parameter) share the entry
+        r, warm = self.list_queries({'ue': self.ue.id, 'niveau': self.niv.id, 'filiere': self.fil.id, 'utm': 'x'})
+        self.assertEqual(warm, 0)
+        self.assertGreater(cold, warm)
+        self.assertEqual(r.context['rows'][0]['note_final'], self.note.final)
+        self.assertEqual(r.context['students_page'].paginator.count, 1)
+
+    def test_invalidated_by_note_writes_of_the_cohort_only(self):
+        self.list_queries(self.params)
+        self.list_queries({'filiere': self.fil.id, 'niveau': self.niv2.id})
+
+        self.note.sn = 20
+        self.note.save()
+        r, queries = self.list_queries(self.params)
+        self.assertGreater(queries, 0)
+        self.assertEqual(r.context['rows'][0]['note_final'], Note.objects.get(pk=self.note.pk).final)
+        # the other cohort's page is untouched
+        self.assertEqual(self.list_queries({'filiere': self.fil.id, 'niveau': self.niv2.id})[1], 0)
+
+    def test_invalidated_by_bulk_imports(self):
+        from .imports import import_rows
+        self.list_queries(self.params)
+        result = import_rows(self.ue, [(2, ('Alice', 'A001', 20, 20, 20))])
+        self.assertEqual(result['updated'], 1)
+        r, _ = self.list_queries(self.params)
+        self.assertEqual(r.context['rows'][0]['note_final'], 20.0)
+
+    def test_moyenne_page_tags(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def moyenne(etudiant):
+            with CaptureQueriesContext(connection) as ctx:
+                r = self.client.get(f'/moyenne/{etudiant.id}/', {'next': '/etudiants/'})
+            return r, len(ctx.captured_queries)
+
+        moyenne(self.alice)
+        r, queries = moyenne(self.alice)
+        # only the ETag and cohort lookups
+        self.assertLessEqual(queries, 3)
+        self.assertEqual(r.context['next'], '/etudiants/')
+
+        # a weight change of one of her UEs
+        self.ue.cc_weight, self.ue.sn_weight = 40, 30
+        self.ue.save()
+        r, _ = moyenne(self.alice)
+        self.assertEqual(r.context['notes'][0].final, Note.objects.get(pk=self.note.pk).final)
+
+        # renaming a student only drops their own page
+        moyenne(self.bob)
+        self.alice.nom = 'Alicia'
+        self.alice.save()
+        self.assertEqual(moyenne(self.alice)[0].context['etudiant'].nom, 'Alicia')
+        self.assertLessEqual(moyenne(self.bob)[1], 3)
+
+        self.niv.nom = 'L1bis'
+        self.niv.save()
+        self.assertEqual(moyenne(self.alice)[0].context['etudiant'].niveau.nom, 'L1bis')
+        self.assertEqual(self.client.get('/moyenne/999/').status_code, 404)
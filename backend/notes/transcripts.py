@@ -0,0 +1,193 @@
+"""Transcript (relevé de notes) PDF rendering, for one student or a whole cohort.
+
+Rendering works on plain dicts so cohort jobs can fetch everything in a few
+queries and hand the CPU-bound reportlab work to a process pool. Cohorts are
+written to a file object as they are rendered, never held whole in memory.
+"""
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from io import BytesIO
+
+from django.db.models import Sum
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .models import Etudiant, MoyenneSemestre, Note
+
+# transcripts handed to a worker process at a time
+POOL_CHUNK_SIZE = 20
+
+
+def transcript_data(etudiant, notes, moyenne, generated_at=None):
+    """Picklable description of one transcript.
+
+    ``notes`` is an iterable of (ue_nom, ue_code, credit, cc, tp, sn, final, is_eliminated).
+    """
+    return {
+        'nom': etudiant.nom,
+        'matricule': etudiant.matricule,
+        'filiere': etudiant.filiere.nom if etudiant.filiere else '—',
+        'niveau': etudiant.niveau.nom if etudiant.niveau else '—',
+        'notes': [tuple(n) for n in notes],
+        'moyenne': moyenne,
+        'generated_at': generated_at or datetime.now().strftime('%d/%m/%Y à %H:%M'),
+    }
+
+
+def transcript_elements(data):
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        textColor=colors.HexColor('#1f4788'),
+        spaceAfter=6,
+        alignment=TA_CENTER
+    )
+    elements = []
+
+    # Title
+    elements.append(Paragraph(f"Relevé de Notes - {data['nom']}", title_style))
+
+    # Student info
+    info_style = styles['Normal']
+    info_text = f"<b>Matricule:</b> {data['matricule']} | <b>Filière:</b> {data['filiere']} | <b>Niveau:</b> {data['niveau']}"
+    elements.append(Paragraph(info_text, info_style))
+    elements.append(Spacer(1, 12))
+
+    # Notes table
+    table_data = [
+        ['UE', 'Code', 'Crédit', 'CC', 'TP', 'SN', 'Final', 'État'],
+    ]
+    for ue_nom, ue_code, credit, cc, tp, sn, final, is_eliminated in data['notes']:
+        table_data.append([
+            ue_nom,
+            ue_code,
+            str(credit),
+            str(cc) if cc is not None else '—',
+            str(tp) if tp is not None else '—',
+            str(sn) if sn is not None else '—',
+            f"{final:.2f}" if final is not None else '—',
+            'Éliminé' if is_eliminated else 'Valide',
+        ])
+
+    table = Table(table_data, colWidths=[2.2*inch, 0.8*inch, 0.7*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.7*inch, 0.8*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')]),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ]))
+    elements.append(table)
+    elements.append(Spacer(1, 12))
+
+    # Moyenne
+    if data['moyenne'] is not None:
+        moyenne_text = f"<b>Moyenne pondérée:</b> {data['moyenne']:.2f}"
+    else:
+        moyenne_text = "<b>Moyenne pondérée:</b> Non calculable (notes incomplètes)"
+    elements.append(Paragraph(moyenne_text, info_style))
+
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(f"<i>Généré le {data['generated_at']}</i>", info_style))
+    return elements
+
+
+def _build(elements, out):
+    """Write the PDF of ``elements`` to ``out``; returns its page count."""
+    doc = SimpleDocTemplate(out, pagesize=A4, topMargin=20, bottomMargin=20)
+    doc.build(elements)
+    return doc.page
+
+
+def render_transcript(data):
+    """Return (pdf_bytes, page_count) for one transcript."""
+    buffer = BytesIO()
+    pages = _build(transcript_elements(data), buffer)
+    return buffer.getvalue(), pages
+
+
+def _render_chunk(datas):
+    # runs in a worker process: no database access, plain data in and out
+    return [(data['matricule'], *render_transcript(data)) for data in datas]
+
+
+def collect_cohort(filiere_id, niveau_id, semester=None):
+    """Transcript data for every student of a filière/niveau, in three queries."""
+    students = list(
+        Etudiant.objects.filter(filiere_id=filiere_id, niveau_id=niveau_id)
+        .select_related('filiere', 'niveau').order_by('nom', 'id')
+    )
+    ids = [s.id for s in students]
+
+    notes = Note.objects.filter(etudiant_id__in=ids).order_by('ue__code')
+    moyennes = MoyenneSemestre.objects.filter(etudiant_id__in=ids)
+    if semester is not None:
+        notes = notes.filter(ue__semester=semester)
+        moyennes = moyennes.filter(semester=semester)
+    notes_by_student = {}
+    for row in notes.values_list('etudiant_id', 'ue__nom', 'ue__code', 'ue__credit', 'cc', 'tp', 'sn', 'final', 'is_eliminated'):
+        notes_by_student.setdefault(row[0], []).append(row[1:])
+    averages = {}
+    for etudiant_id, weighted, counted in moyennes.values('etudiant_id').annotate(w=Sum('weighted_sum'), c=Sum('credits')).values_list('etudiant_id', 'w', 'c'):
+        averages[etudiant_id] = round(weighted / counted, 2) if counted else None
+
+    generated_at = datetime.now().strftime('%d/%m/%Y à %H:%M')
+    return [
+        transcript_data(s, notes_by_student.get(s.id, []), averages.get(s.id), generated_at)
+        for s in students
+    ]
+
+
+def render_cohort(datas, out, output='zip', workers=None):
+    """Write a cohort to the binary file ``out`` as a ZIP of PDFs or one concatenated PDF.
+
+    ZIP transcripts are rendered on a process pool of ``workers`` (one per CPU
+    by default, 1 renders in this process). Returns stats reporting
+    transcripts, pages, seconds and pages_per_second so batch jobs can be sized.
+    """
+    started = time.perf_counter()
+    pages = 0
+    if output == 'pdf':
+        # reportlab cannot merge finished PDFs: lay every transcript out in one document
+        elements = []
+        for i, data in enumerate(datas):
+            if i:
+                elements.append(PageBreak())
+            elements.extend(transcript_elements(data))
+        if datas:
+            pages = _build(elements, out)
+    else:
+        chunks = [datas[i:i + POOL_CHUNK_SIZE] for i in range(0, len(datas), POOL_CHUNK_SIZE)]
+        with ExitStack() as stack:
+            if workers == 1 or len(chunks) <= 1:
+                rendered = map(_render_chunk, chunks)
+            else:
+                rendered = stack.enter_context(ProcessPoolExecutor(max_workers=workers)).map(_render_chunk, chunks)
+            with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for chunk in rendered:
+                    for matricule, pdf, page_count in chunk:
+                        archive.writestr(f"releve_notes_{matricule}.pdf", pdf)
+                        pages += page_count
+
+    seconds = time.perf_counter() - started
+    stats = {
+        'transcripts': len(datas),
+        'pages': pages,
+        'seconds': round(seconds, 3),
+        'pages_per_second': round(pages / seconds, 1) if seconds > 0 else None,
+    }
+    return stats
@@ -10,14 +10,24 @@ urlpatterns = [
     path('tableau/', views.tableau_notes, name='tableau_notes'),
     path('api/notes/', views.notes_json, name='notes_json'),
     # cascade filter endpoints
+    path('api/hierarchy/', views.hierarchy_json, name='hierarchy_json'),
     path('api/filieres/', views.filieres_json, name='filieres_json'),
     path('api/niveaux/', views.niveaux_json, name='niveaux_json'),
     path('api/ues/', views.ues_json, name='ues_json'),
+    path('api/ues/<int:ue_id>/stats/', views.ue_stats_json, name='ue_stats'),
+    path('api/classement/', views.classement_json, name='classement_json'),
+    path('api/deliberation/', views.deliberation_json, name='deliberation_json'),
+    path('api/deliberation/export/', views.deliberation_export, name='deliberation_export'),
     path('api/etudiant_ues/', views.etudiant_ues_json, name='etudiant_ues_json'),
     path('api/note/<int:note_id>/update/', views.note_update, name='note_update'),
     path('api/note/create/', views.note_create, name='note_create'),
+    path('api/notes/batch/', views.notes_batch, name='notes_batch'),
     path('api/notes/import/', views.notes_import_excel, name='notes_import_excel'),
+    path('api/notes/import/csv/', views.notes_import_csv, name='notes_import_csv'),
+    path('api/notes/import/<int:job_id>/', views.notes_import_status, name='notes_import_status'),
     path('api/notes/export/', views.notes_export_excel, name='notes_export_excel'),
+    path('api/notes/export/csv/', views.notes_export_csv, name='notes_export_csv'),
+    path('api/notes/export/ndjson/', views.notes_export_ndjson, name='notes_export_ndjson'),
 
     # enseignants
     path('enseignants/', views.enseignants_list, name='enseignants_list'),
@@ -28,5 +38,8 @@ urlpatterns = [
 
     path('moyenne/<int:etudiant_id>/', views.moyenne_etudiant, name='moyenne'),
     path('moyenne/<int:etudiant_id>/export/', views.moyenne_etudiant_pdf, name='moyenne_pdf'),
+    path('classement/', views.classement, name='classement'),
+    path('releves/', views.transcripts_bulk, name='transcripts_bulk'),
+    path('metrics', views.metrics, name='metrics'),
 ]
 
@@ -1,76 +1,155 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponseBadRequest, HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponseForbidden, JsonResponse, HttpResponseBadRequest, HttpResponse, StreamingHttpResponse, FileResponse
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.cache import cache_control
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from io import BytesIO
-from openpyxl import load_workbook
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from datetime import datetime
-
-from .models import Etudiant, Note, UE, Departement, Filiere, Niveau
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Etudiant, Note, UE, GradeVersion, MoyenneSemestre, ImportJob
 from .forms import EtudiantForm, TeacherCreationForm
+from .pagination import InvalidCursor, cached_count, decode_cursor, keyset_page
+from .permissions import invalidate_managed_ues, managed_ue_ids, manages_all_ues, user_manages_ue
+from .signals import sync_after_bulk_write
+from .rankings import RANKING_FIELDS, cohort_ranking
+from .stats import ue_stats
+from .dashboard import dashboard_stats
+from .hierarchy import get_hierarchy
+from .deliberation import REPORT_HEADERS, cohort_deliberation, report_rows
+from .imports import export_rows, import_sheet, iter_csv, write_xlsx
+from .jobs import enqueue_import, rows_processed
+from .transcripts import collect_cohort, render_cohort, render_transcript, transcript_data
+from .metrics import registry as metrics_registry
+from .pagecache import cached_page, cohort_tag, etudiant_tag, normalize_query, ue_tag
+import hashlib
+import tempfile
 import json
 
+# rows (students) per chunk when streaming an export; bounds memory whatever the cohort size
+EXPORT_CHUNK_SIZE = 500
+# largest page_size accepted by the ranking pages
+MAX_PAGE_SIZE = 200
+
+
+# ---------- Conditional GET (ETag) helpers ----------
+def grade_etag(request, version):
+    """Strong ETag for a grade read: cohort version + viewer + exact URL."""
+    user = request.user
+    raw = '|'.join(str(p) for p in (version, user.pk, user.is_staff, user.is_superuser, request.get_full_path()))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def notes_json_etag(request):
+    versions = GradeVersion.objects.all()
+    for name, lookup in (('departement', 'filiere__departement_id'), ('filiere', 'filiere_id'), ('niveau', 'niveau_id')):
+        if request.GET.get(name):
+            value = _int_param(request, name)
+            if value is None:
+                # no ETag, the view rejects the request
+                return None
+            versions = versions.filter(**{lookup: value})
+    version = versions.aggregate(total=Sum('version'))['total'] or 0
+    return grade_etag(request, version)
+
+
+def etudiant_etag(request, etudiant_id):
+    cohort = Etudiant.objects.filter(pk=etudiant_id).values_list('filiere_id', 'niveau_id').first()
+    if cohort is None:
+        return None
+    return grade_etag(request, GradeVersion.current(*cohort))
+
+
+def ue_etag(request, ue_id):
+    cohort = UE.objects.filter(pk=ue_id).values_list('filiere_id', 'niveau_id').first()
+    if cohort is None:
+        return None
+    return grade_etag(request, GradeVersion.current(*cohort))
+
 
 def home(request):
     """Homepage with quick stats and recent notes."""
-    stats = {
-        'departements': Departement.objects.count(),
-        'filieres': Filiere.objects.count(),
-        'niveaux': Niveau.objects.count(),
-        'ues': UE.objects.count(),
-        'etudiants': Etudiant.objects.count(),
-    }
+    stats = dashboard_stats()
     recent_notes = Note.objects.select_related('etudiant', 'ue').order_by('-id')[:5]
     return render(request, 'pages/home_adminlte.html', {'stats': stats, 'recent_notes': recent_notes})
 
 
-from django.core.paginator import Paginator, EmptyPage
-from django.db.models import OuterRef, Subquery, Value, FloatField, ExpressionWrapper, F
-from django.db.models.functions import Coalesce
+from django.core.paginator import Paginator, EmptyPage, Page
+from django.db.models import F, FilteredRelation, Q
+
+
+def _pick(items, raw_id):
+    """The node of ``items`` whose id is ``raw_id``, else the first one (or None)."""
+    if raw_id:
+        for item in items:
+            if str(item['id']) == raw_id:
+                return item
+    return items[0] if items else None
+
+
+def _etudiant_list_data(filiere_id, niveau_id, semester, ue_selected, sort, page, page_size, cursor_mode, cursor):
+    """One page of a cohort's students, with their final in ``ue_selected`` and semester average, as cacheable data."""
+    students_qs = Etudiant.objects.filter(filiere_id=filiere_id, niveau_id=niveau_id)
+
+    # if sorting by note and a UE is selected, join each student's note for that UE
+    # and sort on its stored final (missing or eliminated notes last)
+    if sort == 'note' and ue_selected:
+        students_qs = students_qs.annotate(
+            ue_note=FilteredRelation('note', condition=Q(note__ue_id=ue_selected['id'])),
+        ).order_by(F('ue_note__final').desc(nulls_last=True), 'nom')
+    elif sort == 'moyenne':
+        # materialized semester average, students without grades last
+        students_qs = students_qs.annotate(
+            sem_moyenne=FilteredRelation('moyennes', condition=Q(moyennes__semester=semester)),
+        ).order_by(F('sem_moyenne__moyenne').desc(nulls_last=True), 'nom')
+    elif sort == 'note':
+        students_qs = students_qs.order_by('nom')
+    else:
+        # regular ordering by field
+        students_qs = students_qs.order_by(sort)
+
+    number, next_cursor, prev_cursor = 1, None, None
+    if cursor_mode:
+        page_students, next_cursor, prev_cursor = keyset_page(students_qs, page_size, cursor)
+        total = cached_count(students_qs, ('etudiants', filiere_id, niveau_id))
+    else:
+        paginator = Paginator(students_qs, page_size)
+        try:
+            students_page = paginator.page(page)
+        except EmptyPage:
+            students_page = paginator.page(paginator.num_pages)
+        page_students = list(students_page.object_list)
+        number, total = students_page.number, paginator.count
+
+    # finals in the selected UE and semester averages of the page's students
+    finals = {}
+    if ue_selected:
+        finals = dict(
+            Note.objects.filter(ue_id=ue_selected['id'], etudiant__in=page_students, final__isnull=False).values_list('etudiant_id', 'final')
+        )
+    moyennes = dict(
+        MoyenneSemestre.objects.filter(etudiant__in=page_students, semester=semester).values_list('etudiant_id', 'moyenne')
+    )
+    return {
+        'students': page_students, 'number': number, 'total': total,
+        'next_cursor': next_cursor, 'prev_cursor': prev_cursor, 'finals': finals, 'moyennes': moyennes,
+    }
 
 
 def etudiant_list(request):
-    # Cascade filters: departement -> filiere -> niveau -> optional ue
-    deps = Departement.objects.order_by('id')
-    dep_id = request.GET.get('departement')
-    dep = None
-    if dep_id:
-        try:
-            dep = Departement.objects.get(pk=dep_id)
-        except Departement.DoesNotExist:
-            dep = deps.first()
-    else:
-        dep = deps.first()
+    # Cascade filters: departement -> filiere -> niveau -> optional ue, from the cached tree
+    hierarchy = get_hierarchy()
+    deps = hierarchy.departements
+    dep = _pick(deps, request.GET.get('departement'))
 
-    filieres = Filiere.objects.filter(departement=dep).order_by('id') if dep else Filiere.objects.order_by('id')
-    fil_id = request.GET.get('filiere')
-    fil = None
-    if fil_id:
-        fil = filieres.filter(pk=fil_id).first() or filieres.first()
-    else:
-        fil = filieres.first()
+    filieres = dep['filieres'] if dep else hierarchy.filieres()
+    fil = _pick(filieres, request.GET.get('filiere'))
 
     # choose niveaux relevant to the filiere when possible (students attached to filiere)
-    if fil:
-        niveaux_qs = Niveau.objects.filter(etudiant__filiere=fil).distinct().order_by('id')
-    else:
-        niveaux_qs = Niveau.objects.order_by('id')
-    niv_id = request.GET.get('niveau')
-    niv = None
-    if niv_id:
-        niv = niveaux_qs.filter(pk=niv_id).first() or niveaux_qs.first()
-    else:
-        niv = niveaux_qs.first()
+    niveaux_qs = hierarchy.filiere_niveaux(fil['id']) if fil else hierarchy.niveaux
+    niv = _pick(niveaux_qs, request.GET.get('niveau'))
 
     # Semester filter (1 or 2)
     semester = request.GET.get('semester', 1)
@@ -82,63 +161,62 @@ def etudiant_list(request):
         semester = 1
 
     # UEs within filiere+niveau+semester (for optional column)
-    ues = UE.objects.filter(filiere=fil, niveau=niv, semester=semester).order_by('code') if fil and niv else UE.objects.none()
+    ues = hierarchy.ues(fil['id'], niv['id'], semester) if fil and niv else []
     ue_id = request.GET.get('ue')
     ue_selected = None
     if ue_id:
-        ue_selected = ues.filter(pk=ue_id).first()
+        ue_selected = next((u for u in ues if str(u['id']) == ue_id), None)
 
-    # student queryset limited by filiere + niveau to avoid loading entire DB
-    students_qs = Etudiant.objects.none()
-    if fil and niv:
-        sort = request.GET.get('sort', 'nom')
-        # allow 'note' sorting only when UE selected
-        if sort not in ('nom', 'matricule', 'note'):
-            sort = 'nom'
-        students_qs = Etudiant.objects.filter(filiere=fil, niveau=niv)
-
-        # if sorting by note and a UE is selected, annotate each student with the UE final and sort by it
-        if sort == 'note' and ue_selected:
-            # compute final = cc * cc_weight/100 + tp * tp_weight/100 + sn * sn_weight/100
-            final_expr = ExpressionWrapper(
-                F('cc') * ue_selected.cc_weight / 100.0 +
-                F('tp') * ue_selected.tp_weight / 100.0 +
-                F('sn') * ue_selected.sn_weight / 100.0,
-                output_field=FloatField()
-            )
-            note_subq = Note.objects.filter(etudiant=OuterRef('pk'), ue=ue_selected).annotate(final_calc=final_expr).values('final_calc')[:1]
-            students_qs = students_qs.annotate(note_final=Coalesce(Subquery(note_subq, output_field=FloatField()), Value(-1.0))).order_by('-note_final', 'nom')
-        else:
-            # regular ordering by field
-            students_qs = students_qs.order_by(sort)
-
-    # pagination (default page_size 20)
+    sort = request.GET.get('sort', 'nom')
+    # allow 'note' sorting only when UE selected
+    if sort not in ('nom', 'matricule', 'note', 'moyenne'):
+        sort = 'nom'
+
+    # pagination (default page_size 20); cursor mode seeks on (nom, id) and
+    # is only available for the default name ordering
     page = int(request.GET.get('page', 1))
     page_size = int(request.GET.get('page_size', 20))
-    paginator = Paginator(students_qs, page_size)
-    try:
-        students_page = paginator.page(page)
-    except EmptyPage:
-        students_page = paginator.page(paginator.num_pages) if paginator.num_pages else []
-
-    total_students = students_qs.count()
+    cursor_mode = request.GET.get('pagination') == 'cursor' and request.GET.get('sort', 'nom') == 'nom'
+    cursor = None
+    if cursor_mode:
+        try:
+            cursor = decode_cursor(request.GET.get('cursor'))
+        except InvalidCursor:
+            cursor = None
 
-    # if UE selected, fetch notes for the students on that page
-    notes_map = {}
-    if ue_selected:
-        notes = Note.objects.filter(ue=ue_selected, etudiant__in=students_page.object_list).select_related('etudiant')
-        notes_map = {n.etudiant_id: n for n in notes}
+    # the page's rows are cached per resolved filters until the cohort or UE changes
+    data = {'students': [], 'number': 1, 'total': 0, 'next_cursor': None, 'prev_cursor': None, 'finals': {}, 'moyennes': {}}
+    if fil and niv:
+        query = normalize_query({
+            'filiere': fil['id'], 'niveau': niv['id'], 'semester': semester, 'ue': ue_selected['id'] if ue_selected else None,
+            'sort': sort, 'page_size': page_size, 'page': None if cursor_mode else page,
+            'pagination': 'cursor' if cursor_mode else None, 'cursor': request.GET.get('cursor') if cursor else None,
+        })
+        tags = [cohort_tag(fil['id'], niv['id'])] + ([ue_tag(ue_selected['id'])] if ue_selected else [])
+        data = cached_page('etudiant_list', query, tags, lambda: _etudiant_list_data(
+            fil['id'], niv['id'], semester, ue_selected, sort, page, page_size, cursor_mode, cursor,
+        ))
+
+    page_students = data['students']
+    next_cursor, prev_cursor = data['next_cursor'], data['prev_cursor']
+    total_students = data['total']
+    if cursor_mode:
+        students_page = page_students
+    else:
+        # the template's pager only needs the total, not the queryset
+        students_page = Page(page_students, data['number'], Paginator(range(total_students), page_size))
 
     # assemble rows so template lookup is straightforward
-    rows = []
-    for s in students_page.object_list:
-        n = notes_map.get(s.id)
-        rows.append({'etudiant': s, 'note_final': (n.final if n and n.final is not None else None)})
+    rows = [
+        {'etudiant': s, 'note_final': data['finals'].get(s.id), 'moyenne': data['moyennes'].get(s.id)}
+        for s in page_students
+    ]
 
-    # build base query for pagination links (preserve filters but not 'page')
+    # build base query for pagination links (preserve filters but not 'page'/'cursor')
     base_qs = request.GET.copy()
-    if 'page' in base_qs:
-        base_qs.pop('page')
+    for key in ('page', 'cursor'):
+        if key in base_qs:
+            base_qs.pop(key)
     base_query = base_qs.urlencode()
 
     context = {
@@ -146,16 +224,19 @@ def etudiant_list(request):
         'filieres': filieres,
         'niveaux': niveaux_qs,
         'ues': ues,
-        'selected_departement': getattr(dep, 'id', None),
-        'selected_filiere': getattr(fil, 'id', None),
-        'selected_niveau': getattr(niv, 'id', None),
+        'selected_departement': dep['id'] if dep else None,
+        'selected_filiere': fil['id'] if fil else None,
+        'selected_niveau': niv['id'] if niv else None,
         'selected_semester': semester,
-        'selected_ue': getattr(ue_selected, 'id', None),
+        'selected_ue': ue_selected['id'] if ue_selected else None,
         'students_page': students_page,
         'rows': rows,
         'page': page,
         'page_size': page_size,
         'total_students': total_students,
+        'cursor_mode': cursor_mode,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
         'base_query': base_query,
         'sort': request.GET.get('sort', 'nom'),
         'current_path': request.get_full_path(),
@@ -163,6 +244,144 @@ def etudiant_list(request):
     return render(request, 'pages/etudiants_list_adminlte.html', context)
 
 
+# ---------- Classement (cohort rankings) ----------
+def _ranking_page(request, filiere_id, niveau_id):
+    """Ranked rows of the requested cohort/semester/UE, paginated; None when ``ue`` is not an id."""
+    try:
+        semester = int(request.GET.get('semester', 1))
+    except (ValueError, TypeError):
+        semester = 1
+    if semester not in (1, 2):
+        semester = 1
+    ue = None
+    if request.GET.get('ue'):
+        ue_id = _int_param(request, 'ue')
+        if ue_id is None:
+            return None
+        ue = UE.objects.filter(pk=ue_id, filiere_id=filiere_id, niveau_id=niveau_id).first()
+        if ue:
+            semester = ue.semester
+
+    rows = cohort_ranking(filiere_id, niveau_id, semester, ue)
+    page_size = _int_param(request, 'page_size')
+    page_size = 50 if page_size is None else min(max(page_size, 1), MAX_PAGE_SIZE)
+    paginator = Paginator(rows, page_size)
+    page = paginator.get_page(request.GET.get('page', 1))
+    return semester, ue, page
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=notes_json_etag)
+def classement_json(request):
+    """Ranking of a filière/niveau by UE final (?ue=) or by semester average, paginated."""
+    fil_id = _int_param(request, 'filiere')
+    niv_id = _int_param(request, 'niveau')
+    if fil_id is None or niv_id is None:
+        return HttpResponseBadRequest('filiere and niveau required')
+    ranking = _ranking_page(request, fil_id, niv_id)
+    if ranking is None:
+        return HttpResponseBadRequest('Invalid ue')
+    semester, ue, page = ranking
+    return JsonResponse({
+        'by': 'ue' if ue else 'moyenne',
+        'ue_id': getattr(ue, 'id', None),
+        'semester': semester,
+        'total': page.paginator.count,
+        'page': page.number,
+        'num_pages': page.paginator.num_pages,
+        'results': [dict(zip(RANKING_FIELDS, row)) for row in page.object_list],
+    })
+
+
+@login_required
+def classement(request):
+    hierarchy = get_hierarchy()
+    filieres = hierarchy.filieres()
+    fil = _pick(filieres, request.GET.get('filiere'))
+    niveaux = hierarchy.filiere_niveaux(fil['id']) if fil else []
+    niv = _pick(niveaux, request.GET.get('niveau'))
+
+    semester, ue, page = 1, None, None
+    ues = []
+    if fil and niv:
+        ranking = _ranking_page(request, fil['id'], niv['id'])
+        if ranking is None:
+            return HttpResponseBadRequest('Invalid ue')
+        semester, ue, page = ranking
+        ues = hierarchy.ues(fil['id'], niv['id'], semester)
+
+    base_qs = request.GET.copy()
+    base_qs.pop('page', None)
+    context = {
+        'filieres': filieres,
+        'niveaux': niveaux,
+        'ues': ues,
+        'selected_filiere': fil['id'] if fil else None,
+        'selected_niveau': niv['id'] if niv else None,
+        'selected_semester': semester,
+        'selected_ue': ue,
+        'ranking_page': page,
+        'rows': [dict(zip(RANKING_FIELDS, row)) for row in page.object_list] if page else [],
+        'base_query': base_qs.urlencode(),
+    }
+    return render(request, 'pages/classement_adminlte.html', context)
+
+
+# ---------- Délibération (semester jury results) ----------
+def _deliberation_params(request):
+    fil_id = _int_param(request, 'filiere')
+    niv_id = _int_param(request, 'niveau')
+    if fil_id is None or niv_id is None:
+        return None
+    try:
+        semester = int(request.GET.get('semester', 1))
+    except (ValueError, TypeError):
+        semester = 1
+    return fil_id, niv_id, semester if semester in (1, 2) else 1
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=notes_json_etag)
+def deliberation_json(request):
+    """Credits earned, validated/eliminated UEs and decision of every student of a cohort."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    params = _deliberation_params(request)
+    if params is None:
+        return HttpResponseBadRequest('filiere and niveau required')
+    return JsonResponse(cohort_deliberation(*params))
+
+
+@login_required
+def deliberation_export(request):
+    """Deliberation report of a cohort as CSV (default) or xlsx (?format=xlsx)."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    params = _deliberation_params(request)
+    if params is None:
+        return HttpResponseBadRequest('filiere and niveau required')
+    fil_id, niv_id, semester = params
+    result = cohort_deliberation(fil_id, niv_id, semester)
+    filename = f"deliberation_{fil_id}_{niv_id}_S{semester}"
+    widths = (25, 15, 10, 14, 10, 40, 40, 22)
+
+    if request.GET.get('format') == 'xlsx':
+        output = tempfile.TemporaryFile()
+        write_xlsx(report_rows(result), output, headers=REPORT_HEADERS, widths=widths, title='Délibération')
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f'{filename}.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    response = StreamingHttpResponse(iter_csv(report_rows(result), headers=REPORT_HEADERS), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
 @login_required
 def etudiant_create(request):
     if not request.user.is_staff:
@@ -177,117 +396,86 @@ def etudiant_create(request):
     return render(request, 'pages/etudiant_form_adminlte.html', {'form': form})
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etudiant_etag)
 def moyenne_etudiant(request, etudiant_id):
-    etudiant = get_object_or_404(Etudiant, id=etudiant_id)
-    notes = Note.objects.filter(etudiant=etudiant).select_related('ue')
-
-    # compute final per UE and weighted moyenne by UE.credit (ignore UEs with missing final)
-    notes_with_final = [n for n in notes if n.final is not None]
-    moyenne = None
-    if notes_with_final:
-        sum_weighted = sum(n.final * n.ue.credit for n in notes_with_final)
-        sum_credits = sum(n.ue.credit for n in notes_with_final)
-        if sum_credits > 0:
-            moyenne = round(sum_weighted / sum_credits, 2)
+    cohort = Etudiant.objects.filter(pk=etudiant_id).values_list('filiere_id', 'niveau_id').first()
+    if cohort is None:
+        raise Http404
+    # UE changes invalidate the cohorts of the students graded in them, hence the cohort tag
+    data = cached_page(
+        'moyenne_etudiant', normalize_query({'etudiant': etudiant_id}),
+        [etudiant_tag(etudiant_id), cohort_tag(*cohort)], lambda: _moyenne_data(etudiant_id),
+    )
 
     # preserve optional 'next' param so template can return to filtered list
-    return render(request, 'pages/moyenne_adminlte.html', {'etudiant': etudiant, 'notes': notes, 'average': moyenne, 'next': request.GET.get('next', '/')})
+    return render(request, 'pages/moyenne_adminlte.html', {**data, 'next': request.GET.get('next', '/')})
+
 
+def _moyenne_data(etudiant_id):
+    etudiant = Etudiant.objects.select_related('filiere', 'niveau').get(pk=etudiant_id)
+    notes = list(Note.objects.filter(etudiant=etudiant).select_related('ue'))
+    # weighted moyenne by UE.credit (UEs with missing final ignored), read from the materialized table
+    return {'etudiant': etudiant, 'notes': notes, 'average': MoyenneSemestre.overall(etudiant_id)}
 
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etudiant_etag)
 def moyenne_etudiant_pdf(request, etudiant_id):
     """Export student notes transcript as PDF."""
     etudiant = get_object_or_404(Etudiant, id=etudiant_id)
     notes = Note.objects.filter(etudiant=etudiant).select_related('ue').order_by('ue__code')
 
-    # compute final per UE and weighted moyenne
-    notes_with_final = [n for n in notes if n.final is not None]
-    moyenne = None
-    if notes_with_final:
-        sum_weighted = sum(n.final * n.ue.credit for n in notes_with_final)
-        sum_credits = sum(n.ue.credit for n in notes_with_final)
-        if sum_credits > 0:
-            moyenne = round(sum_weighted / sum_credits, 2)
-
-    # Create PDF content
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=20, bottomMargin=20)
-    elements = []
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#1f4788'),
-        spaceAfter=6,
-        alignment=TA_CENTER
-    )
-    
-    # Title
-    title = Paragraph(f"Relevé de Notes - {etudiant.nom}", title_style)
-    elements.append(title)
-    
-    # Student info
-    info_style = styles['Normal']
-    info_text = f"<b>Matricule:</b> {etudiant.matricule} | <b>Filière:</b> {etudiant.filiere.nom} | <b>Niveau:</b> {etudiant.niveau.nom}"
-    elements.append(Paragraph(info_text, info_style))
-    elements.append(Spacer(1, 12))
-    
-    # Notes table
-    table_data = [
-        ['UE', 'Code', 'Crédit', 'CC', 'TP', 'SN', 'Final', 'État'],
-    ]
-    
-    for note in notes:
-        table_data.append([
-            note.ue.nom,
-            note.ue.code,
-            str(note.ue.credit),
-            str(note.cc) if note.cc is not None else '—',
-            str(note.tp) if note.tp is not None else '—',
-            str(note.sn) if note.sn is not None else '—',
-            f"{note.final:.2f}" if note.final is not None else '—',
-            'Éliminé' if note.is_eliminated else 'Valide',
-        ])
-    
-    table = Table(table_data, colWidths=[2.2*inch, 0.8*inch, 0.7*inch, 0.6*inch, 0.6*inch, 0.6*inch, 0.7*inch, 0.8*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')]),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-    ]))
-    
-    elements.append(table)
-    elements.append(Spacer(1, 12))
-    
-    # Moyenne
-    if moyenne is not None:
-        moyenne_text = f"<b>Moyenne pondérée:</b> {moyenne:.2f}"
-    else:
-        moyenne_text = "<b>Moyenne pondérée:</b> Non calculable (notes incomplètes)"
-    elements.append(Paragraph(moyenne_text, info_style))
-    
-    elements.append(Spacer(1, 12))
-    date_text = f"<i>Généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}</i>"
-    elements.append(Paragraph(date_text, info_style))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
+    # weighted moyenne, read from the materialized table
+    moyenne = MoyenneSemestre.overall(etudiant.id)
+
+    data = transcript_data(etudiant, [
+        (n.ue.nom, n.ue.code, n.ue.credit, n.cc, n.tp, n.sn, n.final, n.is_eliminated) for n in notes
+    ], moyenne)
+    pdf, _ = render_transcript(data)
+
     # Return as attachment
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="releve_notes_{etudiant.matricule}.pdf"'
     return response
 
 
+@login_required
+def transcripts_bulk(request):
+    """Every transcript of a filière/niveau (optionally one semester) as a ZIP or a single PDF."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    fil_id = _int_param(request, 'filiere')
+    niv_id = _int_param(request, 'niveau')
+    if fil_id is None or niv_id is None:
+        return HttpResponseBadRequest('filiere and niveau required')
+    semester = request.GET.get('semester')
+    if semester not in (None, '', '1', '2'):
+        return HttpResponseBadRequest('semester must be 1 or 2')
+    output = request.GET.get('output', 'zip')
+    if output not in ('zip', 'pdf'):
+        return HttpResponseBadRequest('output must be zip or pdf')
+
+    datas = collect_cohort(fil_id, niv_id, int(semester) if semester else None)
+    # rendered in this worker, without a process pool, and spooled to disk rather than
+    # held in memory; generate_transcripts renders large cohorts on a pool
+    spool = tempfile.TemporaryFile()
+    stats = render_cohort(datas, spool, output=output, workers=1)
+    spool.seek(0)
+
+    suffix = f"_S{semester}" if semester else ''
+    response = FileResponse(
+        spool,
+        as_attachment=True,
+        filename=f'releves_{fil_id}_{niv_id}{suffix}.{output}',
+        content_type='application/pdf' if output == 'pdf' else 'application/zip',
+    )
+    response['X-Transcripts'] = str(stats['transcripts'])
+    response['X-Pages'] = str(stats['pages'])
+    response['X-Pages-Per-Second'] = str(stats['pages_per_second'])
+    return response
+
+
 def logout_view(request):
     """Log out the user and redirect to students list with a message."""
     if request.user.is_authenticated:
@@ -301,13 +489,28 @@ def logout_view(request):
 def tableau_notes(request):
     if not request.user.is_staff:
         return HttpResponseForbidden()
-    deps = Departement.objects.all()
-    filieres = Filiere.objects.all()
-    niveaux = Niveau.objects.all()
-    return render(request, 'pages/tableau_notes_adminlte.html', {'departements': deps, 'filieres': filieres, 'niveaux': niveaux})
+    hierarchy = get_hierarchy()
+    return render(request, 'pages/tableau_notes_adminlte.html', {
+        'departements': hierarchy.departements,
+        'filieres': hierarchy.filieres(),
+        'niveaux': hierarchy.niveaux,
+    })
+
+
+# columns available in the columnar grid format, mapped to the Note attribute
+COLUMNAR_FIELDS = {
+    'cc': 'cc',
+    'tp': 'tp',
+    'sn': 'sn',
+    'final': 'final',
+    'is_eliminated': 'is_eliminated',
+    'note_id': 'id',
+}
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=notes_json_etag)
 def notes_json(request):
     # returns UEs and students with notes according to filters, with optional pagination
     dep_id = request.GET.get('departement')
@@ -316,6 +519,19 @@ def notes_json(request):
 
     page = int(request.GET.get('page', 1))
     page_size = int(request.GET.get('page_size', 25))
+    cursor_mode = request.GET.get('pagination') == 'cursor'
+    try:
+        cursor = decode_cursor(request.GET.get('cursor')) if cursor_mode else None
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+
+    columnar = request.GET.get('format') == 'columnar'
+    fields = list(COLUMNAR_FIELDS)
+    if columnar and request.GET.get('fields'):
+        fields = [f for f in request.GET['fields'].split(',') if f]
+        unknown = [f for f in fields if f not in COLUMNAR_FIELDS]
+        if unknown:
+            return HttpResponseBadRequest(f"Unknown fields: {', '.join(unknown)}")
 
     ues_qs = UE.objects.all()
     if dep_id:
@@ -325,14 +541,15 @@ def notes_json(request):
     if niv_id:
         ues_qs = ues_qs.filter(niveau_id=niv_id)
 
-    # helper to check management rights
-    def user_manages_ue(user, ue):
-        return user.is_superuser or user.is_staff or ue.instructors.filter(pk=user.pk).exists() or (hasattr(user, 'ues') and user.ues.filter(pk=ue.pk).exists())
+    # managed UE ids for the current user, resolved once instead of per UE
+    manages_all = manages_all_ues(request.user)
+    managed = frozenset() if manages_all else managed_ue_ids(request)
 
     # mark UEs editable for the current user
+    ues = list(ues_qs.order_by('code'))
     ues_list = []
-    for u in ues_qs.order_by('code'):
-        can_edit = user_manages_ue(request.user, u)
+    for u in ues:
+        can_edit = manages_all or u.id in managed
         ues_list.append({'id': u.id, 'code': u.code, 'nom': u.nom, 'credit': u.credit, 'editable': can_edit})
 
     students_qs = Etudiant.objects.all()
@@ -343,37 +560,77 @@ def notes_json(request):
     if niv_id:
         students_qs = students_qs.filter(niveau_id=niv_id)
 
-    total_students = students_qs.count()
-    # ordering by nom
-    students_qs = students_qs.order_by('nom')
-
-    # pagination
-    start = (page - 1) * page_size
-    end = start + page_size
-    students_page = students_qs[start:end]
-
-    students = []
-    u_ids = [u['id'] for u in ues_list]
-    for s in students_page:
-        row = {'id': s.id, 'nom': s.nom, 'matricule': s.matricule, 'notes': {}}
-        notes = Note.objects.filter(etudiant=s, ue__in=u_ids).select_related('ue')
-        notes_map = {n.ue.id: n for n in notes}
-        for u in ues_list:
-            n = notes_map.get(u['id'])
-            if n:
-                row['notes'][str(u['id'])] = {
-                    'cc': n.cc,
-                    'tp': n.tp,
-                    'sn': n.sn,
-                    'final': n.final,
-                    'is_eliminated': n.is_eliminated,
-                    'note_id': n.id,
-                }
-            else:
-                row['notes'][str(u['id'])] = None
-        students.append(row)
+    if cursor_mode:
+        # keyset pagination on (nom, id); the total is opt-in and cached
+        students_page, next_cursor, prev_cursor = keyset_page(students_qs, page_size, cursor)
+        total_students = cached_count(students_qs, ('notes_json', dep_id, fil_id, niv_id)) if request.GET.get('count') else None
+    else:
+        total_students = students_qs.count()
+        # ordering by nom
+        students_qs = students_qs.order_by('nom', 'id')
 
-    return JsonResponse({'ues': ues_list, 'students': students, 'page': page, 'page_size': page_size, 'total_students': total_students})
+        # pagination
+        start = (page - 1) * page_size
+        end = start + page_size
+        students_page = list(students_qs[start:end])
+
+    # fetch the whole page x UE matrix in one query
+    notes_map = {}
+    if students_page and ues:
+        page_notes = Note.objects.filter(etudiant__in=[s.id for s in students_page], ue__in=[u.id for u in ues])
+        for n in page_notes:
+            notes_map[(n.etudiant_id, n.ue_id)] = n
+
+    if columnar:
+        # parallel arrays: one entry per student, and one entry per existing
+        # note in row-major (student, then UE) order; empty cells are omitted
+        students = {
+            'id': [s.id for s in students_page],
+            'nom': [s.nom for s in students_page],
+            'matricule': [s.matricule for s in students_page],
+        }
+        cells = {'etudiant_id': [], 'ue_id': []}
+        columns = [(cells.setdefault(f, []), COLUMNAR_FIELDS[f]) for f in fields]
+        for s in students_page:
+            for u in ues:
+                n = notes_map.get((s.id, u.id))
+                if n is None:
+                    continue
+                cells['etudiant_id'].append(s.id)
+                cells['ue_id'].append(u.id)
+                for column, attr in columns:
+                    column.append(getattr(n, attr))
+    else:
+        students = []
+        for s in students_page:
+            row = {'id': s.id, 'nom': s.nom, 'matricule': s.matricule, 'notes': {}}
+            for u in ues_list:
+                n = notes_map.get((s.id, u['id']))
+                if n:
+                    row['notes'][str(u['id'])] = {
+                        'cc': n.cc,
+                        'tp': n.tp,
+                        'sn': n.sn,
+                        'final': n.final,
+                        'is_eliminated': n.is_eliminated,
+                        'note_id': n.id,
+                    }
+                else:
+                    row['notes'][str(u['id'])] = None
+            students.append(row)
+
+    payload = {'ues': ues_list, 'students': students, 'page': page, 'page_size': page_size, 'total_students': total_students}
+    if columnar:
+        payload['format'] = 'columnar'
+        payload['cells'] = cells
+    if cursor_mode:
+        payload['next_cursor'] = next_cursor
+        payload['prev_cursor'] = prev_cursor
+    return JsonResponse(payload)
+
+
+def valid_grade(x):
+    return x is None or (isinstance(x, (int, float)) and 0 <= x <= 20)
 
 
 @login_required
@@ -389,20 +646,14 @@ def note_update(request, note_id):
     sn = data.get('sn')
 
     # basic validation: None or 0-20
-    def valid_val(x):
-        return x is None or (isinstance(x, (int, float)) and 0 <= x <= 20)
-
-    if not (valid_val(cc) and valid_val(tp) and valid_val(sn)):
+    if not (valid_grade(cc) and valid_grade(tp) and valid_grade(sn)):
         return HttpResponseBadRequest('Values must be between 0 and 20 or null')
 
     note = get_object_or_404(Note, id=note_id)
     ue = note.ue
 
     # permission: superuser or staff or instructor of the UE
-    user = request.user
-    def user_manages_ue(user, ue):
-        return user.is_superuser or user.is_staff or ue.instructors.filter(pk=user.pk).exists() or (hasattr(user, 'ues') and user.ues.filter(pk=ue.pk).exists())
-    if not user_manages_ue(user, ue):
+    if not user_manages_ue(request, ue.id):
         return HttpResponseForbidden()
 
     note.cc = cc
@@ -461,21 +712,14 @@ def note_create(request):
         return HttpResponseBadRequest('etudiant_id and ue_id are required')
 
     # validate values
-    def valid_val(x):
-        return x is None or (isinstance(x, (int, float)) and 0 <= x <= 20)
-
-    if not (valid_val(cc) and valid_val(tp) and valid_val(sn)):
+    if not (valid_grade(cc) and valid_grade(tp) and valid_grade(sn)):
         return HttpResponseBadRequest('Values must be between 0 and 20 or null')
 
     etud = get_object_or_404(Etudiant, id=etud_id)
     ue = get_object_or_404(UE, id=ue_id)
 
     # permission: superuser or staff or instructor of the UE can create
-    user = request.user
-    def user_manages_ue(user, ue):
-        return user.is_superuser or user.is_staff or ue.instructors.filter(pk=user.pk).exists() or (hasattr(user, 'ues') and user.ues.filter(pk=ue.pk).exists())
-
-    if not user_manages_ue(user, ue):
+    if not user_manages_ue(request, ue.id):
         return HttpResponseForbidden()
 
     note, created = Note.objects.get_or_create(etudiant=etud, ue=ue, defaults={'cc': cc, 'tp': tp, 'sn': sn})
@@ -485,41 +729,168 @@ def note_create(request):
     return JsonResponse({'id': note.id, 'cc': note.cc, 'tp': note.tp, 'sn': note.sn, 'final': note.final, 'is_eliminated': note.is_eliminated})
 
 
+# upper bound on rows accepted by one batch request
+BATCH_MAX_ROWS = 1000
+
+
+@login_required
+@require_POST
+def notes_batch(request):
+    """Upsert many notes at once.
+
+    Body: {"notes": [{"etudiant_id", "ue_id", "cc", "tp", "sn"}, ...]}. Rights are
+    checked once per distinct UE and all valid rows are written with bulk
+    create/update in one transaction; each row gets its own result or error.
+    """
+    try:
+        data = json.loads(request.body.decode())
+    except Exception:
+        return HttpResponseBadRequest('Invalid JSON')
+    rows = data.get('notes') if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not rows:
+        return HttpResponseBadRequest('notes must be a non-empty list')
+    if len(rows) > BATCH_MAX_ROWS:
+        return HttpResponseBadRequest(f'At most {BATCH_MAX_ROWS} notes per batch')
+
+    results = [None] * len(rows)
+    pending = []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[i] = {'index': i, 'status': 'error', 'error': 'Row must be an object'}
+            continue
+        etud_id, ue_id = row.get('etudiant_id'), row.get('ue_id')
+        if not isinstance(etud_id, int) or not isinstance(ue_id, int):
+            results[i] = {'index': i, 'status': 'error', 'error': 'etudiant_id and ue_id are required'}
+            continue
+        if not all(valid_grade(row.get(k)) for k in ('cc', 'tp', 'sn')):
+            results[i] = {'index': i, 'status': 'error', 'error': 'Values must be between 0 and 20 or null'}
+            continue
+        pending.append((i, etud_id, ue_id, row.get('cc'), row.get('tp'), row.get('sn')))
+
+    ue_ids = {p[2] for p in pending}
+    etud_ids = {p[1] for p in pending}
+    ues = UE.objects.in_bulk(ue_ids)
+    students = set(Etudiant.objects.filter(pk__in=etud_ids).values_list('id', flat=True))
+
+    # permission: superuser or staff or instructor of the UE, resolved once per request
+    managed = set(ues) if manages_all_ues(request.user) else managed_ue_ids(request)
+
+    to_create, to_update = {}, {}
+    written = []
+    with transaction.atomic():
+        existing = {
+            (n.etudiant_id, n.ue_id): n
+            for n in Note.objects.filter(etudiant_id__in=etud_ids, ue_id__in=ue_ids)
+        }
+        for i, etud_id, ue_id, cc, tp, sn in pending:
+            if ue_id not in ues:
+                results[i] = {'index': i, 'status': 'error', 'error': 'UE introuvable'}
+                continue
+            if etud_id not in students:
+                results[i] = {'index': i, 'status': 'error', 'error': 'Etudiant introuvable'}
+                continue
+            if ue_id not in managed:
+                results[i] = {'index': i, 'status': 'error', 'error': 'Forbidden'}
+                continue
+            key = (etud_id, ue_id)
+            note = existing.get(key) or to_create.get(key)
+            if note is None:
+                note = Note(etudiant_id=etud_id, ue=ues[ue_id])
+                to_create[key] = note
+            elif key in existing:
+                to_update[key] = note
+            note.cc, note.tp, note.sn = cc, tp, sn
+            note.compute_final(ues[ue_id])
+            written.append((i, key, note))
+
+        # upsert: a note created by a concurrent request since the lookup is updated
+        Note.objects.bulk_create(
+            list(to_create.values()),
+            update_conflicts=True,
+            unique_fields=['etudiant', 'ue'],
+            update_fields=['cc', 'tp', 'sn', 'final', 'is_eliminated'],
+        )
+        if any(note.pk is None for note in to_create.values()):
+            # Django < 5.0 does not return the primary keys of an upsert
+            ids = {
+                (e, u): pk for e, u, pk in Note.objects.filter(
+                    etudiant_id__in={e for e, _ in to_create}, ue_id__in={u for _, u in to_create},
+                ).values_list('etudiant_id', 'ue_id', 'id')
+            }
+            for key, note in to_create.items():
+                note.pk = ids[key]
+        Note.objects.bulk_update(list(to_update.values()), ['cc', 'tp', 'sn', 'final', 'is_eliminated'])
+        # bulk writes bypass the post_save signals
+        written_keys = to_create.keys() | to_update.keys()
+        sync_after_bulk_write({e for e, _ in written_keys}, {u for _, u in written_keys})
+
+    for i, key, note in written:
+        results[i] = {
+            'index': i,
+            'status': 'created' if key in to_create else 'updated',
+            'id': note.id,
+            'cc': note.cc,
+            'tp': note.tp,
+            'sn': note.sn,
+            'final': note.final,
+            'is_eliminated': note.is_eliminated,
+        }
+    return JsonResponse({
+        'created': len(to_create),
+        'updated': len(to_update),
+        'errors': sum(1 for r in results if r['status'] == 'error'),
+        'results': results,
+    })
+
+
 # ---------- API pour cascade filters (département -> filière -> niveau -> ue) ----------
 # public endpoints (GET)
+def hierarchy_etag(request):
+    return get_hierarchy().etag
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=hierarchy_etag)
+def hierarchy_json(request):
+    """The whole département → filière → niveau → UE tree, for the cascade filters."""
+    return HttpResponse(get_hierarchy().content, content_type='application/json')
+
+
+def _int_param(request, name):
+    try:
+        return int(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
+# single-level cascade endpoints, answered from the same cached tree
 def filieres_json(request):
-    dep_id = request.GET.get('departement')
-    if not dep_id:
+    dep_id = _int_param(request, 'departement')
+    if dep_id is None:
         return JsonResponse({'filieres': []})
-    filieres = Filiere.objects.filter(departement_id=dep_id).order_by('id')
-    data = [{'id': f.id, 'nom': f.nom} for f in filieres]
+    data = [{'id': f['id'], 'nom': f['nom']} for f in get_hierarchy().filieres(dep_id)]
     return JsonResponse({'filieres': data})
 
 
 def niveaux_json(request):
-    fil_id = request.GET.get('filiere')
-    if not fil_id:
+    fil_id = _int_param(request, 'filiere')
+    if fil_id is None:
         return JsonResponse({'niveaux': []})
-    niveaux = Niveau.objects.filter(etudiant__filiere_id=fil_id).distinct().order_by('id')
-    data = [{'id': n.id, 'nom': n.nom} for n in niveaux]
+    data = [{'id': n['id'], 'nom': n['nom']} for n in get_hierarchy().filiere_niveaux(fil_id)]
     return JsonResponse({'niveaux': data})
 
 
 def ues_json(request):
-    fil_id = request.GET.get('filiere')
-    niv_id = request.GET.get('niveau')
-    if not fil_id or not niv_id:
+    fil_id = _int_param(request, 'filiere')
+    niv_id = _int_param(request, 'niveau')
+    if fil_id is None or niv_id is None:
         return JsonResponse({'ues': []})
-    ues = UE.objects.filter(filiere_id=fil_id, niveau_id=niv_id).order_by('code')
-    data = [{'id': u.id, 'nom': u.nom, 'code': u.code} for u in ues]
+    data = [{'id': u['id'], 'nom': u['nom'], 'code': u['code']} for u in get_hierarchy().ues(fil_id, niv_id)]
     return JsonResponse({'ues': data})
 
 
-# ---------- Import notes from Excel ----------
-@login_required
-@require_POST
-def notes_import_excel(request):
-    """Import notes from Excel file. Expected columns: Nom, Matricule, CC, TP, SN"""
+# ---------- Import notes from Excel / CSV ----------
+def _import_sheet(request, file_format):
     if not request.user.is_staff:
         return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=403)
     
@@ -539,149 +910,185 @@ def notes_import_excel(request):
     except UE.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'UE introuvable'})
     
-    # Parse Excel file
+    dry_run = request.POST.get('dry_run') == '1'
+    if request.POST.get('async') == '1' and not dry_run:
+        job = enqueue_import(ue, request.user, file_obj, file_format)
+        return JsonResponse({'success': True, 'job_id': job.pk, 'status': job.status}, status=202)
+
+    # Parse the sheet (streamed) and write the rows that changed, in bulk
     try:
-        wb = load_workbook(file_obj)
-        ws = wb.active
-        
-        results = {
-            'imported': 0,
-            'updated': 0,
-            'errors': []
-        }
-        
-        # Iterate rows (skip header)
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-            if not row[0] and not row[1]:  # Skip empty rows
-                continue
-            
-            nom = row[0]
-            matricule = row[1]
-            cc = row[2]
-            tp = row[3]
-            sn = row[4]
-            
-            # Validate that matricule exists
-            try:
-                etudiant = Etudiant.objects.get(matricule=matricule)
-            except Etudiant.DoesNotExist:
-                results['errors'].append(f"Row {row_idx}: Le matricule '{matricule}' de l'élève '{nom}' n'existe pas ou est incorrecte")
-                continue
-            
-            # Convert and validate values
-            try:
-                cc = float(cc) if cc is not None else None
-                tp = float(tp) if tp is not None else None
-                sn = float(sn) if sn is not None else None
-                
-                # Validate ranges (0-20)
-                for val, label in [(cc, 'CC'), (tp, 'TP'), (sn, 'SN')]:
-                    if val is not None and (val < 0 or val > 20):
-                        raise ValueError(f"{label} doit être entre 0 et 20")
-            except (ValueError, TypeError) as e:
-                results['errors'].append(f"Row {row_idx}: Erreur de conversion pour {matricule}: {str(e)}")
-                continue
-            
-            # Create or update Note
-            note, created = Note.objects.update_or_create(
-                etudiant=etudiant,
-                ue=ue,
-                defaults={'cc': cc, 'tp': tp, 'sn': sn}
-            )
-            
-            if created:
-                results['imported'] += 1
-            else:
-                results['updated'] += 1
-        
-        return JsonResponse({
-            'success': True,
-            'imported': results['imported'],
-            'updated': results['updated'],
-            'errors': results['errors']
-        })
-    
+        results = import_sheet(ue, file_obj, file_format, dry_run=dry_run)
+        return JsonResponse({'success': True, **results})
+
     except Exception as e:
         return JsonResponse({'success': False, 'error': f'Erreur de lecture du fichier: {str(e)}'})
 
 
 @login_required
-def notes_export_excel(request):
-    """Export notes to Excel file for a given UE and niveau."""
+@require_POST
+def notes_import_excel(request):
+    """Import notes from Excel file. Expected columns: Nom, Matricule, CC, TP, SN
+
+    With async=1 the sheet is queued as an ImportJob and the response (202)
+    only carries its id; poll notes_import_status for progress and results.
+    With dry_run=1 nothing is written and the response lists the changes.
+    """
+    return _import_sheet(request, 'xlsx')
+
+
+@login_required
+@require_POST
+def notes_import_csv(request):
+    """Same as notes_import_excel for a UTF-8 CSV (``,`` or ``;`` separated)."""
+    return _import_sheet(request, 'csv')
+
+
+@login_required
+def notes_import_status(request, job_id):
+    """Progress and, once finished, the result of a background import."""
+    job = get_object_or_404(ImportJob, pk=job_id)
+    if job.created_by_id != request.user.pk and not request.user.is_superuser:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=403)
+    data = {
+        'success': True,
+        'job_id': job.pk,
+        'status': job.status,
+        'ue_id': job.ue_id,
+        'filename': job.filename,
+        'rows_processed': rows_processed(job),
+    }
+    if job.status == ImportJob.DONE:
+        data.update(job.result)
+    elif job.status == ImportJob.FAILED:
+        data.update(success=False, error=job.error)
+    return JsonResponse(data)
+
+
+def _export_ue(request):
+    """The UE named by ?ue_id=, or an error response."""
     if not request.user.is_staff:
-        return HttpResponseForbidden()
-    
-    # Get UE and niveau IDs
+        return None, HttpResponseForbidden()
+
     ue_id = request.GET.get('ue_id')
-    niveau_id = request.GET.get('niveau_id')
-    
-    if not ue_id or not niveau_id:
-        return HttpResponseBadRequest('UE and niveau required')
-    
+    if not ue_id:
+        return None, HttpResponseBadRequest('UE required')
+
     try:
-        ue = UE.objects.get(pk=ue_id)
-        niveau = Niveau.objects.get(pk=niveau_id)
-    except (UE.DoesNotExist, Niveau.DoesNotExist):
-        return HttpResponseBadRequest('Invalid UE or niveau')
-    
-    # Get all students in this niveau with notes for this UE
-    from openpyxl import Workbook
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Notes'
-    
-    # Add headers
-    headers = ['Nom', 'Matricule', 'CC', 'TP', 'SN']
-    ws.append(headers)
-    
-    # Get students and their notes
-    students = Etudiant.objects.filter(niveau=niveau).order_by('nom')
-    notes_map = {n.etudiant_id: n for n in Note.objects.filter(ue=ue, etudiant__niveau=niveau)}
-    
-    # Add data rows
-    for student in students:
-        note = notes_map.get(student.id)
-        ws.append([
-            student.nom,
-            student.matricule,
-            note.cc if note and note.cc is not None else '',
-            note.tp if note and note.tp is not None else '',
-            note.sn if note and note.sn is not None else '',
-        ])
-    
-    # Format header row
-    from openpyxl.styles import Font, PatternFill, Alignment
-    header_fill = PatternFill(start_color='1F4788', end_color='1F4788', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
-    
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Adjust column widths
-    ws.column_dimensions['A'].width = 25
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 10
-    ws.column_dimensions['D'].width = 10
-    ws.column_dimensions['E'].width = 10
-    
-    # Save to BytesIO
-    output = BytesIO()
-    wb.save(output)
+        return UE.objects.select_related('niveau').get(pk=ue_id), None
+    except (UE.DoesNotExist, ValueError):
+        return None, HttpResponseBadRequest('Invalid UE')
+
+
+def _export_filename(ue, extension):
+    niveau = ue.niveau.nom if ue.niveau else ''
+    return f"notes_{ue.code}_{niveau.replace(' ', '_')}.{extension}"
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=ue_etag)
+def ue_stats_json(request, ue_id):
+    """Grade distribution of a UE: mean, median, std, pass/elimination rates, histogram."""
+    ue = get_object_or_404(UE, pk=ue_id)
+    return JsonResponse(ue_stats(ue))
+
+
+@login_required
+def notes_export_excel(request):
+    """Export the notes of a UE's filière/niveau to an Excel file.
+
+    The sheet is generated with a write-only workbook into a temporary file
+    and streamed from there, so memory stays flat whatever the cohort size.
+    """
+    ue, error = _export_ue(request)
+    if error:
+        return error
+
+    # Students of the UE's cohort with their note for this UE, as plain tuples
+    output = tempfile.TemporaryFile()
+    write_xlsx(export_rows(ue).iterator(chunk_size=EXPORT_CHUNK_SIZE), output)
     output.seek(0)
-    
-    # Return as download
-    response = HttpResponse(
-        output.getvalue(),
+
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=_export_filename(ue, 'xlsx'),
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
-    filename = f"notes_{ue.code}_{niveau.nom.replace(' ', '_')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+
+@login_required
+def notes_export_csv(request):
+    """Stream the notes of a UE's filière/niveau as CSV, row by row."""
+    ue, error = _export_ue(request)
+    if error:
+        return error
+    response = StreamingHttpResponse(iter_csv(export_rows(ue).iterator(chunk_size=EXPORT_CHUNK_SIZE)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{_export_filename(ue, "csv")}"'
     return response
 
 
+def iter_cohort_ndjson(students, ues):
+    """Yield one JSON line per student with every UE's components and final."""
+    ues_by_id = {u.id: u for u in ues}
+
+    def flush(chunk):
+        notes_by_student = {}
+        rows = Note.objects.filter(etudiant_id__in=[c[0] for c in chunk], ue_id__in=list(ues_by_id)).values_list('etudiant_id', 'ue_id', 'cc', 'tp', 'sn', 'final')
+        for etudiant_id, ue_id, cc, tp, sn, final in rows:
+            notes_by_student.setdefault(etudiant_id, {})[ues_by_id[ue_id].code] = {
+                'cc': cc,
+                'tp': tp,
+                'sn': sn,
+                'final': final,
+            }
+        lines = []
+        for etudiant_id, nom, matricule in chunk:
+            line = {'id': etudiant_id, 'nom': nom, 'matricule': matricule, 'notes': notes_by_student.get(etudiant_id, {})}
+            lines.append(json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n')
+        return ''.join(lines)
+
+    chunk = []
+    for row in students.values_list('id', 'nom', 'matricule').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield flush(chunk)
+            chunk = []
+    if chunk:
+        yield flush(chunk)
+
+
+@login_required
+def notes_export_ndjson(request):
+    """Stream every student x UE grade of a filière/niveau as NDJSON."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    fil_id = _int_param(request, 'filiere')
+    niv_id = _int_param(request, 'niveau')
+    if fil_id is None or niv_id is None:
+        return HttpResponseBadRequest('filiere and niveau required')
+
+    ues = UE.objects.filter(filiere_id=fil_id, niveau_id=niv_id).order_by('code')
+    # every semester unless one is asked for (1 or 2)
+    if request.GET.get('semester'):
+        semester = _int_param(request, 'semester')
+        ues = ues.filter(semester=semester if semester in (1, 2) else 1)
+    students = Etudiant.objects.filter(filiere_id=fil_id, niveau_id=niv_id).order_by('nom', 'id')
+
+    response = StreamingHttpResponse(iter_cohort_ndjson(students, list(ues)), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="notes_{fil_id}_{niv_id}.ndjson"'
+    return response
+
+
+@login_required
+def metrics(request):
+    """Per-view latency and SQL metrics in the Prometheus text format."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # ---------- Gestion des enseignants ----------
 @login_required
 def enseignants_list(request):
@@ -727,6 +1134,7 @@ def enseignant_toggle_staff(request, user_id):
             return redirect('enseignants_list')
         target.is_staff = not target.is_staff
         target.save()
+        invalidate_managed_ues([target.pk])
         messages.success(request, f"{'Promu' if target.is_staff else 'Rétrogradé'} {target.username}.")
     return redirect('enseignants_list')
 